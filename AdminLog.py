@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import threading
+from typing import List, Optional, Tuple
+
+
+class AdminLog:
+    # Admin actions that every worker has to carry out on its own copy of the
+    # cache. Each worker has its own memory, so an admin request only reaches
+    # the worker that happened to get it. Instead of acting straight away, it
+    # appends the action to a file that all the workers share, and each worker
+    # catches up with whatever it hasn't done yet whenever it serves a request.
+    #
+    # The file is only ever appended to, one line per action, and a line is
+    # written with a single write so workers never see half of one.
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            # Created before gunicorn forks (see gunicorn.conf.py), so every
+            # worker gets the same file
+            fd, path = tempfile.mkstemp(prefix='noel-admin-', suffix='.log')
+            os.close(fd)
+        self.path = path
+        # Actions from before this process started have already been done, or
+        # were done to caches that don't exist any more
+        try:
+            self._offset = os.path.getsize(path)
+        except FileNotFoundError:
+            self._offset = 0
+        self._lock = threading.Lock()
+
+    def append(self, action: str, game_ids: List[str]):
+        line = json.dumps({'action': action, 'gameIds': game_ids}) + '\n'
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, line.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    def read_new(self) -> List[Tuple[str, List[str]]]:
+        # The actions appended since the last call, by any process
+        with self._lock:
+            try:
+                if os.path.getsize(self.path) <= self._offset:
+                    return []
+                with open(self.path, 'rb') as f:
+                    f.seek(self._offset)
+                    data = f.read()
+            except FileNotFoundError:
+                return []
+
+            # A line that's still being written is left for next time
+            complete = data[:data.rfind(b'\n') + 1]
+            self._offset += len(complete)
+
+        actions = []
+        for line in complete.splitlines():
+            try:
+                entry = json.loads(line)
+                actions.append((entry['action'], entry['gameIds']))
+            except (ValueError, KeyError, TypeError):
+                continue
+        return actions
@@ -0,0 +1,201 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+
+def approximate_size(obj, seen=None):
+    # Walks containers and objects so a game's updates are counted along with
+    # everything they hold. Objects that are shared between updates (strings,
+    # mostly) are only counted once.
+    if seen is None:
+        seen = set()
+
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += approximate_size(key, seen)
+            size += approximate_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += approximate_size(item, seen)
+    elif hasattr(obj, '__dict__'):
+        size += approximate_size(obj.__dict__, seen)
+
+    return size
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    size: int
+    build_seconds: Optional[float] = None
+    created_at: float = 0
+    last_access: float = 0
+
+
+class GameCache:
+    # Least-recently-used cache of generated games, bounded by the approximate
+    # number of bytes the games take up rather than the number of games
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Locks for games that are being generated, so that a game that's
+        # requested again while it's being generated is only generated once
+        self._generating: Dict[str, threading.Lock] = {}
+
+    def __contains__(self, game_id):
+        return game_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, game_id):
+        with self._lock:
+            try:
+                entry = self._entries[game_id]
+            except KeyError:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(game_id)
+            entry.last_access = time.time()
+            self.hits += 1
+            return entry.value
+
+    def put(self, game_id, value, build_seconds: Optional[float] = None):
+        size = approximate_size(value)
+        now = time.time()
+        with self._lock:
+            self._remove(game_id)
+            self._entries[game_id] = CacheEntry(value, size, build_seconds,
+                                                created_at=now,
+                                                last_access=now)
+            self.size += size
+
+            # Always keep the newest game, even if it's over budget by itself
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                evicted_id = next(iter(self._entries))
+                self._remove(evicted_id)
+                self.evictions += 1
+
+    def get_or_generate(self, game_id, generate):
+        value = self.get(game_id)
+        if value is not None:
+            return value
+
+        with self._lock:
+            game_lock = self._generating.setdefault(game_id, threading.Lock())
+
+        with game_lock:
+            # Someone else may have generated it while this was waiting
+            with self._lock:
+                entry = self._entries.get(game_id)
+            if entry is not None:
+                return entry.value
+
+            try:
+                start = time.perf_counter()
+                value = generate(game_id)
+                self.put(game_id, value, time.perf_counter() - start)
+            finally:
+                with self._lock:
+                    self._generating.pop(game_id, None)
+        return value
+
+    def peek(self, game_id):
+        # Like get, but doesn't count as a use
+        entry = self._entries.get(game_id)
+        return None if entry is None else entry.value
+
+    def game_ids(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+    def entries(self):
+        # Most recently used last
+        with self._lock:
+            return [{
+                'gameId': game_id,
+                'size': entry.size,
+                'buildSeconds': entry.build_seconds,
+                'createdAt': entry.created_at,
+                'lastAccess': entry.last_access,
+            } for game_id, entry in self._entries.items()]
+
+    def invalidate(self, game_id):
+        # Returns whether there was anything to invalidate
+        with self._lock:
+            return self._remove(game_id)
+
+    def stats(self):
+        return {
+            'games': len(self._entries),
+            'size': self.size,
+            'maxSize': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _remove(self, game_id):
+        entry = self._entries.pop(game_id, None)
+        if entry is None:
+            return False
+        self.size -= entry.size
+        return True
+
+
+@dataclass
+class Failure:
+    error: str
+    count: int
+    retry_at: float
+
+
+class NegativeCache:
+    # Remembers games that failed to generate, so they aren't retried at full
+    # cost on every poll. Each failure doubles the time until the next retry.
+    def __init__(self, base_seconds: float, max_seconds: float):
+        self.base_seconds = base_seconds
+        self.max_seconds = max_seconds
+        self._failures: Dict[str, Failure] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, game_id):
+        return game_id in self._failures
+
+    def __len__(self):
+        return len(self._failures)
+
+    def record_failure(self, game_id, error: Exception):
+        with self._lock:
+            failure = self._failures.get(game_id)
+            count = 1 if failure is None else failure.count + 1
+            delay = min(self.base_seconds * 2 ** (count - 1), self.max_seconds)
+            self._failures[game_id] = Failure(
+                error=repr(error), count=count, retry_at=time.time() + delay)
+
+    def should_skip(self, game_id):
+        failure = self._failures.get(game_id)
+        return failure is not None and time.time() < failure.retry_at
+
+    def clear(self, game_id):
+        with self._lock:
+            self._failures.pop(game_id, None)
+
+    def failures(self):
+        with self._lock:
+            return dict(self._failures)
@@ -0,0 +1,119 @@
+import itertools
+import threading
+from queue import PriorityQueue
+from typing import Callable, Optional, Tuple
+
+from blaseball_mike import chronicler
+
+# Priorities. Lower goes first.
+PRIORITY_CURRENT_DAY = 0
+PRIORITY_NEXT_DAY = 1
+
+
+class GameScheduler:
+    # Generates games in the background as soon as they finalize upstream, so
+    # that they're already cached by the time a client's stream gets to them.
+    # The day to watch comes from the stream: whatever day clients are looking
+    # at is the current day, and its games go to the front of the queue.
+    # generate should return None if the game couldn't be generated
+    def __init__(self, generate: Callable[[str], Optional[object]],
+                 is_ready: Callable[[str], bool], num_workers: int,
+                 poll_interval: float):
+        self.generate = generate
+        self.is_ready = is_ready
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+
+        # 0-indexed (season, day), like in game updates
+        self.current_day: Optional[Tuple[int, int]] = None
+        self.generated = 0
+        self.failed = 0
+
+        self._queue = PriorityQueue()
+        # Breaks ties so that games with the same priority go in FIFO order
+        self._counter = itertools.count()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._started = False
+        self._day_changed = threading.Event()
+
+    def ensure_started(self):
+        # Threads don't survive a fork, so this has to happen in each worker
+        # rather than at import time
+        with self._lock:
+            if self._started or self.num_workers <= 0:
+                return
+            self._started = True
+
+        threading.Thread(target=self._poll, name="scheduler-poll",
+                         daemon=True).start()
+        for i in range(self.num_workers):
+            threading.Thread(target=self._work, name=f"scheduler-worker-{i}",
+                             daemon=True).start()
+
+    def observe_schedule(self, schedule):
+        self.ensure_started()
+        if not schedule:
+            return
+
+        day = (schedule[0]['season'], schedule[0]['day'])
+        if day != self.current_day:
+            self.current_day = day
+            # Don't wait for the next poll to look at the new day
+            self._day_changed.set()
+
+        for game in schedule:
+            if game['finalized']:
+                self.enqueue(game['id'], PRIORITY_CURRENT_DAY)
+
+    def enqueue(self, game_id: str, priority: int):
+        with self._lock:
+            if game_id in self._queued or self.is_ready(game_id):
+                return
+            self._queued.add(game_id)
+        self._queue.put((priority, next(self._counter), game_id))
+
+    def stats(self):
+        return {
+            'currentDay': self.current_day,
+            'queued': self._queue.qsize(),
+            'generated': self.generated,
+            'failed': self.failed,
+        }
+
+    def _poll(self):
+        while True:
+            day = self.current_day
+            if day is not None:
+                season, day_num = day
+                try:
+                    self._enqueue_finished_games((season, day_num),
+                                                 PRIORITY_CURRENT_DAY)
+                    self._enqueue_finished_games((season, day_num + 1),
+                                                 PRIORITY_NEXT_DAY)
+                except Exception as e:
+                    print("Couldn't poll for finished games:", repr(e))
+            self._day_changed.wait(self.poll_interval)
+            self._day_changed.clear()
+
+    def _enqueue_finished_games(self, day: Tuple[int, int], priority: int):
+        season, day_num = day
+        # blaseball_mike wants these 1-indexed
+        games = chronicler.get_games(season=season + 1, day=day_num + 1,
+                                     finished=True)
+        for game in games:
+            self.enqueue(game['gameId'], priority)
+
+    def _work(self):
+        while True:
+            _, _, game_id = self._queue.get()
+            try:
+                if not self.is_ready(game_id):
+                    if self.generate(game_id) is None:
+                        self.failed += 1
+                    else:
+                        self.generated += 1
+            finally:
+                with self._lock:
+                    self._queued.discard(game_id)
+                self._queue.task_done()
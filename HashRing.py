@@ -0,0 +1,29 @@
+import hashlib
+from bisect import bisect_right
+from typing import List
+
+
+def ring_hash(key: str) -> int:
+    # Has to come out the same in every process, which rules out hash()
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    # Consistent hashing: each node gets many points on a ring, and a key
+    # belongs to the first node point after the key's hash. Adding or
+    # removing a node only moves the keys next to its points, so most games
+    # stay with the node that already has them cached.
+    def __init__(self, nodes: List[str], points_per_node: int = 100):
+        if not nodes:
+            raise RuntimeError("A hash ring needs at least one node")
+        self.nodes = list(nodes)
+
+        points = sorted((ring_hash(f"{node}#{i}"), node)
+                        for node in self.nodes
+                        for i in range(points_per_node))
+        self._hashes = [h for h, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def owner(self, key: str) -> str:
+        index = bisect_right(self._hashes, ring_hash(key))
+        return self._nodes[index % len(self._nodes)]
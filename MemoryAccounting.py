@@ -0,0 +1,116 @@
+import sys
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from GameCache import approximate_size
+
+
+@dataclass
+class GameMemory:
+    # Approximate bytes held by the game's updates once generated. Objects
+    # shared between updates or fields count towards the first one seen.
+    retained_bytes: int = 0
+    updates: int = 0
+    # Top-level update field -> bytes, over every update
+    field_bytes: Dict[str, int] = field(default_factory=dict)
+    # The list, the StampedUpdates, their timestamps and the update dicts
+    # themselves, i.e. everything that isn't a field
+    overhead_bytes: int = 0
+    # Phase of generate_game -> peak bytes allocated during it, and seconds
+    peak_bytes: Dict[str, int] = field(default_factory=dict)
+    seconds: Dict[str, float] = field(default_factory=dict)
+
+    def to_json(self):
+        return {
+            'retainedBytes': self.retained_bytes,
+            'updates': self.updates,
+            'fieldBytes': self.field_bytes,
+            'overheadBytes': self.overhead_bytes,
+            'peakBytes': self.peak_bytes,
+            'seconds': self.seconds,
+        }
+
+
+def measure_updates(game_updates) -> GameMemory:
+    seen = set()
+    field_bytes = Counter()
+    overhead = sys.getsizeof(game_updates)
+    seen.add(id(game_updates))
+    for update in game_updates:
+        seen.add(id(update))
+        overhead += sys.getsizeof(update)
+        if hasattr(update, '__dict__'):
+            seen.add(id(update.__dict__))
+            overhead += sys.getsizeof(update.__dict__)
+            overhead += sum(approximate_size(name, seen)
+                            for name in update.__dict__)
+        overhead += approximate_size(update.timestamp, seen)
+
+        data = update.data
+        seen.add(id(data))
+        overhead += sys.getsizeof(data)
+        for key, value in data.items():
+            field_bytes[key] += (approximate_size(key, seen) +
+                                 approximate_size(value, seen))
+
+    return GameMemory(
+        retained_bytes=overhead + sum(field_bytes.values()),
+        updates=len(game_updates),
+        field_bytes=dict(field_bytes.most_common()),
+        overhead_bytes=overhead)
+
+
+class MemoryAccounting:
+    # Where generated games' memory goes, per game id. Fed by generate_game
+    # (allocation peaks, see game_transformer/memory.py) and by whoever keeps
+    # the generated updates (retained bytes).
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._games: Dict[str, GameMemory] = {}
+
+    def record_phase(self, game_id: str, phase: str, peak_bytes: int,
+                     seconds: float):
+        with self._lock:
+            game = self._games.setdefault(game_id, GameMemory())
+            game.peak_bytes[phase] = peak_bytes
+            game.seconds[phase] = seconds
+
+    def record_retained(self, game_id: str, game_updates):
+        measured = measure_updates(game_updates)
+        with self._lock:
+            game = self._games.get(game_id)
+            if game is not None:
+                measured.peak_bytes = game.peak_bytes
+                measured.seconds = game.seconds
+            self._games[game_id] = measured
+
+    def get(self, game_id: str) -> Optional[GameMemory]:
+        with self._lock:
+            return self._games.get(game_id)
+
+    def summary(self) -> dict:
+        # Totals over every game, biggest first
+        with self._lock:
+            games = dict(self._games)
+
+        field_bytes = Counter()
+        peak_bytes = {}
+        for game in games.values():
+            field_bytes.update(game.field_bytes)
+            for phase, peak in game.peak_bytes.items():
+                peak_bytes[phase] = max(peak_bytes.get(phase, 0), peak)
+
+        return {
+            'games': len(games),
+            'retainedBytes': sum(g.retained_bytes for g in games.values()),
+            'overheadBytes': sum(g.overhead_bytes for g in games.values()),
+            'fieldBytes': dict(field_bytes.most_common()),
+            'maxPeakBytes': peak_bytes,
+            'biggestGames': [
+                {'gameId': game_id, 'retainedBytes': game.retained_bytes}
+                for game_id, game in sorted(
+                    games.items(), key=lambda item: -item[1].retained_bytes)
+                [:20]],
+        }
@@ -0,0 +1,162 @@
+import threading
+from collections import Counter
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional, Tuple, List
+
+from game_transformer.stats import GameStats, winner_and_loser
+
+
+@dataclass
+class GameResult:
+    season: int
+    day: int
+    # Winning and losing team ids, in Noel and in Blaseball
+    noel_winner: str
+    noel_loser: str
+    real_winner: Optional[str] = None
+    real_loser: Optional[str] = None
+
+
+class SeasonStats:
+    # Standings and player totals for generated games, kept up to date as each
+    # game is finalized so that nothing has to rescan games to answer a
+    # request. A game that's recorded again (because it was regenerated)
+    # replaces its earlier contribution, and generating a game always gives
+    # the same result, so recording it again changes nothing.
+    #
+    # Each worker has its own. Games in the game store are recorded up front
+    # from the summaries stored with them (see record_summary), so every
+    # worker counts those the same. Games that are generated on demand only
+    # count in the workers that have served them, so until every worker has,
+    # workers can disagree about them. Pre-generating seasons into the store
+    # is the way to get standings that don't depend on the worker.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results: Dict[str, GameResult] = {}
+        self._game_stats: Dict[str, Tuple[int, GameStats]] = {}
+        # Season -> totals over every game recorded for it
+        self._player_totals: Dict[int, GameStats] = {}
+        # Season -> day -> how many more (or fewer) wins and losses each team
+        # has in Noel than it had in Blaseball
+        self._day_deltas: Dict[int, Dict[int, Tuple[Counter, Counter]]] = {}
+        # (season, day) -> sum of the deltas of all earlier days
+        self._prefix_deltas: Dict[Tuple[int, int], Tuple[Counter, Counter]] \
+            = {}
+
+    def record_game_stats(self, final_update: dict, stats: GameStats):
+        self._record_stats(final_update['id'], final_update['season'], stats)
+
+    def _record_stats(self, game_id: str, season: int, stats: GameStats):
+        with self._lock:
+            old = self._game_stats.get(game_id)
+            if old is not None:
+                old_season, old_stats = old
+                self._player_totals[old_season].add(old_stats, -1)
+            self._game_stats[game_id] = (season, stats)
+            self._player_totals.setdefault(season, GameStats()).add(stats)
+
+    def record_result(self, real_game: dict, noel_game: dict):
+        # Both must be finalized
+        noel_winner, noel_loser = winner_and_loser(noel_game)
+        real_winner, real_loser = winner_and_loser(real_game)
+        self._record_result(noel_game['id'], GameResult(
+            season=noel_game['season'], day=noel_game['day'],
+            noel_winner=noel_winner, noel_loser=noel_loser,
+            real_winner=real_winner, real_loser=real_loser))
+
+    def record_summary(self, game_id: str, summary: dict):
+        # A summary from game_transformer.stats.summarize_game, which is what
+        # the game store keeps for each game
+        self._record_result(game_id, GameResult(
+            season=summary['season'], day=summary['day'],
+            noel_winner=summary['noelWinner'],
+            noel_loser=summary['noelLoser'],
+            real_winner=summary['realWinner'],
+            real_loser=summary['realLoser']))
+        self._record_stats(game_id, summary['season'],
+                           GameStats.from_state(summary['stats']))
+
+    def _record_result(self, game_id: str, result: GameResult):
+        with self._lock:
+            old = self._results.get(game_id)
+            if old == result:
+                return
+            if old is not None:
+                self._add_delta(old, -1)
+            self._results[game_id] = result
+            self._add_delta(result, 1)
+
+    def _add_delta(self, result: GameResult, sign: int):
+        wins, losses = self._day_deltas.setdefault(result.season, {}) \
+            .setdefault(result.day, (Counter(), Counter()))
+        wins[result.noel_winner] += sign
+        wins[result.real_winner] -= sign
+        losses[result.noel_loser] += sign
+        losses[result.real_loser] -= sign
+        # Any prefix that includes this day is out of date
+        self._prefix_deltas = {
+            (season, day): deltas
+            for (season, day), deltas in self._prefix_deltas.items()
+            if season != result.season or day <= result.day}
+
+    def deltas_before(self, season: int, day: int) -> Tuple[Counter, Counter]:
+        # Win and loss deltas from every game before this day
+        with self._lock:
+            try:
+                return self._prefix_deltas[(season, day)]
+            except KeyError:
+                pass
+
+            wins, losses = Counter(), Counter()
+            for game_day, (day_wins, day_losses) in \
+                    self._day_deltas.get(season, {}).items():
+                if game_day < day:
+                    wins.update(day_wins)
+                    losses.update(day_losses)
+            self._prefix_deltas[(season, day)] = (wins, losses)
+            return wins, losses
+
+    def apply_to_standings(self, standings: dict, season: int, day: int,
+                           finalized_ids: List[str]) -> dict:
+        # Upstream standings count every game before this day, and this day's
+        # games that have finished. The same goes for the deltas.
+        wins, losses = self.deltas_before(season, day)
+        wins, losses = Counter(wins), Counter(losses)
+        with self._lock:
+            for game_id in finalized_ids:
+                result = self._results.get(game_id)
+                if result is not None and result.season == season and \
+                        result.day == day:
+                    wins[result.noel_winner] += 1
+                    wins[result.real_winner] -= 1
+                    losses[result.noel_loser] += 1
+                    losses[result.real_loser] -= 1
+
+        return {
+            **standings,
+            'wins': {team_id: count + wins[team_id]
+                     for team_id, count in standings['wins'].items()},
+            'losses': {team_id: count + losses[team_id]
+                       for team_id, count in standings['losses'].items()},
+        }
+
+    def season_summary(self, season: int) -> dict:
+        with self._lock:
+            results = [r for r in self._results.values() if r.season == season]
+            totals = self._player_totals.get(season, GameStats())
+            teams = {}
+            for result in results:
+                for team_id, key in [(result.noel_winner, 'wins'),
+                                     (result.noel_loser, 'losses')]:
+                    team = teams.setdefault(team_id, {'wins': 0, 'losses': 0})
+                    team[key] += 1
+
+            return {
+                'season': season,
+                'games': len(results),
+                'teams': teams,
+                'batting': {player_id: asdict(line)
+                            for player_id, line in totals.batting.items()},
+                'pitching': {player_id: asdict(line)
+                             for player_id, line in totals.pitching.items()},
+            }
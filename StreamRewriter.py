@@ -0,0 +1,115 @@
+import json
+import re
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'\s*')
+
+# Matches every element of an array in a path
+EVERY = '*'
+
+
+def dumps(value):
+    return json.dumps(value, separators=(',', ':'))
+
+
+def rewrite_path(text: str, path: tuple, transform):
+    # Replaces every value at `path` in a JSON document with
+    # transform(value, location), copying the rest of the document through
+    # as-is rather than parsing and re-serializing all of it. A path is a
+    # tuple of object keys and EVERY. location is the path with EVERY replaced
+    # by the element's index.
+    #
+    # A step can also be a tuple of keys, to match any of them, which finds
+    # several kinds of value in one walk through the document. If the last step
+    # is, the values are transformed one key at a time in the order it lists
+    # them, so a transform can use what it saw of an earlier key's values.
+    return rewrite_path_raw(
+        text, path, lambda value, location: dumps(transform(value, location)))
+
+
+def rewrite_path_raw(text: str, path: tuple, transform):
+    # Like rewrite_path, but transform returns the new value already
+    # serialized. A document that isn't valid JSON is returned unchanged.
+    found = []
+    try:
+        _find(text, 0, path, (), found)
+    except (ValueError, IndexError):
+        return text
+
+    order = range(len(found))
+    if path and isinstance(path[-1], tuple):
+        keys = path[-1]
+        order = sorted(order, key=lambda i: keys.index(found[i][0][-1]))
+    replacements = [None] * len(found)
+    for i in order:
+        location, value, _, _ = found[i]
+        replacements[i] = transform(value, location)
+
+    pieces = []
+    position = 0
+    for (_, _, start, end), replacement in zip(found, replacements):
+        pieces.append(text[position:start])
+        pieces.append(replacement)
+        position = end
+
+    pieces.append(text[position:])
+    return ''.join(pieces)
+
+
+def _skip_whitespace(text, position):
+    return _whitespace.match(text, position).end()
+
+
+def _find(text, position, path, location, found):
+    # Adds (location, value, start, end) to found for every value at path
+    # inside the value starting at position, and returns where that value
+    # ends. Values that aren't on the path are skipped by the C decoder, which
+    # is much faster than walking them here, and are never re-serialized.
+    position = _skip_whitespace(text, position)
+    if not path:
+        value, end = _decoder.raw_decode(text, position)
+        found.append((location, value, position, end))
+        return end
+
+    step, rest = path[0], path[1:]
+    if step == EVERY and text.startswith('[', position):
+        position = _skip_whitespace(text, position + 1)
+        if text.startswith(']', position):
+            return position + 1
+        index = 0
+        while True:
+            position = _find(text, position, rest, location + (index,), found)
+            index += 1
+            position = _skip_whitespace(text, position)
+            if text[position] == ']':
+                return position + 1
+            if text[position] != ',':
+                raise ValueError("Expected , or ] in array")
+            position += 1
+
+    if step != EVERY and text.startswith('{', position):
+        position = _skip_whitespace(text, position + 1)
+        if text.startswith('}', position):
+            return position + 1
+        while True:
+            key, position = _decoder.raw_decode(text, position)
+            position = _skip_whitespace(text, position)
+            if text[position] != ':':
+                raise ValueError("Expected : in object")
+            position += 1
+            if key == step or (isinstance(step, tuple) and key in step):
+                position = _find(text, position, rest, location + (key,),
+                                 found)
+            else:
+                _, position = _decoder.raw_decode(
+                    text, _skip_whitespace(text, position))
+            position = _skip_whitespace(text, position)
+            if text[position] == '}':
+                return position + 1
+            if text[position] != ',':
+                raise ValueError("Expected , or } in object")
+            position = _skip_whitespace(text, position + 1)
+
+    # Not the kind of container the path goes through, so nothing's in it
+    _, end = _decoder.raw_decode(text, position)
+    return end
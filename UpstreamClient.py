@@ -0,0 +1,178 @@
+import threading
+import time
+from concurrent.futures import Future
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Optional
+
+import requests
+from blaseball_mike import eventually, session as blaseball_mike_session
+from blaseball_mike.chronicler import v1 as chronicler_v1, \
+    v2 as chronicler_v2
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+
+class UpstreamBusy(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    # Allows `rate` requests per second on average, and bursts of up to
+    # `burst`. Callers that have to wait are served in the order they arrived:
+    # each one reserves the next token, even if it's in the future, and sleeps
+    # until then.
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        # Returns False, without using a token, if it would take longer than
+        # timeout to get one
+        if self.rate <= 0:
+            return True  # Unlimited
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens +
+                               (now - self._updated) * self.rate)
+            self._updated = now
+
+            wait = max(0., (1 - self._tokens) / self.rate)
+            if timeout is not None and wait > timeout:
+                return False
+            self._tokens -= 1
+
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def queued_seconds(self):
+        # How long a request made now would have to wait
+        with self._lock:
+            return max(0., -self._tokens / self.rate) if self.rate > 0 else 0.
+
+
+class RateLimitedAdapter(BaseAdapter):
+    # Sends requests through another adapter (a plain HTTPAdapter unless told
+    # otherwise), once the limiter lets them. Raises UpstreamBusy instead if
+    # that would take more than max_wait seconds.
+    def __init__(self, limiter: TokenBucket, max_wait: Optional[float],
+                 adapter: Optional[BaseAdapter] = None):
+        super().__init__()
+        self.limiter = limiter
+        self.max_wait = max_wait
+        self.adapter = HTTPAdapter() if adapter is None else adapter
+
+    def send(self, request, *args, **kwargs):
+        if not self.limiter.acquire(self.max_wait):
+            raise UpstreamBusy("Too many requests queued for upstream")
+        return self.adapter.send(request, *args, **kwargs)
+
+    def close(self):
+        self.adapter.close()
+
+
+def mount_limiter(session: requests.Session, limiter: TokenBucket,
+                  max_wait: Optional[float]):
+    adapter = RateLimitedAdapter(limiter, max_wait)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+
+def limit_blaseball_mike(limiter: TokenBucket, max_wait: Optional[float]):
+    # blaseball_mike makes a session per cache lifetime the first time it
+    # needs one. Wrap the function that does that in each module that uses
+    # it, so every session sends its requests through the limiter. Cached
+    # responses don't reach the adapter, so they're free.
+    for module in [chronicler_v1, chronicler_v2, eventually]:
+        get_session = module.session
+        if getattr(get_session, 'limiter', None) is limiter:
+            continue
+
+        def limited_session(*args, get_session=get_session, **kwargs):
+            s = get_session(*args, **kwargs)
+            if not isinstance(s.get_adapter('https://'), RateLimitedAdapter):
+                mount_limiter(s, limiter, max_wait)
+            return s
+
+        limited_session.limiter = limiter
+        module.session = limited_session
+
+
+def close_blaseball_mike_sessions():
+    # Closes and forgets every session blaseball_mike has made, along with
+    # their adapters' connections. For before forking: a forked worker would
+    # otherwise share the parent's open sockets with every other worker, and
+    # they'd read each other's responses. Each worker makes new sessions the
+    # first time it needs them, and limit_blaseball_mike still applies.
+    sessions = blaseball_mike_session._SESSIONS_BY_EXPIRY
+    for s in list(sessions.values()):
+        s.close()
+    sessions.clear()
+
+
+def proxy_session(limiter: TokenBucket, max_wait: Optional[float]):
+    # Shared by every client, so it keeps connections to upstream open but
+    # never keeps cookies. Each request's own cookies are still sent.
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    mount_limiter(session, limiter, max_wait)
+    return session
+
+
+class UpstreamClient:
+    # Sends the proxy's requests upstream through a session, normally one
+    # from proxy_session. Identical GETs that are in flight at the same time
+    # are sent once and all get the same response.
+    def __init__(self, session: requests.Session):
+        self.session = session
+        self.sent = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        with self._lock:
+            future = self._in_flight.get(url)
+            leader = future is None
+            if leader:
+                future = self._in_flight[url] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            # Whoever got here first is already asking
+            return future.result()
+
+        try:
+            resp = self.request('GET', url, **kwargs)
+            resp.content  # Read it here, before anyone else can get to it
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(resp)
+        finally:
+            with self._lock:
+                del self._in_flight[url]
+        return resp
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        try:
+            resp = self.session.request(method, url, **kwargs)
+        except UpstreamBusy:
+            self.rejected += 1
+            raise
+        self.sent += 1
+        return resp
+
+    def stats(self):
+        return {
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'rejected': self.rejected,
+            'inFlight': len(self._in_flight),
+        }
@@ -1,77 +1,1009 @@
-import requests as requests
+import hmac
+import os
+import resource
+import threading
+from functools import wraps
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from datetime import timezone
+
+import requests
+from blaseball_mike import chronicler, eventually
+from blaseball_mike.chronicler import v1 as chronicler_v1, \
+    v2 as chronicler_v2
+from dateutil.parser import isoparse
 from flask import Flask, request, Response, jsonify
-from flask_caching import Cache
 
-from game_transformer import generate_game
+from AdminLog import AdminLog
+from GameCache import GameCache, NegativeCache
+from GameScheduler import GameScheduler
+from HashRing import HashRing
+from MemoryAccounting import MemoryAccounting
+from SeasonStats import SeasonStats
+from StreamRewriter import rewrite_path_raw, dumps, EVERY
+from UpstreamClient import UpstreamClient, UpstreamBusy, TokenBucket, \
+    limit_blaseball_mike, proxy_session
+from game_transformer import generate_game, prefetch_games
+from game_transformer.archive import GameArchive, to_microseconds
+from game_transformer import recordings
+from game_transformer.memory import use_memory_sink
+from game_transformer.recordings import use_recording_cache
+from game_transformer.stats import use_stats_sink
+from game_transformer.store import GameStore
+
+DEFAULT_UPSTREAM_URL = 'https://api.sibr.dev/'
 
 config = {
     "DEBUG": True,  # some Flask specific configs
-    "CACHE_TYPE": "SimpleCache",  # Flask-Caching related configs
-    "CACHE_DEFAULT_TIMEOUT": 300
+    # Where Chronicler and Eventually live, for the proxy and for fetching
+    # games. Point it at upstream_stub.py to run without the real thing.
+    "UPSTREAM_URL": os.environ.get("NOEL_UPSTREAM_URL", DEFAULT_UPSTREAM_URL),
+    # Requests per second each worker may send upstream for clients, on
+    # average, and how many it may send at once after a quiet spell. Requests
+    # over the limit wait their turn, and get a 503 if that would take longer
+    # than the max wait. 0 turns the limit off.
+    "UPSTREAM_RATE": float(os.environ.get("NOEL_UPSTREAM_RATE", 10)),
+    "UPSTREAM_BURST": float(os.environ.get("NOEL_UPSTREAM_BURST", 20)),
+    "UPSTREAM_MAX_WAIT_SECONDS": float(
+        os.environ.get("NOEL_UPSTREAM_MAX_WAIT_SECONDS", 10)),
+    # The same, for fetching games to generate. It has its own allowance so
+    # that generating a day's games can't starve clients, or the other way
+    # around. A fetch that would wait too long fails the game, which is
+    # retried later.
+    "GENERATION_UPSTREAM_RATE": float(
+        os.environ.get("NOEL_GENERATION_UPSTREAM_RATE", 5)),
+    "GENERATION_UPSTREAM_BURST": float(
+        os.environ.get("NOEL_GENERATION_UPSTREAM_BURST", 10)),
+    "GENERATION_UPSTREAM_MAX_WAIT_SECONDS": float(
+        os.environ.get("NOEL_GENERATION_UPSTREAM_MAX_WAIT_SECONDS", 60)),
+    # Approximate memory budget for generated games, per worker
+    "GAME_CACHE_MAX_BYTES": int(os.environ.get("NOEL_GAME_CACHE_MAX_BYTES",
+                                               1024 * 1024 * 1024)),
+    # Pre-generated games shared by all workers. See game_transformer/store.py
+    # Their results count towards the standings in every worker, where games
+    # generated on demand only count in the workers that generated them.
+    "GAME_STORE_PATH": os.environ.get("NOEL_GAME_STORE_PATH"),
+    # Where to save what the recorders got out of each game, so the producer
+    # can be rerun without fetching or recording it again. See
+    # game_transformer/recordings.py
+    "RECORDING_CACHE_DIR": os.environ.get("NOEL_RECORDING_CACHE_DIR"),
+    # What players did across many games, for when they run out of things
+    # they did in the game being generated. See game_transformer/tendencies.py
+    "TENDENCY_INDEX_PATH": os.environ.get("NOEL_TENDENCY_INDEX_PATH"),
+    # Games to load before serving. See warm_start and gunicorn.conf.py. The
+    # season is 0-indexed, like in game updates and the admin routes.
+    "PRELOAD_SEASON": os.environ.get("NOEL_PRELOAD_SEASON"),
+    "PRELOAD_GAMES": os.environ.get("NOEL_PRELOAD_GAMES"),
+    # How long to wait before retrying a game that failed to generate. Doubles
+    # with every failure, up to the max.
+    "FAILED_GAME_RETRY_SECONDS": float(
+        os.environ.get("NOEL_FAILED_GAME_RETRY_SECONDS", 60)),
+    "FAILED_GAME_MAX_RETRY_SECONDS": float(
+        os.environ.get("NOEL_FAILED_GAME_MAX_RETRY_SECONDS", 24 * 60 * 60)),
+    # How long a stream request waits for games to generate before it's sent
+    # with whatever is available. Generation carries on in the background.
+    # 0 waits for as long as it takes.
+    "GENERATION_DEADLINE_SECONDS": float(
+        os.environ.get("NOEL_GENERATION_DEADLINE_SECONDS", 2)),
+    "GENERATION_WORKERS": int(os.environ.get("NOEL_GENERATION_WORKERS", 4)),
+    # Several nodes can share the work of generating games. Each game is
+    # generated and cached by one node, picked by hashing its id, and the
+    # others ask that node for it. CLUSTER_NODES is every node's base URL,
+    # comma-separated, and CLUSTER_SELF is the one that's this node. Leave
+    # them unset to generate every game here. To try it on one machine:
+    #   NOEL_CLUSTER_NODES=http://127.0.0.1:5001,http://127.0.0.1:5002 \
+    #   NOEL_CLUSTER_SELF=http://127.0.0.1:5001 NOEL_BIND=127.0.0.1:5001 \
+    #   gunicorn app:app
+    # and the same again with 5002 as the node and bind address.
+    "CLUSTER_NODES": os.environ.get("NOEL_CLUSTER_NODES"),
+    "CLUSTER_SELF": os.environ.get("NOEL_CLUSTER_SELF"),
+    # Nodes send this to each other and reject requests without it. Required
+    # with CLUSTER_NODES.
+    "CLUSTER_TOKEN": os.environ.get("NOEL_CLUSTER_TOKEN"),
+    # How long to wait to connect to another node, and for its answer on top
+    # of the generation deadline
+    "CLUSTER_TIMEOUT_SECONDS": float(
+        os.environ.get("NOEL_CLUSTER_TIMEOUT_SECONDS", 5)),
+    # A node that can't be reached gets its games generated by the others for
+    # this long before they try it again
+    "CLUSTER_RETRY_SECONDS": float(
+        os.environ.get("NOEL_CLUSTER_RETRY_SECONDS", 30)),
+    # Measure how much memory each generated game takes, and which update
+    # fields it goes to. See /noel/admin/memory. Slows generation down a lot.
+    "MEMORY_ACCOUNTING": bool(os.environ.get("NOEL_MEMORY_ACCOUNTING")),
+    # If set, the /noel/admin routes need "Authorization: Bearer <token>"
+    "ADMIN_TOKEN": os.environ.get("NOEL_ADMIN_TOKEN"),
+    # File the workers share admin actions through, so that invalidating or
+    # warming a game reaches every worker. See AdminLog.py. A new temporary
+    # file by default, which only works if the app is preloaded before the
+    # workers are forked (see gunicorn.conf.py).
+    "ADMIN_LOG_PATH": os.environ.get("NOEL_ADMIN_LOG_PATH"),
+    # Background generation of finalized games. 0 workers turns it off.
+    "SCHEDULER_WORKERS": int(os.environ.get("NOEL_SCHEDULER_WORKERS", 2)),
+    "SCHEDULER_POLL_SECONDS": float(
+        os.environ.get("NOEL_SCHEDULER_POLL_SECONDS", 60)),
 }
 
 app = Flask(__name__)
 # tell Flask to use the above defined config
 app.config.from_mapping(config)
-cache = Cache(app)
 
 
-@cache.memoize(timeout=0)
+def use_upstream_url(base_url):
+    # blaseball_mike reads its base URLs from module constants every time it
+    # makes a request, so replacing them redirects all of its requests
+    for module in [chronicler_v1, chronicler_v2, eventually]:
+        for name, value in list(vars(module).items()):
+            if isinstance(value, str) and \
+                    value.startswith(DEFAULT_UPSTREAM_URL):
+                setattr(module, name,
+                        base_url + value[len(DEFAULT_UPSTREAM_URL):])
+
+
+if not app.config['UPSTREAM_URL'].endswith('/'):
+    app.config['UPSTREAM_URL'] += '/'
+if app.config['UPSTREAM_URL'] != DEFAULT_UPSTREAM_URL:
+    use_upstream_url(app.config['UPSTREAM_URL'])
+upstream_limiter = TokenBucket(app.config['UPSTREAM_RATE'],
+                               app.config['UPSTREAM_BURST'])
+upstream = UpstreamClient(proxy_session(
+    upstream_limiter, app.config['UPSTREAM_MAX_WAIT_SECONDS']))
+generation_upstream_limiter = TokenBucket(
+    app.config['GENERATION_UPSTREAM_RATE'],
+    app.config['GENERATION_UPSTREAM_BURST'])
+limit_blaseball_mike(generation_upstream_limiter,
+                     app.config['GENERATION_UPSTREAM_MAX_WAIT_SECONDS'])
+game_cache = GameCache(app.config['GAME_CACHE_MAX_BYTES'])
+failed_games = NegativeCache(app.config['FAILED_GAME_RETRY_SECONDS'],
+                             app.config['FAILED_GAME_MAX_RETRY_SECONDS'])
+use_recording_cache(app.config['RECORDING_CACHE_DIR'])
+if app.config['TENDENCY_INDEX_PATH']:
+    # Only needs numpy if there's an index
+    from game_transformer.tendencies import use_tendency_index
+    use_tendency_index(app.config['TENDENCY_INDEX_PATH'])
+# Standings and player totals for the games in the store and the games this
+# worker has generated. See SeasonStats for why workers can disagree.
+season_stats = SeasonStats()
+use_stats_sink(season_stats.record_game_stats)
+memory_accounting = (MemoryAccounting() if app.config['MEMORY_ACCOUNTING']
+                     else None)
+if memory_accounting is not None:
+    use_memory_sink(memory_accounting.record_phase)
+admin_log = AdminLog(app.config['ADMIN_LOG_PATH'])
+game_store = (GameStore(app.config['GAME_STORE_PATH'])
+              if app.config['GAME_STORE_PATH'] else None)
+if game_store is not None:
+    for stored_game_id, stored_summary in game_store.summaries():
+        season_stats.record_summary(stored_game_id, stored_summary)
+
+
+# A day's worth of games
+PRELOAD_BATCH_SIZE = 12
+
+# Games that were still generating when a stream request ran out of time get
+# the last state of the game that was sent, or failing that the upstream game
+MAX_LAST_TRANSFORMED = 256
+
+# Most polls see the same play count as the last one for most games, so each
+# transformed game is kept ready to send as JSON
+MAX_MEMOIZED_GAMES = 4096
+
+# Upstream data for games that are about to be generated, fetched in bulk by
+# prefetch_uncached_games and consumed by generate_game_memo. Each game's
+# entry goes when something tries to generate it, whether or not that works.
+# The limit covers games that are fetched but never tried, and is a few days'
+# worth so it never gets in the way of a day that's being generated.
+MAX_PREFETCHED_GAMES = 48
+prefetched_games: 'OrderedDict[str, tuple]' = OrderedDict()
+prefetched_lock = threading.Lock()
+
+
+def node_url(url):
+    return url if url.endswith('/') else url + '/'
+
+
+if app.config['CLUSTER_NODES']:
+    cluster_ring = HashRing([node_url(node.strip()) for node in
+                             app.config['CLUSTER_NODES'].split(',')])
+    cluster_self = node_url(app.config['CLUSTER_SELF'] or '')
+    if cluster_self not in cluster_ring.nodes:
+        raise RuntimeError("NOEL_CLUSTER_SELF must be one of "
+                           "NOEL_CLUSTER_NODES")
+    if not app.config['CLUSTER_TOKEN']:
+        raise RuntimeError("NOEL_CLUSTER_TOKEN is required with "
+                           "NOEL_CLUSTER_NODES")
+else:
+    cluster_ring = None
+    cluster_self = None
+cluster_session = requests.Session()
+# Node -> when to try it again, for nodes that couldn't be reached
+down_nodes = {}
+
+
+def remote_owner(game_id):
+    # The node that generates this game, or None if it's this one
+    if cluster_ring is None:
+        return None
+    owner = cluster_ring.owner(game_id)
+    return None if owner == cluster_self else owner
+
+
+def is_node_down(node):
+    retry_at = down_nodes.get(node)
+    return retry_at is not None and time.monotonic() < retry_at
+
+
+def is_game_ready(game_id):
+    return (game_id in game_cache or
+            (game_store is not None and game_id in game_store))
+
+
 def generate_game_memo(game_id):
-    return generate_game(game_id)
+    if game_store is not None and game_id in game_store:
+        return game_store.archive(game_id)
+
+    return game_cache.get_or_generate(game_id, generate_and_account)
+
+
+def generate_and_account(game_id):
+    game_updates = generate_game(game_id, take_prefetched(game_id))
+    if memory_accounting is not None:
+        memory_accounting.record_retained(game_id, game_updates)
+    return game_updates
+
+
+def generate_game_safely(game_id):
+    # Like generate_game_memo, but returns None instead of raising. Games that
+    # fail are remembered and not retried until their backoff runs out.
+    try:
+        if failed_games.should_skip(game_id):
+            return None
+
+        try:
+            game_updates = generate_game_memo(game_id)
+        except Exception as e:
+            failed_games.record_failure(game_id, e)
+            app.logger.exception("Couldn't generate game %s", game_id)
+            return None
+    finally:
+        # Used, or no longer needed
+        take_prefetched(game_id)
+
+    if game_id in failed_games:
+        failed_games.clear(game_id)
+    return game_updates
+
+
+def is_game_settled(game_id):
+    # Either ready, not worth trying to generate right now, or another node's
+    # to generate. This keeps the scheduler and prefetching to this node's
+    # own games.
+    return (is_game_ready(game_id) or failed_games.should_skip(game_id) or
+            remote_owner(game_id) is not None)
+
+
+def prefetch_uncached_games(game_ids):
+    uncached_ids = [game_id for game_id in game_ids
+                    if game_id not in prefetched_games and
+                    not is_game_settled(game_id)]
+    if not uncached_ids:
+        return
+
+    fetched = prefetch_games(uncached_ids)
+    with prefetched_lock:
+        for game_id, prefetched in fetched.items():
+            # Another request may have generated it in the meantime
+            if not is_game_ready(game_id):
+                prefetched_games[game_id] = prefetched
+                prefetched_games.move_to_end(game_id)
+        while len(prefetched_games) > MAX_PREFETCHED_GAMES:
+            prefetched_games.popitem(last=False)
+
+
+def take_prefetched(game_id):
+    with prefetched_lock:
+        return prefetched_games.pop(game_id, None)
+
+
+# Threads are started on first use, so with gunicorn's preload each worker
+# gets its own after the fork
+generation_pool = ThreadPoolExecutor(app.config['GENERATION_WORKERS'],
+                                     thread_name_prefix="generate")
+# Game id -> Future, so a game that's already generating isn't submitted again
+generating_games = {}
+generating_lock = threading.Lock()
+# Waits on other nodes, so it has to be separate from generation_pool. A
+# generation worker that waits on a node that's waiting on us would deadlock.
+forwarding_pool = ThreadPoolExecutor(
+    app.config['GENERATION_WORKERS'] *
+    (len(cluster_ring.nodes) - 1 if cluster_ring is not None else 1) or 1,
+    thread_name_prefix="forward")
+# Fetches upstream data for a batch of games while their generation jobs wait
+# for it. Separate from generation_pool so the jobs can't take every worker
+# and leave the fetch they're waiting on with nowhere to run.
+prefetch_pool = ThreadPoolExecutor(app.config['GENERATION_WORKERS'],
+                                   thread_name_prefix="prefetch")
+# Game id -> the last transformed game sent to a client
+last_transformed: 'OrderedDict[str, dict]' = OrderedDict()
+
+
+def generate_game_async(game_id, prefetching=None):
+    # prefetching is an optional future for a prefetch_uncached_games that
+    # includes this game, to wait for before generating it
+    with generating_lock:
+        future = generating_games.get(game_id)
+        if future is None:
+            future = generation_pool.submit(generate_after_prefetch, game_id,
+                                            prefetching)
+            generating_games[game_id] = future
+            future.add_done_callback(
+                lambda _: generating_games.pop(game_id, None))
+    return future
+
 
+def generate_after_prefetch(game_id, prefetching):
+    if prefetching is not None:
+        try:
+            prefetching.result()
+        except Exception:
+            # generate_game will fetch the game itself
+            app.logger.exception("Couldn't prefetch games")
+    return generate_game_safely(game_id)
 
-def transform_game(game):
-    game_updates = generate_game_memo(game['id'])
 
+# (game id, play count, finalized) -> transformed game as JSON
+transformed_json: 'OrderedDict[tuple, str]' = OrderedDict()
+
+
+def memo_key(game):
+    return game['id'], game['playCount'], game['finalized']
+
+
+def memoized_json(game):
+    key = memo_key(game)
+    with generating_lock:
+        serialized = transformed_json.get(key)
+        if serialized is not None:
+            transformed_json.move_to_end(key)
+    return serialized
+
+
+def memoize_json(game, serialized):
+    with generating_lock:
+        transformed_json[memo_key(game)] = serialized
+        while len(transformed_json) > MAX_MEMOIZED_GAMES:
+            transformed_json.popitem(last=False)
+
+
+def forget_transformed(game_id):
+    with generating_lock:
+        last_transformed.pop(game_id, None)
+        for key in [key for key in transformed_json if key[0] == game_id]:
+            del transformed_json[key]
+
+
+def remember_transformed(game):
+    with generating_lock:
+        last_transformed[game['id']] = game
+        last_transformed.move_to_end(game['id'])
+        while len(last_transformed) > MAX_LAST_TRANSFORMED:
+            last_transformed.popitem(last=False)
+
+
+scheduler = GameScheduler(generate_game_safely, is_game_settled,
+                          num_workers=app.config['SCHEDULER_WORKERS'],
+                          poll_interval=app.config['SCHEDULER_POLL_SECONDS'])
+
+
+def warm_start():
+    # Loads or generates the configured games. When run in the master process
+    # before forking (see gunicorn.conf.py), every worker starts with them.
+    game_ids = []
+    if app.config['PRELOAD_SEASON']:
+        # blaseball_mike wants it 1-indexed
+        game_ids += [game['gameId'] for game in chronicler.get_games(
+            season=int(app.config['PRELOAD_SEASON']) + 1, finished=True)]
+    if app.config['PRELOAD_GAMES']:
+        game_ids += app.config['PRELOAD_GAMES'].split(',')
+    # Each node preloads its share
+    game_ids = [game_id for game_id in game_ids
+                if remote_owner(game_id) is None]
+
+    for i in range(0, len(game_ids), PRELOAD_BATCH_SIZE):
+        batch = game_ids[i:i + PRELOAD_BATCH_SIZE]
+        prefetch_uncached_games(batch)
+        for game_id in batch:
+            generate_game_safely(game_id)
+
+    app.logger.info("Preloaded %d games", len(game_ids))
+
+
+def transform_game(game, game_updates):
     if game['finalized']:
-        return game_updates[-1].data
+        transformed = game_updates[-1].data
+    else:
+        update = update_for_play(game_updates, game['playCount'])
+        transformed = (game_updates[-1].data if update is None
+                       else update.data)
+
+    remember_transformed(transformed)
+    return transformed
+
 
+def transform_games(games, deadline):
+    # Returns the transformed version of each game, or None for games that
+    # couldn't be generated (in time, or at all). Games this node doesn't own
+    # are sent to the nodes that do, at the same time as this node works on
+    # its own.
+    indices_by_owner = {}
+    for i, game in enumerate(games):
+        owner = remote_owner(game['id'])
+        if owner is not None and is_node_down(owner):
+            owner = None
+        indices_by_owner.setdefault(owner, []).append(i)
+    forwarded = {
+        owner: forwarding_pool.submit(forward_games, owner,
+                                      [games[i] for i in indices], deadline)
+        for owner, indices in indices_by_owner.items() if owner is not None}
+
+    transformed = [None] * len(games)
+    local_indices = indices_by_owner.get(None, [])
+    for i, transformed_game in zip(local_indices, transform_local_games(
+            [games[i] for i in local_indices], deadline)):
+        transformed[i] = transformed_game
+    for owner, future in forwarded.items():
+        for i, transformed_game in zip(indices_by_owner[owner],
+                                       future.result()):
+            transformed[i] = transformed_game
+    return transformed
+
+
+def cluster_headers():
+    return {'Authorization': f"Bearer {app.config['CLUSTER_TOKEN']}"}
+
+
+def forward_games(owner, games, deadline):
+    # Asks the owner for the transformed games. If the owner can't be reached
+    # they're generated here instead, so a node going down costs extra work
+    # rather than games.
+    timeout = (None if deadline is None
+               else max(deadline - time.monotonic(), 0))
+    cluster_timeout = app.config['CLUSTER_TIMEOUT_SECONDS']
     try:
-        update = next(u for u in game_updates
-                      if u.data['playCount'] == game['playCount'])
-        return update.data
-    except StopIteration:
-        return game_updates[-1].data
-
-
-def transform_item(item):
-    return {
-        **item,
-        'data': {
-            **item['data'],
-            'value': {
-                **item['data']['value'],
-                'games': {
-                    **item['data']['value']['games'],
-                    'schedule': [transform_game(game)
-                                 for game in
-                                 item['data']['value']['games']['schedule']]
-                }
-            }
-        }
-    }
+        resp = cluster_session.post(
+            owner + 'noel/internal/transform',
+            json={'games': games, 'deadlineSeconds': timeout},
+            headers=cluster_headers(),
+            timeout=(cluster_timeout,
+                     None if timeout is None else timeout + cluster_timeout))
+        resp.raise_for_status()
+        transformed = resp.json()['games']
+    except requests.ConnectionError:
+        # Includes timing out while connecting. The owner's gone, so stop
+        # asking it for a while.
+        app.logger.exception("Couldn't reach %s, generating its games here",
+                             owner)
+        down_nodes[owner] = (time.monotonic() +
+                             app.config['CLUSTER_RETRY_SECONDS'])
+        return transform_local_games(games, deadline)
+    except requests.Timeout:
+        # Connected, so the owner is working on it. Don't start over here.
+        app.logger.warning("Timed out waiting for %s", owner)
+        return [None] * len(games)
+    except (requests.RequestException, ValueError, KeyError):
+        app.logger.exception("Couldn't get games from %s, generating them "
+                             "here", owner)
+        return transform_local_games(games, deadline)
+
+    down_nodes.pop(owner, None)
+
+    for transformed_game in transformed:
+        if transformed_game is not None:
+            remember_transformed(transformed_game)
+    return transformed
+
+
+def transform_local_games(games, deadline):
+    # Like transform_games, but generates every game here.
+    #
+    # Start every game that isn't ready before waiting on any of them, so they
+    # generate in parallel. Fetching their upstream data happens in the
+    # background too, so a slow upstream can't hold the request past its
+    # deadline.
+    unready_ids = [game['id'] for game in games
+                   if not is_game_ready(game['id'])]
+    # Fetch the whole day's games at once rather than one at a time
+    prefetching = (prefetch_pool.submit(prefetch_uncached_games, unready_ids)
+                   if unready_ids else None)
+    pending = {game_id: generate_game_async(game_id, prefetching)
+               for game_id in unready_ids}
+
+    transformed = []
+    for game in games:
+        if game['id'] not in pending:
+            game_updates = generate_game_safely(game['id'])
+        else:
+            timeout = (None if deadline is None
+                       else max(deadline - time.monotonic(), 0))
+            try:
+                game_updates = pending[game['id']].result(timeout)
+            except TimeoutError:
+                transformed.append(None)
+                continue
+        transformed.append(None if game_updates is None
+                           else transform_game(game, game_updates))
+    return transformed
+
+
+def update_for_play(game_updates, play_count):
+    if isinstance(game_updates, GameArchive):
+        # Avoid decoding the whole game
+        return game_updates.update_for_play(play_count)
+
+    return next((u for u in game_updates
+                 if u.data['playCount'] == play_count), None)
+
+
+def transform_schedule(schedule, deadline):
+    # Returns the transformed schedule as JSON
+    scheduler.observe_schedule(schedule)
+
+    pieces = [memoized_json(game) for game in schedule]
+    changed = [(i, game) for i, game in enumerate(schedule)
+               if pieces[i] is None]
+    if changed:
+        transformed = transform_games([game for _, game in changed], deadline)
+        for (i, game), transformed_game in zip(changed, transformed):
+            if transformed_game is None:
+                # Stale while revalidate: the last version of the game that
+                # was sent, or failing that the real one. It's not memoized
+                # so that a later poll picks up the transformed version.
+                pieces[i] = dumps(last_transformed.get(game['id'], game))
+            else:
+                pieces[i] = dumps(transformed_game)
+                memoize_json(game, pieces[i])
+                if game['finalized']:
+                    season_stats.record_result(game, transformed_game)
+
+    return '[' + ','.join(pieces) + ']'
+
+
+# Where each stream item keeps its games, standings included
+STREAM_GAMES_PATH = ('items', EVERY, 'data', 'value', 'games')
+
+
+def is_schedule(schedule):
+    return (isinstance(schedule, list) and len(schedule) > 0 and
+            all(isinstance(game, dict) for game in schedule))
 
 
 def get_stream(resp):
-    stream_records = resp.json()
+    deadline_seconds = app.config['GENERATION_DEADLINE_SECONDS']
+    deadline = (time.monotonic() + deadline_seconds
+                if deadline_seconds > 0 else None)
+    # Only the schedules and standings are parsed. Everything else in the
+    # stream (leagues, temporal, ...) is passed through untouched.
+    # JSON is always UTF-8, and resp.text would guess the encoding
+    #
+    # Stream item index -> season, day and finished games of its schedule,
+    # for adjusting the same item's standings
+    schedules_seen = {}
+
+    def transform_stream_schedule(schedule, location):
+        if not is_schedule(schedule):
+            return dumps(schedule)
+        schedules_seen[location[1]] = (
+            schedule[0]['season'], schedule[0]['day'],
+            [game['id'] for game in schedule if game['finalized']])
+        return transform_schedule(schedule, deadline)
+
+    def transform_standings(standings, location):
+        if not (isinstance(standings, dict) and
+                isinstance(standings.get('wins'), dict) and
+                isinstance(standings.get('losses'), dict)):
+            return dumps(standings)
+        seen = schedules_seen.get(location[1])
+        if seen is None:
+            return dumps(standings)
+        season, day, finalized_ids = seen
+        return dumps(season_stats.apply_to_standings(standings, season, day,
+                                                     finalized_ids))
+
+    def transform_stream_games(value, location):
+        if location[-1] == 'schedule':
+            return transform_stream_schedule(value, location)
+        return transform_standings(value, location)
+
+    # Schedules are transformed before any standings, wherever they are in
+    # the item
+    body = rewrite_path_raw(resp.content.decode('utf-8'),
+                            STREAM_GAMES_PATH + (('schedule', 'standings'),),
+                            transform_stream_games)
+    return Response(body, resp.status_code, mimetype='application/json')
+
+
+def local_games_for_day(season, day):
+    # Every game for the day that can be served without going upstream
+    games = {}
+    if game_store is not None:
+        for game_id in game_store.games_for_day(season, day):
+            games[game_id] = game_store.archive(game_id)
+
+    for game_id in game_cache.game_ids():
+        game_updates = game_cache.peek(game_id)
+        if (game_updates is not None and
+                game_updates[0].data['season'] == season and
+                game_updates[0].data['day'] == day):
+            games[game_id] = game_updates
+
+    return games
+
+
+def update_at_time(game_updates, at):
+    if isinstance(game_updates, GameArchive):
+        # Avoid decoding anything but the one update
+        index = bisect_right(game_updates.timestamps, to_microseconds(at))
+    else:
+        # Same as bisect_right on the updates' timestamps
+        index, high = 0, len(game_updates)
+        while index < high:
+            middle = (index + high) // 2
+            if at < game_updates[middle].timestamp:
+                high = middle
+            else:
+                index = middle + 1
+
+    # Games that haven't started yet show their first update
+    return game_updates[max(index - 1, 0)]
+
+
+@app.route('/noel/replay')
+def replay():
+    # Transformed games for a day as they were at any instant, served entirely
+    # from the local cache and store. Season and day are 0-indexed, like in
+    # the stream.
+    try:
+        season = int(request.args['season'])
+        day = int(request.args['day'])
+        at = isoparse(request.args['at'])
+    except (KeyError, ValueError):
+        return jsonify({'error': "season, day and at are required"}), 400
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+
+    games = local_games_for_day(season, day)
+    return jsonify({
+        'at': at.isoformat(),
+        'games': {
+            'schedule': [update_at_time(game_updates, at).data
+                         for game_updates in games.values()],
+        },
+    })
+
+
+@app.route('/noel/internal/transform', methods=['POST'])
+def internal_transform():
+    # Another node's stream request, for the games this node owns. Takes the
+    # upstream games and how long the other node can wait, and returns the
+    # transformed games, with null for any that weren't ready in time.
+    if cluster_ring is None:
+        return jsonify({'error': "Not found"}), 404
+    if not is_bearer(app.config['CLUSTER_TOKEN']):
+        return jsonify({'error': "Not authorized"}), 401
+
+    body = request.get_json(silent=True) or {}
+    games = body.get('games')
+    if not isinstance(games, list):
+        return jsonify({'error': "games is required"}), 400
+    deadline_seconds = body.get('deadlineSeconds')
+    deadline = (None if deadline_seconds is None
+                else time.monotonic() + deadline_seconds)
+
+    # Clients may never ask this node for a stream, so this is how its
+    # scheduler finds out what day it is
+    scheduler.observe_schedule(games)
+
+    # Every node polls the same games, so the memo saves the owner from
+    # transforming each one once per node
+    pieces = [memoized_json(game) for game in games]
+    changed = [(i, game) for i, game in enumerate(games) if pieces[i] is None]
+    if changed:
+        transformed = transform_local_games([game for _, game in changed],
+                                            deadline)
+        for (i, game), transformed_game in zip(changed, transformed):
+            if transformed_game is None:
+                pieces[i] = 'null'
+            else:
+                pieces[i] = dumps(transformed_game)
+                memoize_json(game, pieces[i])
+
+    return Response('{"games":[' + ','.join(pieces) + ']}',
+                    mimetype='application/json')
+
+
+@app.route('/noel/standings')
+def standings():
+    # Records and player totals over a season's (0-indexed) games in the store
+    # and the ones this worker has generated
+    try:
+        season = int(request.args['season'])
+    except (KeyError, ValueError):
+        return jsonify({'error': "season is required"}), 400
+    return jsonify(season_stats.season_summary(season))
+
+
+@app.route('/noel/cache/stats')
+def cache_stats():
+    return jsonify({**game_cache.stats(), 'failed': len(failed_games),
+                    'generating': len(generating_games),
+                    'scheduler': scheduler.stats(),
+                    'upstream': {
+                        **upstream.stats(),
+                        'queuedSeconds': upstream_limiter.queued_seconds(),
+                        'generationQueuedSeconds':
+                            generation_upstream_limiter.queued_seconds(),
+                    }})
+
+
+def resident_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # Not Linux. Peak is the best there is, and it's in KiB.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@app.route('/noel/process')
+def process_stats():
+    # Per worker, so the load tester can tell workers apart by pid
+    return jsonify({
+        'pid': os.getpid(),
+        'rss': resident_bytes(),
+        'cacheSize': game_cache.size,
+        'cachedGames': len(game_cache),
+    })
+
+
+def is_bearer(token):
+    return hmac.compare_digest(request.headers.get('Authorization', ''),
+                               f"Bearer {token}")
+
+
+def admin_route(rule, **options):
+    def decorator(f):
+        @wraps(f)
+        def check_token(*args, **kwargs):
+            # Without a token there's no way to tell who's asking, and the
+            # proxy is public, so the admin routes may as well not exist
+            token = app.config['ADMIN_TOKEN']
+            if not token:
+                return jsonify({'error': "Not found"}), 404
+            if not is_bearer(token):
+                return jsonify({'error': "Not authorized"}), 401
+            return f(*args, **kwargs)
+
+        return app.route(rule, **options)(check_token)
+
+    return decorator
+
+
+def admin_game_ids():
+    # Game ids from the request body's gameIds, or every game on the day given
+    # by its season and day (0-indexed, like in the stream). Returns None if
+    # the body has neither, or they aren't a list of ids and two numbers.
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return None
+    if 'gameIds' in body:
+        game_ids = body['gameIds']
+        if not (isinstance(game_ids, list) and
+                all(isinstance(game_id, str) for game_id in game_ids)):
+            return None
+        return game_ids
+    if 'season' in body and 'day' in body:
+        if not all(isinstance(body[key], int) and
+                   not isinstance(body[key], bool) and body[key] >= 0
+                   for key in ['season', 'day']):
+            return None
+        # blaseball_mike wants these 1-indexed
+        return [game['gameId'] for game in chronicler.get_games(
+            season=body['season'] + 1, day=body['day'] + 1)]
+    return None
+
+
+@admin_route('/noel/admin/cache')
+def admin_cache():
+    return jsonify({
+        **game_cache.stats(),
+        'games': game_cache.entries(),
+        'failed': {game_id: vars(failure) for game_id, failure
+                   in failed_games.failures().items()},
+        'generating': list(generating_games.keys()),
+        'store': 0 if game_store is None else len(game_store),
+        'scheduler': scheduler.stats(),
+    })
+
+
+@admin_route('/noel/admin/memory')
+def admin_memory():
+    if memory_accounting is None:
+        return jsonify({'error': "Memory accounting is off. Set "
+                                 "NOEL_MEMORY_ACCOUNTING to turn it on."}), 404
+    return jsonify(memory_accounting.summary())
+
+
+@admin_route('/noel/admin/memory/<game_id>')
+def admin_game_memory(game_id):
+    if memory_accounting is None:
+        return jsonify({'error': "Memory accounting is off. Set "
+                                 "NOEL_MEMORY_ACCOUNTING to turn it on."}), 404
+    game = memory_accounting.get(game_id)
+    if game is None:
+        return jsonify({'error': "This worker hasn't generated that game"}), \
+            404
+    return jsonify({'gameId': game_id, 'cached': game_id in game_cache,
+                    **game.to_json()})
+
+
+def invalidate_here(game_ids):
+    for game_id in game_ids:
+        game_cache.invalidate(game_id)
+        failed_games.clear(game_id)
+        take_prefetched(game_id)
+        forget_transformed(game_id)
+        # A bad game may well be down to a bad recording
+        if recordings.recording_cache is not None:
+            recordings.recording_cache.invalidate(game_id)
+
+
+def warm_here(game_ids):
+    # Generation happens in the background
+    queued = [game_id for game_id in game_ids
+              if remote_owner(game_id) is None and not is_game_ready(game_id)]
+    for game_id in queued:
+        failed_games.clear(game_id)  # Asking for it is a good reason to retry
+
+    prefetching = prefetch_pool.submit(prefetch_uncached_games, queued)
+    for game_id in queued:
+        generate_game_async(game_id, prefetching)
+
+
+ADMIN_ACTIONS = {
+    'invalidate': invalidate_here,
+    'warm': warm_here,
+}
+
+
+@app.before_request
+def catch_up_admin_actions():
+    # Carry out the admin actions other workers took since this one last
+    # checked. A worker that isn't serving anything catches up when it next
+    # does, which is the first time it could send anything out of date.
+    for action, game_ids in admin_log.read_new():
+        if action in ADMIN_ACTIONS:
+            ADMIN_ACTIONS[action](game_ids)
+
+
+def take_admin_action(action, game_ids):
+    # For every worker on this node, this one included
+    admin_log.append(action, game_ids)
+    catch_up_admin_actions()
+
+
+def forward_admin_action(action, game_ids):
+    # Sends each game to the node that owns it, which has the only generated
+    # copy. Returns each node's response, or the error for nodes that
+    # couldn't be reached.
+    ids_by_owner = {}
+    for game_id in game_ids:
+        owner = remote_owner(game_id)
+        if owner is not None:
+            ids_by_owner.setdefault(owner, []).append(game_id)
+
+    responses = {}
+    for owner, owner_ids in ids_by_owner.items():
+        try:
+            resp = cluster_session.post(
+                owner + 'noel/internal/admin/' + action,
+                json={'gameIds': owner_ids}, headers=cluster_headers(),
+                timeout=app.config['CLUSTER_TIMEOUT_SECONDS'])
+            resp.raise_for_status()
+            responses[owner] = resp.json()
+        except (requests.RequestException, ValueError) as e:
+            app.logger.exception("Couldn't send %s to %s", action, owner)
+            responses[owner] = {'error': str(e)}
+    return responses
+
+
+# The responses to these only describe the worker that got the request (pid
+# says which) and the owners it forwarded games to. The other workers on each
+# node do the same when they next serve a request.
+@admin_route('/noel/admin/cache/invalidate', methods=['POST'])
+def admin_invalidate():
+    game_ids = admin_game_ids()
+    if game_ids is None:
+        return jsonify({'error': "gameIds (a list of game ids), or season "
+                                 "and day, are required"}), 400
+
+    invalidated = [game_id for game_id in game_ids if game_id in game_cache]
+    # Invalidated here as well as on the owner, because this node remembers
+    # what it last sent of the games it forwarded
+    take_admin_action('invalidate', game_ids)
     return jsonify({
-        **stream_records,
-        'items': [transform_item(item) for item in stream_records['items']]
+        'invalidated': invalidated,
+        # The store is read-only. Those have to be fixed by rebuilding it.
+        'inStore': [game_id for game_id in game_ids
+                    if game_store is not None and game_id in game_store],
+        'pid': os.getpid(),
+        'nodes': forward_admin_action('invalidate', game_ids),
     })
 
 
+@admin_route('/noel/admin/cache/warm', methods=['POST'])
+def admin_warm():
+    game_ids = admin_game_ids()
+    if game_ids is None:
+        return jsonify({'error': "gameIds (a list of game ids), or season "
+                                 "and day, are required"}), 400
+
+    # Watch /noel/admin/cache for generation to finish
+    queued = [game_id for game_id in game_ids
+              if remote_owner(game_id) is None and not is_game_ready(game_id)]
+    take_admin_action('warm', game_ids)
+    return jsonify({
+        'queued': queued,
+        'pid': os.getpid(),
+        'nodes': forward_admin_action('warm', game_ids),
+    })
+
+
+@app.route('/noel/internal/admin/<action>', methods=['POST'])
+def internal_admin(action):
+    # An admin action another node forwarded for the games this node owns
+    if cluster_ring is None or action not in ADMIN_ACTIONS:
+        return jsonify({'error': "Not found"}), 404
+    if not is_bearer(app.config['CLUSTER_TOKEN']):
+        return jsonify({'error': "Not authorized"}), 401
+
+    body = request.get_json(silent=True)
+    game_ids = body.get('gameIds') if isinstance(body, dict) else None
+    if not (isinstance(game_ids, list) and
+            all(isinstance(game_id, str) for game_id in game_ids)):
+        return jsonify({'error': "gameIds is required"}), 400
+
+    if action == 'invalidate':
+        result = {'invalidated': [game_id for game_id in game_ids
+                                  if game_id in game_cache]}
+    else:
+        result = {'queued': [game_id for game_id in game_ids
+                             if not is_game_ready(game_id)]}
+    take_admin_action(action, game_ids)
+    return jsonify({**result, 'pid': os.getpid()})
+
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def catch_all(path):
-    resp = requests.request(
-        method=request.method,
-        url=request.url.replace(request.host_url, 'https://api.sibr.dev/'),
-        headers={key: value for (key, value) in request.headers if
-                 key != 'Host'},
-        data=request.get_data(),
-        cookies=request.cookies,
-        allow_redirects=False)
+    url = request.url.replace(request.host_url, app.config['UPSTREAM_URL'])
+    headers = {key: value for (key, value) in request.headers if
+               key != 'Host'}
+    try:
+        if request.method == 'GET':
+            # Everything upstream is public, so a response to one client is
+            # as good as a response to any other
+            resp = upstream.get(url, headers=headers, allow_redirects=False)
+        else:
+            resp = upstream.request(request.method, url, headers=headers,
+                                    data=request.get_data(),
+                                    cookies=request.cookies,
+                                    allow_redirects=False)
+    except UpstreamBusy:
+        return Response("Upstream is busy, try again later", 503,
+                        {'Retry-After': str(max(1, round(
+                            upstream_limiter.queued_seconds())))})
 
     if 'type' in request.values and request.values['type'] == 'Stream':
         return get_stream(resp)
@@ -0,0 +1,74 @@
+import argparse
+import contextlib
+import io
+import json
+import pickle
+import sys
+import timeit
+
+from game_transformer import generate_game
+from game_transformer.archive import dumps_game, loads_game
+from game_transformer.state import use_universe
+from perf_budget import CORPUS_DIR, load_corpus, corpus_universe, \
+    corpus_prefetched
+
+# Times loading whole games from archives against unpickling them and parsing
+# them as JSON, for the games in the perf_budget.py corpus. Loading a whole
+# game is what a store lookup costs when a stream asks for every update, so
+# archives have to stay well ahead of the obvious alternatives.
+#
+#   python archive_benchmark.py          fail if archives aren't fast enough
+#
+# How many times faster than unpickling loading an archive has to be
+MIN_SPEEDUP = 1.5
+TIMING_RUNS = 7
+LOADS_PER_RUN = 50
+
+
+def best_seconds(fn):
+    return min(timeit.repeat(fn, number=LOADS_PER_RUN,
+                             repeat=TIMING_RUNS)) / LOADS_PER_RUN
+
+
+def measure_game(corpus_game):
+    with use_universe(corpus_universe(corpus_game)), \
+            contextlib.redirect_stdout(io.StringIO()):
+        updates = generate_game(corpus_game['gameId'],
+                                corpus_prefetched(corpus_game))
+
+    archived = dumps_game(updates)
+    pickled = pickle.dumps(updates, pickle.HIGHEST_PROTOCOL)
+    as_json = json.dumps([[update.timestamp.isoformat(), update.data]
+                          for update in updates])
+    return {
+        'updates': len(updates),
+        'archive': best_seconds(lambda: loads_game(archived)),
+        'pickle': best_seconds(lambda: pickle.loads(pickled)),
+        'json': best_seconds(lambda: json.loads(as_json)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare loading whole games from archives with pickle "
+                    "and JSON")
+    parser.add_argument('--corpus', default=CORPUS_DIR)
+    args = parser.parse_args()
+
+    failed = False
+    for corpus_game in load_corpus(args.corpus):
+        times = measure_game(corpus_game)
+        speedup = times['pickle'] / times['archive']
+        print(f"{corpus_game['gameId']} ({times['updates']} updates)")
+        for name in ['archive', 'pickle', 'json']:
+            print(f"  {name:8} {times[name] * 1000:7.2f}ms")
+        print(f"  {speedup:.1f}x faster than pickle, "
+              f"{times['json'] / times['archive']:.1f}x faster than JSON")
+        if speedup < MIN_SPEEDUP:
+            print(f"  Under {MIN_SPEEDUP}x faster than pickle")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,13 @@
 import random
-import re
 from copy import deepcopy
-from typing import Optional, List
+from dataclasses import dataclass
+from typing import Optional, List, Tuple, Dict, Any
 
 from game_transformer.GameRecorder import GameRecorder, PitchType, Pitch, \
-    StealDecision
-from game_transformer.state import PlayerState, TeamState, first_truthy
+    StealDecision, PitchSource, StealSource
+from game_transformer.state import PlayerState, TeamState, Universe, \
+    first_truthy
+from game_transformer.stats import GameStats, PitchingLine
 
 HIT_NAME = {
     0: 'Single',
@@ -28,14 +30,58 @@ NAME_FROM_BASE = {
     3: 'fourth'
 }
 
+# A good checkpoint_interval for producers that will seek. Checkpoints cost
+# around a quarter of the time it takes to produce a game, so producers don't
+# take them unless asked to. See GameProducer.seek
+CHECKPOINT_INTERVAL = 25
+
+EXPECTATIONS = [
+    'expects_lets_go',
+    'expects_play_ball',
+    'expects_half_inning_start',
+    'expects_batter_up',
+    'expects_pitch',
+    'expects_inning_end',
+    'expects_game_end',
+]
+
+
+@dataclass
+class ProducerCheckpoint:
+    # Play count of the producer when the checkpoint was taken
+    play_count: int
+    # The last update produced before the checkpoint was taken, or None if it
+    # was taken before producing anything
+    update: Optional[dict]
+    expectations: Tuple[bool, ...]
+    game_update: dict
+    home: dict
+    away: dict
+    # Prefix of the batting team's recorder, if anyone has batted yet
+    active_recorder: Optional[str]
+    pitch_source: Optional[tuple]
+    steal_sources: Dict[str, tuple]
+    random_state: Any
+    stats: GameStats
+
 
 class GameProducer:
     def __init__(self, updates: List[dict], home_recorder: GameRecorder,
-                 away_recorder: GameRecorder):
+                 away_recorder: GameRecorder, seed=None,
+                 checkpoint_interval: Optional[int] = None,
+                 universe: Optional[Universe] = None):
         self.updates = updates
         self.home_recorder = home_recorder
         self.away_recorder = away_recorder
 
+        # Every random draw for this game comes from here, so the game comes
+        # out the same no matter what else the process has generated. Defaults
+        # to seeding with the game id.
+        self.random = random.Random(
+            updates[0]['data']['id'] if seed is None else seed)
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoints: List[ProducerCheckpoint] = []
+
         self.expects_lets_go = True
         self.expects_play_ball = False
         self.expects_half_inning_start = False
@@ -52,11 +98,15 @@ class GameProducer:
         self.game_start = time_update['timestamp']
 
         # Chronicler adds timestamp so I can depend on it existing
-        self.home = TeamState(updates, self.game_start, 'home')
-        self.away = TeamState(updates, self.game_start, 'away')
+        self.home = TeamState(updates, self.game_start, 'home', universe)
+        self.away = TeamState(updates, self.game_start, 'away', universe)
 
-        self.active_pitch_source = None
-        self.steal_sources = {}
+        self.active_recorder: Optional[GameRecorder] = None
+        self.inactive_recorder: Optional[GameRecorder] = None
+        self.active_pitch_source: Optional[PitchSource] = None
+        self.steal_sources: Dict[str, StealSource] = {}
+        # Box score of the generated game, kept as it's produced
+        self.stats = GameStats()
 
         self.game_update = {
             'id': updates[0]['data']['id'],
@@ -141,6 +191,10 @@ class GameProducer:
                                                    'homeTeamSecondaryColor'),
         }
 
+        # The start of the game is always a checkpoint, so seek always has
+        # somewhere to start from, even with no checkpoint_interval
+        self.checkpoints.append(self.checkpoint(None))
+
     def prefix(self, negate=False):
         if self.game_update['topOfInning'] != negate:
             return 'away'
@@ -157,6 +211,9 @@ class GameProducer:
         team_state = self.batting_team()
         return team_state.lineup[team_state.batter_index]
 
+    def pitching_line(self) -> PitchingLine:
+        return self.stats.pitcher(self.fielding_team().pitcher.id)
+
     def batting_team(self) -> TeamState:
         return self.away if self.game_update['topOfInning'] else self.home
 
@@ -198,8 +255,90 @@ class GameProducer:
         self.game_update['scoreUpdate'] = ""
         self.game_update['scoreLedger'] = ""
 
+        play_count = self.game_update['playCount']
+        if (self.checkpoint_interval and play_count >=
+                self.checkpoints[-1].play_count + self.checkpoint_interval):
+            self.checkpoints.append(self.checkpoint(return_val))
+
         return return_val
 
+    def checkpoint(self, update: Optional[dict]) -> ProducerCheckpoint:
+        # Everything that changes while producing, so that producing can pick
+        # up from here later, and the update that was just produced. The
+        # recorders don't change, so they're left out.
+        return ProducerCheckpoint(
+            play_count=self.game_update['playCount'],
+            update=deepcopy(update),
+            expectations=tuple(getattr(self, name) for name in EXPECTATIONS),
+            game_update=deepcopy(self.game_update),
+            home=self.home.to_state(),
+            away=self.away.to_state(),
+            active_recorder=(None if self.active_recorder is None
+                             else self.active_recorder.prefix),
+            pitch_source=(None if self.active_pitch_source is None
+                          else self.active_pitch_source.state()),
+            steal_sources={runner_id: source.state() for runner_id, source
+                           in self.steal_sources.items()},
+            random_state=self.random.getstate(),
+            stats=deepcopy(self.stats),
+        )
+
+    def restore(self, checkpoint: ProducerCheckpoint):
+        for name, value in zip(EXPECTATIONS, checkpoint.expectations):
+            setattr(self, name, value)
+        self.game_update = deepcopy(checkpoint.game_update)
+        self.home = TeamState.from_state(checkpoint.home)
+        self.away = TeamState.from_state(checkpoint.away)
+
+        if checkpoint.active_recorder is None:
+            self.active_recorder = self.inactive_recorder = None
+        elif checkpoint.active_recorder == self.home_recorder.prefix:
+            self.active_recorder = self.home_recorder
+            self.inactive_recorder = self.away_recorder
+        else:
+            self.active_recorder = self.away_recorder
+            self.inactive_recorder = self.home_recorder
+
+        self.active_pitch_source = (
+            None if checkpoint.pitch_source is None
+            else self._restore_source(PitchSource, checkpoint.pitch_source))
+        self.steal_sources = {
+            runner_id: self._restore_source(StealSource, state)
+            for runner_id, state in checkpoint.steal_sources.items()}
+        self.random.setstate(checkpoint.random_state)
+        self.stats = deepcopy(checkpoint.stats)
+
+    def _restore_source(self, source_class, state):
+        prefix, player_id, appearance_count, position = state
+        recorder = (self.home_recorder if prefix == self.home_recorder.prefix
+                    else self.away_recorder)
+        source = source_class(recorder, player_id, appearance_count,
+                              self.random)
+        source.position = position
+        return source
+
+    def seek(self, play_count: int) -> Optional[dict]:
+        # Returns the first update at or after play_count, running forward
+        # from the closest checkpoint at or before it rather than from the
+        # start. Producing carries on from there. Returns None if the game ends
+        # first.
+        earlier = [c for c in self.checkpoints
+                   if c.play_count <= max(play_count, 0)]
+        checkpoint = earlier[-1]
+        if checkpoint.update is not None and \
+                checkpoint.update['playCount'] >= play_count:
+            # The update it was taken after is the one
+            self.restore(checkpoint)
+            return deepcopy(checkpoint.update)
+        if not (checkpoint.play_count <= self.game_update['playCount'] <
+                play_count):
+            self.restore(checkpoint)
+
+        for update in self:
+            if update['playCount'] >= play_count:
+                return update
+        return None
+
     def _lets_go(self):
         self.expects_lets_go = False
         self.expects_play_ball = True
@@ -295,7 +434,8 @@ class GameProducer:
 
         # Set up pitch source
         self.active_pitch_source = self.active_recorder.pitches_for(
-            self.batter().id, self.batting_team().appearance_count)
+            self.batter().id, self.batting_team().appearance_count,
+            self.random)
 
     def _pitch(self):
         did_steal = self._maybe_steal()
@@ -338,6 +478,11 @@ class GameProducer:
     def _walk(self):
         self.game_update['lastUpdate'] = f"{self.batter().name} draws a walk."
 
+        batting = self.stats.batter(self.batter().id)
+        batting.plate_appearances += 1
+        batting.walks += 1
+        self.pitching_line().walks += 1
+
         self._player_to_base(self.batter(), 0)  # no base instincts
         self._end_atbat()
 
@@ -350,8 +495,24 @@ class GameProducer:
         if (pitch.pitch_type == PitchType.FIELDERS_CHOICE or
                 pitch.pitch_type == PitchType.DOUBLE_PLAY):
             # This was a FC or DP converted to a normal out. Pick random fielder
-            return random.choice(self.fielding_team().lineup)
+            return self.random.choice(self.fielding_team().lineup)
+
+        if not pitch.original_text:
+            # Drawn from the tendency index, so there's no fielder to find
+            return self.random.choice(self.fielding_team().lineup)
 
+        if pitch.fielder_name is not None:
+            replacement_map = self.inactive_recorder.replacement_map
+            if pitch.fielder_name in replacement_map:
+                idx = replacement_map[pitch.fielder_name]
+                return self.fielding_team().lineup[idx]
+
+            idx = self.fielding_team().lineup_index_by_name(pitch.fielder_name)
+            if idx is not None:
+                return self.fielding_team().lineup[idx]
+
+        # Couldn't parse the fielder out of the text, so fall back to searching
+        # it for every fielder's name
         possible_fielders = [self.fielding_team().lineup[idx] for name, idx
                              in self.inactive_recorder.replacement_map.items()
                              if description(name) in pitch.original_text]
@@ -377,6 +538,10 @@ class GameProducer:
             f"{batter.name} hit a {out_text} to {fielder.name}."
         )
 
+        batting = self.stats.batter(batter.id)
+        batting.plate_appearances += 1
+        batting.at_bats += 1
+
         self._maybe_advance_baserunners(pitch)
         self._out()
 
@@ -443,7 +608,8 @@ class GameProducer:
             try:
                 advance_by = pitch.advancements[runner_id]
             except KeyError:
-                advance_by = self.active_recorder.random_advancement(runner_id)
+                advance_by = self.active_recorder.random_advancement(
+                    runner_id, self.random)
 
             # Prevent them from advancing to a base someone else is on
             if next_occupied_base is not None:
@@ -456,6 +622,7 @@ class GameProducer:
 
     def _out(self, for_batter=True):
         self.game_update['halfInningOuts'] += 1
+        self.pitching_line().outs += 1
 
         if self.game_update['halfInningOuts'] >= 3:  # no maintenance mode
             self._end_half_inning(for_batter)
@@ -536,6 +703,12 @@ class GameProducer:
         if self.game_update['atBatStrikes'] >= 3:  # 3 strikes only
             description = f"{self.batter().name} strikes out {kind}"
             self.game_update['lastUpdate'] = description
+
+            batting = self.stats.batter(self.batter().id)
+            batting.plate_appearances += 1
+            batting.at_bats += 1
+            batting.strikeouts += 1
+            self.pitching_line().strikeouts += 1
             self._out()
         else:
             self._output_count_description("Strike, " + kind)
@@ -557,9 +730,21 @@ class GameProducer:
         else:
             desc = f"{batter.name} hit a {num_runners + 1}-run home run!"
 
+        batting = self.stats.batter(batter.id)
+        batting.plate_appearances += 1
+        batting.at_bats += 1
+        batting.hits += 1
+        batting.home_runs += 1
+        pitching = self.pitching_line()
+        pitching.hits += 1
+        pitching.home_runs += 1
+
         # Score everyone directly
+        batting.runs += 1
         runs_scored = self._score_runs(1)
         for runner_i in reversed(range(len(self.game_update['basesOccupied']))):
+            runner_id = self.game_update['baseRunners'][runner_i]
+            self.stats.batter(runner_id).runs += 1
             self._remove_baserunner_by_index(runner_i)
             runs_scored += self._score_runs(1)
         self._record_runs(runs_scored)
@@ -576,6 +761,18 @@ class GameProducer:
         self.game_update['lastUpdate'] = (f"{batter.name} hits a "
                                           f"{HIT_NAME[pitch.base_reached]}!")
 
+        batting = self.stats.batter(batter.id)
+        batting.plate_appearances += 1
+        batting.at_bats += 1
+        # Fielder's choices come through here too, but aren't hits
+        if pitch.pitch_type == PitchType.HIT:
+            batting.hits += 1
+            if pitch.base_reached == 1:
+                batting.doubles += 1
+            elif pitch.base_reached == 2:
+                batting.triples += 1
+            self.pitching_line().hits += 1
+
         # Everyone always advances at least the number of bases corresponding to
         # the hit
         for i, prev_base in enumerate(self.game_update['basesOccupied']):
@@ -602,6 +799,8 @@ class GameProducer:
                 description = f"\n{player_name} scores!"
             self.game_update['lastUpdate'] += description
 
+            runner_id = self.game_update['baseRunners'][runner_i]
+            self.stats.batter(runner_id).runs += 1
             self._remove_baserunner_by_index(runner_i)
             runs_scored += self._score_runs(1)
         self._record_runs(runs_scored)
@@ -638,6 +837,7 @@ class GameProducer:
         del self.steal_sources[runner_id]
 
     def _score_runs(self, runs: float):
+        self.pitching_line().runs += runs
         self.game_update[self.prefix() + 'Score'] += runs
         self.game_update['halfInningScore'] += runs
         self.game_update[self.top_or_bottom() + 'InningScore'] += runs
@@ -668,7 +868,7 @@ class GameProducer:
 
         # Player can now steal! Get a source of steal decisions
         self.steal_sources[batter.id] = self.active_recorder.get_steal_source(
-            batter.id, self.batting_team().appearance_count)
+            batter.id, self.batting_team().appearance_count, self.random)
         # The steal source contains an extra decision (from the event where the
         # player got on base, which shouldn't have a decision but does for
         # reasons) and it's hard to fix it to not record that decision. Much
@@ -699,10 +899,15 @@ class GameProducer:
         if len(self.game_update['baseRunners']) == 1:
             return 0, None
 
-        match = re.search(r"out at (first|second|third|fourth|fifth) base",
-                          pitch.original_text)
-        assert match is not None
-        out_at_base = BASE_FROM_NAME[match.group(1)]
+        if pitch.out_base_name is None:
+            if pitch.original_text:
+                raise RuntimeError("Couldn't find who was out on a fielder's "
+                                   "choice")
+            # Drawn from the tendency index, which doesn't know who was out.
+            # Default to the player farthest from scoring.
+            return len(self.game_update['baseRunners']) - 1, None
+
+        out_at_base = BASE_FROM_NAME[pitch.out_base_name]
 
         # If the player from the original out is on base, prefer them
         for index, name in enumerate(self.game_update['baseRunnerNames']):
@@ -732,13 +937,13 @@ class GameProducer:
                     # Then it's not plausible, return None
                     return index, None
                 # If I didn't return None yet, the original base is plausible
-                return index, match.group(1)
+                return index, pitch.out_base_name
 
         # Find whichever player can advance to whichever base the original out
         # was on. Iterates from third to first, which is forwards in the list.
         for index, base in enumerate(self.game_update['basesOccupied']):
             if base < out_at_base:
-                return index, match.group(1)
+                return index, pitch.out_base_name
 
         # If all else fails, default to the player farthest from scoring
         return len(self.game_update['baseRunners']) - 1, None
@@ -789,6 +994,8 @@ class GameProducer:
     def _steal_base(self, runner_i: int):
         self.game_update['basesOccupied'][runner_i] += 1
         thief_name = self.game_update['baseRunnerNames'][runner_i]
+        self.stats.batter(
+            self.game_update['baseRunners'][runner_i]).stolen_bases += 1
         base_name = NAME_FROM_BASE[self.game_update['basesOccupied'][runner_i]]
 
         self.game_update['lastUpdate'] = (
@@ -799,6 +1006,8 @@ class GameProducer:
         base_attempted = self.game_update['basesOccupied'][runner_i] + 1
         thief_name = self.game_update['baseRunnerNames'][runner_i]
         base_name = NAME_FROM_BASE[base_attempted]
+        self.stats.batter(
+            self.game_update['baseRunners'][runner_i]).caught_stealing += 1
 
         self._remove_baserunner_by_index(runner_i)
         self._out(for_batter=False)
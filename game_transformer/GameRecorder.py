@@ -1,31 +1,14 @@
 import random
-import re
 from collections import defaultdict
 from dataclasses import dataclass
 from datetime import timedelta
-from enum import Enum, auto
-from itertools import chain
 from typing import Optional, Any, Dict, List, Tuple
 
-from blaseball_mike.models import Player, Team
 from dateutil.parser import isoparse
 
-from game_transformer.state import TeamState, PlayerState
-
-random.seed(0)  # For stability while testing
-
-
-class PitchType(Enum):
-    BALL = auto()
-    STRIKE_LOOKING = auto()
-    STRIKE_SWINGING = auto()
-    FOUL = auto()
-    HIT = auto()
-    HOME_RUN = auto()
-    FLYOUT = auto()
-    GROUND_OUT = auto()
-    FIELDERS_CHOICE = auto()
-    DOUBLE_PLAY = auto()
+from game_transformer.classifier import PitchType, StealDecision, \
+    ClassifiedEvent, classify_event
+from game_transformer.state import TeamState, Universe, current_universe
 
 
 @dataclass
@@ -36,143 +19,114 @@ class Pitch:
     base_reached: int  # if player reached base
     original_text: str
     advancements: Dict[str, int]
+    fielder_name: Optional[str] = None
+    out_base_name: Optional[str] = None
+
+
+# Where players draw from when they did nothing this game, or None for only
+# drawing from this game. Registered by use_tendency_index in
+# game_transformer/tendencies.py, which needs numpy, so it isn't imported here.
+tendency_index: Optional[Any] = None
+
+
+def use_tendencies(index: Optional[Any]):
+    global tendency_index
+    tendency_index = index
+
+
+class PitchSource:
+    # Pitches from one of a batter's appearances, in order, then random pitches
+    # from this batter during this game, or from the tendency index if they
+    # didn't have any this game. Keeps track of how far it's got so
+    # that it can be recreated partway through (see GameProducer.checkpoint).
+    def __init__(self, recorder: 'GameRecorder', player_id: str,
+                 appearance_count: int, rng: random.Random):
+        self.recorder = recorder
+        self.player_id = player_id
+        self.appearance_count = appearance_count
+        self.rng = rng
+        self.position = 0
+
+        self._appearance_pitches = [
+            pitch for pitch in recorder.pitches
+            if pitch.batter_id == player_id and
+            pitch.appearance_count == appearance_count]
+        self._player_pitches = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Pitch:
+        self.position += 1
+        if self.position <= len(self._appearance_pitches):
+            return self._appearance_pitches[self.position - 1]
+
+        if self._player_pitches is None:
+            self._player_pitches = [pitch for pitch in self.recorder.pitches
+                                    if pitch.batter_id == self.player_id]
+        if self._player_pitches:
+            return self.rng.choice(self._player_pitches)
+
+        # has_pitches_for checked that there's something to draw
+        pitch_type, base_reached = tendency_index.draw_pitch(
+            self.player_id, self.rng)
+        # Came from another game, so there's no text to go with it. The
+        # producer picks a fielder at random.
+        return Pitch(batter_id=self.player_id,
+                     appearance_count=self.appearance_count,
+                     pitch_type=pitch_type, base_reached=base_reached,
+                     original_text="", advancements={})
+
+    def state(self):
+        return (self.recorder.prefix, self.player_id, self.appearance_count,
+                self.position)
+
+
+class StealSource:
+    # Steal decisions from one time a runner was on base, in order, then
+    # random decisions from this runner during this game, or from the
+    # tendency index if they didn't make any this game
+    def __init__(self, recorder: 'GameRecorder', player_id: str,
+                 appearance_count: int, rng: random.Random):
+        self.recorder = recorder
+        self.player_id = player_id
+        self.appearance_count = appearance_count
+        self.rng = rng
+        self.position = 0
+
+        self._recorded_steals = recorder.steal_decisions.get(
+            (player_id, appearance_count), [])
+        self._all_steals = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> StealDecision:
+        self.position += 1
+        if self.position <= len(self._recorded_steals):
+            return self._recorded_steals[self.position - 1]
+
+        if self._all_steals is None:
+            self._all_steals = [decision
+                                for (runner_id, _), decisions
+                                in self.recorder.steal_decisions.items()
+                                if runner_id == self.player_id
+                                for decision in decisions]
+
+        if self._all_steals:
+            return self.rng.choice(self._all_steals)
+
+        index = tendency_index
+        decision = (None if index is None
+                    else index.draw_steal_decision(self.player_id, self.rng))
+        if decision is None:
+            # Sucks for you. You don't get to steal ever.
+            return StealDecision.STAY
+        return decision
 
-
-class StealDecision(Enum):
-    STAY = auto()
-    STEAL = auto()
-    CAUGHT = auto()
-
-
-SIMPLE_PITCH_TYPES = {
-    5: PitchType.BALL,  # walk -> ball
-    9: PitchType.HOME_RUN,
-    14: PitchType.BALL,
-    15: PitchType.FOUL,
-    27: PitchType.BALL,  # mild pitch -> ball
-}
-
-NON_PITCH_TYPES = {
-    0,  # let's go
-    1,  # play ball
-    2,  # half inning start
-    3,  # pitcher switch (see https://reblase.sibr.dev/game/
-    # 2c54bafe-c63b-4ec6-8c66-3cdefebfa952#be727d66-0d1a-ba38-24f4-83ffc4a9710f)
-    4,  # base steal
-    11,  # end of game
-    12,  # batter up
-    20,  # solar panels runs overflow
-    21,  # home field advantage
-    24,  # party
-    25,  # strike zapped
-    26,  # weather changes
-    28,  # inning becomes outing
-    30,  # black hole activation
-    31,  # sun2 activation
-    33,  # birds circle, no unshelling
-    34,  # friend of crows
-    35,  # unshelling
-    36,  # triple threat
-    37,  # free refill
-    39,  # coffee bean
-    40,  # feedback swap blocked
-    # 41,  # feedback swap (i need to swap the players in my data)
-    45,  # superallergic reaction
-    47,  # allergic reaction
-    48,  # player gained Reverberating
-    # 49,  # reverb wiggle (i need to swap the players in my data)
-    51,  # blooddrain, normal
-    52,  # blooddrain, siphon
-    53,  # blooddrain, sealant
-    # 54,  # incineration (i need to swap the players in my data)
-    55,  # blocked incineration (fireproof/fire eater)
-    62,  # baserunners swept in Flooding
-    63,  # salmon
-    64,  # polarity shift
-    65,  # enter secret base
-    66,  # exit secret base
-    67,  # consumer attack
-    69,  # echo chamber
-    70,  # grind rail
-    71,  # tunnels
-    72,  # peanut mister
-    73,  # peanut flavor
-    74,  # taste the infinite
-    76,  # event horizon activates
-    77,  # event horizon awaits
-    78,  # solar panels await
-    79,  # solar panels activate
-    84,  # return from elsewhere
-    85,  # over under
-    86,  # under over
-    88,  # undersea
-    91,  # homebody
-    92,  # superyummy
-    93,  # perk
-    96,  # earlbird
-    97,  # late to the party
-    99,  # shame donor
-}
-
-
-def get_pitch_type(feed_event: Dict[str, Any],
-                   game_update: Optional[Dict[str, Any]]):
-    event_type: int = feed_event['type']
-    description = feed_event['description']
-
-    if event_type in SIMPLE_PITCH_TYPES:
-        return SIMPLE_PITCH_TYPES[event_type], None
-    elif event_type == 6:
-        if " strikes out looking." in description:
-            return PitchType.STRIKE_LOOKING, None
-        elif " strikes out swinging." in description:
-            return PitchType.STRIKE_SWINGING, None
-        else:
-            assert ("charmed" in description and
-                    "strike out willingly" in description)
-            return None
-    elif event_type == 7:  # flyout
-        # Seems like flyouts are never FCs (makes sense) or DPs (sure, I guess)
-        assert " hit a flyout to " in description
-        return PitchType.FLYOUT, None
-    elif event_type == 8:  # ground out
-        if " hit a ground out to " in description:
-            return PitchType.GROUND_OUT, None
-        elif " hit into a double play!" in description:
-            return PitchType.DOUBLE_PLAY, None
-        else:
-            assert " reaches on fielder's choice." in description
-            if game_update is None:
-                # Things break if I don't pick one, so assume first
-                return PitchType.FIELDERS_CHOICE, 0
-            else:
-                # The batter must be the last one in the array
-                return (PitchType.FIELDERS_CHOICE,
-                        game_update['basesOccupied'][-1])
-    elif event_type == 10:  # hit
-        if " hits a Single!" in description:
-            return PitchType.HIT, 0
-        elif " hits a Double!" in description:
-            return PitchType.HIT, 1
-        elif " hits a Triple!" in description:
-            return PitchType.HIT, 2
-        elif " hits a Quadruple!" in description:
-            # downgrades ur quadruple
-            return PitchType.HIT, 2
-        else:
-            assert " home run!" in description or " grand slam!" in description
-            return PitchType.HOME_RUN, None
-    elif event_type == 13:
-        if "Strike, swinging" in description:
-            return PitchType.STRIKE_SWINGING, None
-        else:
-            assert ("Strike, looking" in description or
-                    "Strike, flinching" in description)
-            return PitchType.STRIKE_LOOKING, None
-    elif event_type in NON_PITCH_TYPES:
-        return None
-
-    raise RuntimeError("Unknown event type")
+    def state(self):
+        return (self.recorder.prefix, self.player_id, self.appearance_count,
+                self.position)
 
 
 def player_bases(game_event):
@@ -181,14 +135,17 @@ def player_bases(game_event):
 
 
 class GameRecorder:
-    def __init__(self, updates, prefix):
+    def __init__(self, updates, prefix, universe: Optional[Universe] = None):
         self.prefix = prefix
+        # Where lineup changes are loaded from
+        self.universe = current_universe() if universe is None else universe
 
         # Updates with play count 0 have the wrong timestamp
         time_update = next(u for u in updates if u['data']['playCount'] > 0)
 
         # Chronicler adds timestamp so I can depend on it existing
-        self.team = TeamState(updates, time_update['timestamp'], prefix)
+        self.team = TeamState(updates, time_update['timestamp'], prefix,
+                              self.universe)
 
         self.pitches: List[Pitch] = []
         self.prev_known_game_update: Optional[dict] = None
@@ -200,70 +157,119 @@ class GameRecorder:
         # Dict of replacement player names to replaced player indices
         self.replacement_map = {}
 
+    def to_state(self) -> dict:
+        # Everything GameProducer reads from a finished recorder, as plain JSON
+        # types. Steal decisions that are still active are left out because
+        # nothing reads them once recording is done.
+        return {
+            'prefix': self.prefix,
+            'team': self.team.to_state(),
+            'pitches': [[
+                pitch.batter_id, pitch.appearance_count, pitch.pitch_type.name,
+                pitch.base_reached, pitch.original_text, pitch.advancements,
+                pitch.fielder_name, pitch.out_base_name,
+            ] for pitch in self.pitches],
+            'advancements': self.advancements,
+            'stealDecisions': [
+                [runner_id, appearance_count, [d.name for d in decisions]]
+                for (runner_id, appearance_count), decisions
+                in self.steal_decisions.items()],
+            'replacementMap': self.replacement_map,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'GameRecorder':
+        # Skips __init__, which needs the game's updates and loads the team
+        recorder = cls.__new__(cls)
+        recorder.prefix = state['prefix']
+        recorder.universe = current_universe()
+        recorder.team = TeamState.from_state(state['team'])
+        recorder.pitches = [Pitch(
+            batter_id=batter_id,
+            appearance_count=appearance_count,
+            pitch_type=PitchType[pitch_type],
+            base_reached=base_reached,
+            original_text=original_text,
+            advancements=advancements,
+            fielder_name=fielder_name,
+            out_base_name=out_base_name,
+        ) for (batter_id, appearance_count, pitch_type, base_reached,
+               original_text, advancements, fielder_name, out_base_name)
+            in state['pitches']]
+        recorder.prev_known_game_update = None
+        recorder.advancements = defaultdict(lambda: [], state['advancements'])
+        recorder.steal_decisions = {
+            (runner_id, appearance_count): [StealDecision[d]
+                                            for d in decisions]
+            for runner_id, appearance_count, decisions
+            in state['stealDecisions']}
+        recorder.active_steal_decisions = {}
+        recorder.replacement_map = state['replacementMap']
+        return recorder
+
     def record_event(self, feed_event: dict, game_update: Optional[dict]):
         update_type = feed_event['type']
 
-        if update_type == 12:  # Batter up
-            self._batter_up(feed_event)
-        elif update_type == 23:  # shellsewhere
+        if update_type == 23:  # shellsewhere
             self.team.advance_batter()
         else:
-            pitch_info = get_pitch_type(feed_event, game_update)
-            if pitch_info is not None or feed_event['type'] == 4:
-                self._record_steals(feed_event, game_update)
+            event = classify_event(feed_event, game_update)
+            if update_type == 12:  # Batter up
+                self._batter_up(event)
+            elif event.is_pitch or update_type == 4:
+                self._record_steals(event, game_update)
 
-            if pitch_info is not None:
-                pitch_type, base_reached = pitch_info
+            if event.is_pitch:
                 advancements = self.get_advancements(
-                    feed_event, game_update, base_reached)
+                    event, game_update, event.base_reached)
                 self.pitches.append(Pitch(
                     batter_id=self.team.batter().id,
                     appearance_count=self.team.appearance_count,
-                    pitch_type=pitch_type,
-                    base_reached=base_reached,
-                    original_text=feed_event['description'],
-                    advancements=advancements
+                    pitch_type=event.pitch_type,
+                    base_reached=event.base_reached,
+                    original_text=event.description,
+                    advancements=advancements,
+                    fielder_name=event.fielder_name,
+                    out_base_name=event.out_base_name,
                 ))
 
         if game_update is not None:
             self.prev_known_game_update = game_update
 
-    def _batter_up(self, feed_event: dict):
+    def _batter_up(self, event: ClassifiedEvent):
         # Figure out whether the batter actually advanced
-        assert self.team.batter().name != self.team.next_batter().name
+        batter_name = self.team.batter().name
+        next_batter_name = self.team.next_batter().name
+        assert batter_name != next_batter_name
+        nickname = self.team.nickname
 
-        expected_desc = (f"{self.team.next_batter().name} batting for the "
-                         f"{self.team.nickname}")
-        if expected_desc in feed_event['description']:
+        if (next_batter_name, nickname) in event.batting:
             # Regular advancement
             self.team.advance_batter()
             return
 
-        expected_desc = (f"{self.team.batter().name} batting for the "
-                         f"{self.team.nickname}")
-        if expected_desc in feed_event['description']:
+        if (batter_name, nickname) in event.batting:
             # No advancement
             return
 
-        expected_desc = f"is Inhabiting {self.team.next_batter().name}!"
-        if expected_desc in feed_event['description']:
+        if next_batter_name in event.inhabited:
             # Regular advancement + haunting
             self.team.advance_batter()
             return
 
-        expected_desc = f"is Inhabiting {self.team.batter().name}!"
-        if expected_desc in feed_event['description']:
+        if batter_name in event.inhabited:
             # No advancement + haunting
             return
 
         raise RuntimeError("Who is batting?")
 
-    def _record_steals(self, feed_event: dict, game_update: Optional[dict]):
-        self._add_and_remove_from_bases(feed_event)
+    def _record_steals(self, event: ClassifiedEvent,
+                       game_update: Optional[dict]):
+        self._add_and_remove_from_bases(event)
 
         # Record steal decisions for known on-base players
         for runner_id in self.active_steal_decisions.keys():
-            self._record_steal_decision(feed_event, runner_id)
+            self._record_steal_decision(event, runner_id)
 
         if game_update is None:
             return
@@ -275,7 +281,7 @@ class GameRecorder:
                 continue
 
             self._add_to_bases(runner_id)
-            self._record_steal_decision(feed_event, runner_id)
+            self._record_steal_decision(event, runner_id)
 
         # Close out steal decision records for disappeared players
         # Have to make list of keys, otherwise modifying the dict is illegal
@@ -285,75 +291,56 @@ class GameRecorder:
                 # accessible from self.steal_decisions
                 del self.active_steal_decisions[runner_id]
 
-    def _record_steal_decision(self, feed_event, runner_id):
-        runners = [r for r in self.team.lineup if r.id == runner_id]
-        if not runners:
+    def _record_steal_decision(self, event: ClassifiedEvent, runner_id):
+        runner = self.team.lineup_player_by_id(runner_id)
+        if runner is None:
             # Must be a ghost
             return
-        assert len(runners) == 1
-        runner = runners[0]
 
-        decision = StealDecision.STAY
-        if f"{runner.name} steals" in feed_event['description']:
-            decision = StealDecision.STEAL
-        elif f"{runner.name} gets caught stealing" in feed_event['description']:
-            # That's right. They decided to caught.
-            decision = StealDecision.CAUGHT
-        self.active_steal_decisions[runner_id].append(decision)
+        self.active_steal_decisions[runner_id].append(
+            event.steals.get(runner.name, StealDecision.STAY))
 
     def has_pitches_for(self, player_id):
-        return any(pitch.batter_id == player_id for pitch in self.pitches)
+        if any(pitch.batter_id == player_id for pitch in self.pitches):
+            return True
+        index = tendency_index
+        return index is not None and index.has_pitches_for(player_id)
 
-    def pitches_for(self, player_id, appearance_count):
+    def pitches_for(self, player_id, appearance_count,
+                    rng: random.Random) -> PitchSource:
         # Make reasonable effort to avoid an infinite loop
         if not self.has_pitches_for(player_id):
             raise RuntimeError("No pitches for player")
 
-        def pitch_filter(pitch: Pitch):
-            return (pitch.batter_id == player_id and
-                    pitch.appearance_count == appearance_count)
-
-        appearance_pitches = filter(pitch_filter, self.pitches)
-
-        # Return pitches from this appearance until they are exhausted, then
-        # return random pitches from this batter during this game
-        return chain(appearance_pitches, self._generate_pitches(player_id))
-
-    def _generate_pitches(self, player_id):
-        player_pitches = [pitch for pitch in self.pitches
-                          if pitch.batter_id == player_id]
-        while True:
-            yield random.choice(player_pitches)
+        return PitchSource(self, player_id, appearance_count, rng)
 
     def reload_lineup(self, feed_event: dict):
         timestamp = isoparse(feed_event['created']) + timedelta(seconds=180)
-        team = Team.load_at_time(self.team.id, timestamp)
+        team = self.universe.load_team(self.team.id, timestamp)
 
-        self.team.lineup = [PlayerState.from_player(p) for p in team.lineup]
+        self.team.set_lineup(list(team.lineup))
 
     def replace_player(self, feed_event: dict):
         a_id, b_id = feed_event['playerTags']
 
         def get_replacement(player_id):
             timestamp = isoparse(feed_event['created']) + timedelta(seconds=180)
-            player = Player.load_one_at_time(player_id, timestamp)
-            return PlayerState.from_player(player)
+            return self.universe.load_player(player_id, timestamp)
 
         # Try both orders. This matters for feedback.
         for victim_id, replacement_id in [(a_id, b_id), (b_id, a_id)]:
             if self.team.pitcher.id == victim_id:
                 self.team.pitcher = get_replacement(replacement_id)
                 return  # gotta early return or it might un-swap
-            try:
-                idx = [p.id for p in self.team.lineup].index(victim_id)
-            except ValueError:
-                pass  # must have been the other team
-            else:
-                self.team.lineup[idx] = get_replacement(replacement_id)
-                self.replacement_map[self.team.lineup[idx].name] = idx
-                return  # gotta early return or it might un-swap
-
-    def get_advancements(self, feed_event: dict,
+            idx = self.team.lineup_index_by_id(victim_id)
+            if idx is None:
+                continue  # must have been the other team
+            self.team.replace_lineup_player(
+                idx, get_replacement(replacement_id))
+            self.replacement_map[self.team.lineup[idx].name] = idx
+            return  # gotta early return or it might un-swap
+
+    def get_advancements(self, event: ClassifiedEvent,
                          game_update: Optional[dict],
                          base_from_hit: int):
         # just because the variable name is too long
@@ -391,9 +378,7 @@ class GameRecorder:
 
         # Find players who advanced all the way to home
         for runner_i, runner_name in enumerate(prev_update['baseRunnerNames']):
-            if (f"{runner_name} scores" in feed_event['description'] or
-                    f"{runner_name} tags up and scores"
-                    in feed_event['description']):
+            if runner_name in event.scorers:
                 runner_id = prev_update['baseRunners'][runner_i]
                 base_before = prev_update['basesOccupied'][runner_i]
                 if base_from_hit is not None:
@@ -406,29 +391,36 @@ class GameRecorder:
 
         return advancements
 
-    def random_advancement(self, runner_id):
+    def random_advancement(self, runner_id, rng: random.Random):
         try:
-            return random.choice(self.advancements[runner_id])
+            return rng.choice(self.advancements[runner_id])
         except IndexError:
             # This means there were no advancement opportunities recorded.
+            # Try other games.
+            pass
+
+        index = tendency_index
+        advancement = (None if index is None
+                       else index.draw_advancement(runner_id, rng))
+        if advancement is None:
             # Sucks to be you. You don't get to advance.
             return 0
+        return advancement
 
-    def _add_and_remove_from_bases(self, feed_event):
-        if feed_event['type'] in {5, 10}:  # walk, hit
+    def _add_and_remove_from_bases(self, event: ClassifiedEvent):
+        if event.type in {5, 10}:  # walk, hit
             # First player in the tags gets on base, all the rest score
-            batter_id, *scorer_ids = feed_event['playerTags']
+            batter_id, *scorer_ids = event.player_tags
             # Charm puts the batter id in twice
-            if " charms " in feed_event['description']:
+            if event.charm:
                 scorer_ids.pop(0)
             # Ugh so does heating up
-            if (" is Heating Up!" in feed_event['description'] or
-                    " is Red Hot!" in feed_event['description']):
+            if event.heating_up:
                 scorer_ids.pop()
             self._add_to_bases(batter_id)
             for scorer_id in scorer_ids:
                 del self.active_steal_decisions[scorer_id]
-        elif feed_event['type'] in {2, 9}:  # half-inning change, home run
+        elif event.type in {2, 9}:  # half-inning change, home run
             # Nobody's on base any more
             self.active_steal_decisions.clear()
 
@@ -441,23 +433,6 @@ class GameRecorder:
         self.active_steal_decisions[runner_id] = []
         self.steal_decisions[steal_key] = self.active_steal_decisions[runner_id]
 
-    def get_steal_source(self, player_id, appearance_count):
-        key = (player_id, appearance_count)
-        recorded_steals = self.steal_decisions.get(key, [])
-
-        return chain(recorded_steals, self._generate_steals(player_id))
-
-    def _generate_steals(self, player_id):
-        all_steals = [decision
-                      for (runner_id, _), decisions
-                      in self.steal_decisions.items()
-                      if runner_id == player_id
-                      for decision in decisions]
-
-        if not all_steals:
-            # Sucks for you. You don't get to steal ever.
-            while True:
-                yield StealDecision.STAY
-
-        while True:
-            yield random.choice(all_steals)
+    def get_steal_source(self, player_id, appearance_count,
+                         rng: random.Random) -> StealSource:
+        return StealSource(self, player_id, appearance_count, rng)
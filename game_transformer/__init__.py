@@ -9,6 +9,14 @@ from dateutil.parser import isoparse
 from blaseball_mike.chronicler import get_game_updates
 from game_transformer.GameProducer import GameProducer
 from game_transformer.GameRecorder import GameRecorder
+from game_transformer.memory import measure_phase
+from game_transformer.recordings import producer_from_recording
+from game_transformer.stats import publish_game_stats
+
+
+# Number of games to request from Chronicler and Eventually at once. A day has
+# at most 12 games, so one batch covers a day.
+PREFETCH_BATCH_SIZE = 12
 
 
 @dataclass
@@ -17,34 +25,58 @@ class StampedUpdate:
     data: dict
 
 
-def generate_game(game_id):
+def generate_game(game_id, prefetched=None):
     print("Generating game", game_id)
-    producer: GameProducer = get_game_producer(game_id)
+    with measure_phase(game_id, 'producer'):
+        producer: GameProducer = get_game_producer(game_id, prefetched)
     timestamp = isoparse(producer.game_start)
 
     # Dict of play count -> update data
     new_updates = []
-    for update in producer:
-        new_updates.append(StampedUpdate(timestamp, update))
-        timestamp += timedelta(seconds=5)
+    with measure_phase(game_id, 'iteration'):
+        for update in producer:
+            new_updates.append(StampedUpdate(timestamp, update))
+            timestamp += timedelta(seconds=5)
 
     # Last update must be finalized
     assert new_updates[-1].data['finalized']
+    publish_game_stats(new_updates[-1].data, producer.stats)
     return new_updates
 
 
-def get_game_producer(game_id):
-    game_updates_by_play = fetch_game_updates(game_id)
+def generate_games(game_ids):
+    # Fetch everything up front in a few bulk queries, then build each game
+    prefetched = prefetch_games(game_ids)
+    return {game_id: generate_game(game_id, prefetched[game_id])
+            for game_id in game_ids}
+
+
+def get_game_producer(game_id, prefetched=None):
+    # Uses the saved recording of the game if there is one. See recordings.py
+    return producer_from_recording(
+        game_id, lambda universe: record_game(game_id, prefetched, universe))
+
+
+def record_game(game_id, prefetched=None, universe=None):
+    # Returns the flat list of original game updates and the home and away
+    # recorders, which is everything GameProducer needs. Teams and players come
+    # from `universe`, or the current one if it's None.
+    if prefetched is None:
+        game_updates_by_play = fetch_game_updates(game_id)
+        feed_events = fetch_feed_events(game_id)
+    else:
+        game_updates_by_play, feed_events = prefetched
+
     game_updates_flat = (flatten(game_updates_by_play[k]
                                  for k in sorted(game_updates_by_play.keys())))
 
-    home_recorder = GameRecorder(game_updates_flat, 'home')
-    away_recorder = GameRecorder(game_updates_flat, 'away')
+    home_recorder = GameRecorder(game_updates_flat, 'home', universe)
+    away_recorder = GameRecorder(game_updates_flat, 'away', universe)
     # Start with this == home, because it gets swapped to away as the first
     # (non-ignored) event.
     this_recorder, next_recorder = home_recorder, away_recorder
 
-    for i, feed_event in enumerate(fetch_feed_events(game_id)):
+    for i, feed_event in enumerate(feed_events):
         game_update = game_update_for_event(game_updates_by_play,
                                             feed_event['metadata']['play'])
 
@@ -62,7 +94,7 @@ def get_game_producer(game_id):
         else:
             this_recorder.record_event(feed_event, game_update)
 
-    return GameProducer(game_updates_flat, home_recorder, away_recorder)
+    return game_updates_flat, home_recorder, away_recorder
 
 
 def fetch_game_updates(game_id):
@@ -81,14 +113,65 @@ def fetch_feed_events(game_id):
         'sortby': '{metadata,play}',
         'sortorder': 'asc'
     }
+    yield from sort_subplays(
+        eventually.search(cache_time=None, limit=-1, query=q))
+
+
+def sort_subplays(feed_events):
     # Eventually sorts by play but not subplay. groupby gets all the consecutive
     # elements from the same play, then sorted sorts those groups by subplay
-    for _, group in groupby(
-            eventually.search(cache_time=None, limit=-1, query=q),
-            key=lambda e: e['metadata']['play']):
+    for _, group in groupby(feed_events, key=lambda e: e['metadata']['play']):
         yield from sorted(group, key=lambda e: e['metadata']['subPlay'])
 
 
+def prefetch_games(game_ids):
+    # Fetches the game updates and feed events for many games (typically a
+    # whole day) in a handful of bulk queries instead of two queries per game.
+    # Returns a dict of game id -> (game_updates_by_play, feed_events), where
+    # each value can be passed as `prefetched` to get_game_producer.
+    game_ids = list(game_ids)
+    prefetched = {}
+    for i in range(0, len(game_ids), PREFETCH_BATCH_SIZE):
+        batch = game_ids[i:i + PREFETCH_BATCH_SIZE]
+        updates = fetch_game_updates_batch(batch)
+        feed_events = fetch_feed_events_batch(batch)
+        for game_id in batch:
+            prefetched[game_id] = (updates[game_id], feed_events[game_id])
+
+    return prefetched
+
+
+def fetch_game_updates_batch(game_ids):
+    updates_by_game = {game_id: defaultdict(lambda: [])
+                       for game_id in game_ids}
+    for game_update in get_game_updates(game_ids=game_ids, cache_time=None):
+        game_id = game_update['gameId']
+        play_count = game_update['data']['playCount']
+        updates_by_game[game_id][play_count].append(game_update)
+
+    return updates_by_game
+
+
+def fetch_feed_events_batch(game_ids):
+    q = {
+        'gameTags': '_or_'.join(game_ids),
+        'category': '0_or_2_or_3',
+        'sortby': '{metadata,play}',
+        'sortorder': 'asc'
+    }
+    # Events from different games are interleaved, but each game's events are
+    # still in play order so they can be split up before sorting subplays
+    events_by_game = {game_id: [] for game_id in game_ids}
+    for feed_event in eventually.search(cache_time=None, limit=-1, query=q,
+                                        batch_size=1000):
+        for game_id in feed_event['gameTags']:
+            if game_id in events_by_game:
+                events_by_game[game_id].append(feed_event)
+
+    return {game_id: list(sort_subplays(events))
+            for game_id, events in events_by_game.items()}
+
+
 def game_update_for_event(game_updates_by_play, play_count):
     game_updates = game_updates_by_play[play_count + 1]
     if len(game_updates) == 0:
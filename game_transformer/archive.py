@@ -0,0 +1,284 @@
+import marshal
+import struct
+import sys
+import zlib
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+from typing import List, Optional, Tuple
+
+from game_transformer import StampedUpdate
+
+# Archive layout:
+#   MAGIC
+#   u8, u8 major and minor version of the Python that wrote it
+#   u32 length of the index
+#   index: zlib-compressed marshal of a dict describing the game
+#   blocks: zlib-compressed marshal of a list of rows, BLOCK_SIZE updates each
+#
+# Consecutive updates only differ in a handful of fields, so only the first row
+# of a block is a whole update. The rest are dicts of the fields that changed
+# since the row before, and are turned back into updates by copying the update
+# before and applying the changes. Copying a dict is far quicker than building
+# one from scratch, which makes loading a whole game about twice as fast as
+# unpickling it (see archive_benchmark.py). It does mean unchanged values
+# (lists included) are shared between updates, so updates read from an archive
+# mustn't be changed. A row whose keys aren't the same as the row before is
+# written whole, wrapped in a list to tell it apart.
+#
+# The index holds a table of the short strings that repeat throughout the game
+# (player ids and names, team fields, etc.), which is used as the preset
+# dictionary for compressing every block. That way even the first update in a
+# block can refer back to them instead of spelling them out again. Within a
+# block, marshal already writes each distinct key and string object once and
+# refers back to it after that.
+#
+# marshal is used because it's by far the fastest way to turn bytes back into
+# Python objects, and decoding a block is a single call into it. Its format
+# isn't guaranteed to stay the same between Python versions, so archives
+# written by a different Python are rejected and have to be rebuilt.
+MAGIC = b'NOELGAM3'
+OLD_MAGICS = [b'NOELGAM1', b'NOELGAM2']
+HEADER = struct.Struct('<8sBBI')
+VERSION = 3
+MARSHAL_VERSION = 4
+# Bigger blocks make loading the whole game quicker, and finding one update
+# slower
+BLOCK_SIZE = 128
+COMPRESSION_LEVEL = 6
+
+# zlib only looks back 32KB, which includes the preset dictionary
+MAX_STRING_TABLE_BYTES = 32 * 1024
+MAX_TABLE_STRING_LENGTH = 64
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class ArchiveVersionError(ValueError):
+    pass
+
+
+def check_python_version(major: int, minor: int, what: str):
+    if (major, minor) != sys.version_info[:2]:
+        raise ArchiveVersionError(
+            f"{what} was written by Python {major}.{minor} and can't be read "
+            f"by Python {sys.version_info[0]}.{sys.version_info[1]}. "
+            f"Rebuild it.")
+
+
+def dumps_game(updates: List[StampedUpdate],
+               block_size: int = BLOCK_SIZE) -> bytes:
+    assert updates, "Can't archive a game with no updates"
+    strings = build_string_table(updates)
+    zdict = string_table_dict(strings)
+
+    blocks = []
+    offset = 0
+    data = []
+    for start in range(0, len(updates), block_size):
+        rows = [update.data for update in updates[start:start + block_size]]
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=zdict)
+        block = compressor.compress(
+            marshal.dumps(encode_rows(rows), MARSHAL_VERSION))
+        block += compressor.flush()
+        blocks.append((offset, len(block)))
+        offset += len(block)
+        data.append(block)
+
+    index = zlib.compress(marshal.dumps({
+        'version': VERSION,
+        'strings': strings,
+        'blockSize': block_size,
+        'playCounts': [update.data['playCount'] for update in updates],
+        'timestamps': [to_microseconds(update.timestamp)
+                       for update in updates],
+        'blocks': blocks,
+    }, MARSHAL_VERSION), COMPRESSION_LEVEL)
+
+    return b''.join([HEADER.pack(MAGIC, *sys.version_info[:2], len(index)),
+                     index, *data])
+
+
+def dump_game(updates: List[StampedUpdate], f):
+    f.write(dumps_game(updates))
+
+
+def loads_game(buffer) -> List[StampedUpdate]:
+    return GameArchive(buffer).load_all()
+
+
+def load_game(f) -> List[StampedUpdate]:
+    return loads_game(f.read())
+
+
+def encode_rows(rows: List[dict]) -> list:
+    encoded = [rows[0]]
+    for previous, row in zip(rows, rows[1:]):
+        if list(row) != list(previous):
+            encoded.append([row])
+        else:
+            encoded.append({key: value for key, value in row.items()
+                            if not is_same(previous[key], value)})
+    return encoded
+
+
+def decode_rows(encoded: list) -> List[dict]:
+    row = encoded[0]
+    rows = [row]
+    for changes in encoded[1:]:
+        if type(changes) is list:
+            row = changes[0]
+        else:
+            row = row.copy()
+            row.update(changes)
+        rows.append(row)
+    return rows
+
+
+def is_same(a, b) -> bool:
+    # Whether a can stand in for b. == isn't enough, because 1 == True.
+    if type(a) is not type(b):
+        return False
+    if type(a) is list:
+        return len(a) == len(b) and all(map(is_same, a, b))
+    if type(a) is dict:
+        return (list(a) == list(b) and
+                all(is_same(a[key], b[key]) for key in a))
+    return a == b
+
+
+def build_string_table(updates: List[StampedUpdate]) -> List[str]:
+    counts = Counter()
+    for update in updates:
+        for value in update.data.values():
+            if isinstance(value, str):
+                counts[value] += 1
+            elif isinstance(value, list):
+                counts.update(v for v in value if isinstance(v, str))
+
+    # Only strings that repeat are worth having in the table. zlib prefers
+    # matches that are closer, so the most common strings go at the end.
+    strings = [string for string, count in counts.most_common()
+               if count > 1 and 0 < len(string) <= MAX_TABLE_STRING_LENGTH]
+    table = []
+    size = 0
+    for string in strings:
+        size += len(string.encode('utf-8')) + 1
+        if size > MAX_STRING_TABLE_BYTES:
+            break
+        table.append(string)
+
+    table.reverse()
+    return table
+
+
+def string_table_dict(strings: List[str]) -> bytes:
+    return '\0'.join(strings).encode('utf-8')
+
+
+def to_microseconds(timestamp: datetime) -> int:
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+
+class GameArchive:
+    # Reads a game written by dumps_game. Works on any buffer, including a
+    # memory map, and only decompresses the blocks that are actually used, so
+    # looking up a single play is cheap even for a long game.
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        magic, major, minor, index_length = HEADER.unpack_from(self.buffer, 0)
+        if magic in OLD_MAGICS:
+            raise ArchiveVersionError("Game archive was written by an older "
+                                      "version of Noel. Rebuild it.")
+        if magic != MAGIC:
+            raise ValueError("Not a Noel game archive")
+        check_python_version(major, minor, "Game archive")
+
+        index_start = HEADER.size
+        data_start = index_start + index_length
+        index = marshal.loads(zlib.decompress(
+            self.buffer[index_start:data_start]))
+        if index['version'] != VERSION:
+            raise ValueError("Unsupported game archive version")
+
+        self.strings: List[str] = index['strings']
+        self.block_size: int = index['blockSize']
+        self.play_counts: List[int] = index['playCounts']
+        self.timestamps: List[int] = index['timestamps']
+        self.blocks = [(data_start + offset, length)
+                       for offset, length in index['blocks']]
+
+        self._zdict = string_table_dict(self.strings)
+        # (block index, rows). One tuple, so that threads sharing the archive
+        # never see one block's index with another block's rows.
+        self._cached_block: Optional[Tuple[int, list]] = None
+
+    def __len__(self):
+        return len(self.play_counts)
+
+    def __getitem__(self, index: int) -> StampedUpdate:
+        # Lets an archive stand in for a list of updates without decoding it
+        return self.update_at(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.update_at(index)
+
+    def update_at(self, index: int) -> StampedUpdate:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Update index out of range")
+
+        block_index, row_index = divmod(index, self.block_size)
+        data = self._block(block_index)[row_index]
+        return StampedUpdate(self._timestamp(index), data)
+
+    def index_for_play(self, play_count: int) -> Optional[int]:
+        # Play counts are ascending but not contiguous
+        index = bisect_left(self.play_counts, play_count)
+        if index < len(self) and self.play_counts[index] == play_count:
+            return index
+        return None
+
+    def update_for_play(self, play_count: int) -> Optional[StampedUpdate]:
+        index = self.index_for_play(play_count)
+        return None if index is None else self.update_at(index)
+
+    def load_all(self) -> List[StampedUpdate]:
+        data = []
+        for block_index in range(len(self.blocks)):
+            data += self._decode_block(block_index)
+
+        # Updates are mostly the same time apart, so this mostly reuses the
+        # same timedelta rather than making one for every update
+        deltas = {}
+        timestamps = []
+        previous, timestamp = 0, EPOCH
+        for microseconds in self.timestamps:
+            delta = deltas.get(microseconds - previous)
+            if delta is None:
+                delta = deltas[microseconds - previous] = \
+                    timedelta(microseconds=microseconds - previous)
+            timestamp += delta
+            previous = microseconds
+            timestamps.append(timestamp)
+        return list(map(StampedUpdate, timestamps, data))
+
+    def _block(self, block_index: int) -> list:
+        # Sequential lookups tend to hit the same block
+        cached = self._cached_block
+        if cached is not None and cached[0] == block_index:
+            return cached[1]
+        rows = self._decode_block(block_index)
+        self._cached_block = (block_index, rows)
+        return rows
+
+    def _decode_block(self, block_index: int) -> list:
+        offset, length = self.blocks[block_index]
+        decompressor = zlib.decompressobj(zdict=self._zdict)
+        return decode_rows(marshal.loads(
+            decompressor.decompress(self.buffer[offset:offset + length])))
+
+    def _timestamp(self, index: int) -> datetime:
+        return EPOCH + timedelta(microseconds=self.timestamps[index])
@@ -0,0 +1,278 @@
+import re
+from dataclasses import dataclass, field
+from enum import Enum, auto
+from typing import Optional, Any, Dict, Tuple, AbstractSet
+
+
+class PitchType(Enum):
+    BALL = auto()
+    STRIKE_LOOKING = auto()
+    STRIKE_SWINGING = auto()
+    FOUL = auto()
+    HIT = auto()
+    HOME_RUN = auto()
+    FLYOUT = auto()
+    GROUND_OUT = auto()
+    FIELDERS_CHOICE = auto()
+    DOUBLE_PLAY = auto()
+
+
+class StealDecision(Enum):
+    STAY = auto()
+    STEAL = auto()
+    CAUGHT = auto()
+
+
+SIMPLE_PITCH_TYPES = {
+    5: PitchType.BALL,  # walk -> ball
+    9: PitchType.HOME_RUN,
+    14: PitchType.BALL,
+    15: PitchType.FOUL,
+    27: PitchType.BALL,  # mild pitch -> ball
+}
+
+NON_PITCH_TYPES = {
+    0,  # let's go
+    1,  # play ball
+    2,  # half inning start
+    3,  # pitcher switch (see https://reblase.sibr.dev/game/
+    # 2c54bafe-c63b-4ec6-8c66-3cdefebfa952#be727d66-0d1a-ba38-24f4-83ffc4a9710f)
+    4,  # base steal
+    11,  # end of game
+    12,  # batter up
+    20,  # solar panels runs overflow
+    21,  # home field advantage
+    24,  # party
+    25,  # strike zapped
+    26,  # weather changes
+    28,  # inning becomes outing
+    30,  # black hole activation
+    31,  # sun2 activation
+    33,  # birds circle, no unshelling
+    34,  # friend of crows
+    35,  # unshelling
+    36,  # triple threat
+    37,  # free refill
+    39,  # coffee bean
+    40,  # feedback swap blocked
+    # 41,  # feedback swap (i need to swap the players in my data)
+    45,  # superallergic reaction
+    47,  # allergic reaction
+    48,  # player gained Reverberating
+    # 49,  # reverb wiggle (i need to swap the players in my data)
+    51,  # blooddrain, normal
+    52,  # blooddrain, siphon
+    53,  # blooddrain, sealant
+    # 54,  # incineration (i need to swap the players in my data)
+    55,  # blocked incineration (fireproof/fire eater)
+    62,  # baserunners swept in Flooding
+    63,  # salmon
+    64,  # polarity shift
+    65,  # enter secret base
+    66,  # exit secret base
+    67,  # consumer attack
+    69,  # echo chamber
+    70,  # grind rail
+    71,  # tunnels
+    72,  # peanut mister
+    73,  # peanut flavor
+    74,  # taste the infinite
+    76,  # event horizon activates
+    77,  # event horizon awaits
+    78,  # solar panels await
+    79,  # solar panels activate
+    84,  # return from elsewhere
+    85,  # over under
+    86,  # under over
+    88,  # undersea
+    91,  # homebody
+    92,  # superyummy
+    93,  # perk
+    96,  # earlbird
+    97,  # late to the party
+    99,  # shame donor
+}
+
+HIT_BASES = {
+    'Single': 0,
+    'Double': 1,
+    'Triple': 2,
+    'Quadruple': 2,  # downgrades ur quadruple
+}
+
+# Have to allow for 's shell
+FIELDER_RE = re.compile(
+    r" hit a (?:flyout|ground out) to (.+?)(?:'s [Ss]hell)?\.$",
+    re.MULTILINE)
+OUT_AT_RE = re.compile(r"out at (first|second|third|fourth|fifth) base")
+HIT_RE = re.compile(r" hits a (Single|Double|Triple|Quadruple)!")
+# What follows a name. There's no telling where the name starts, so it's
+# everything before these on the line, back to the last match, and
+# _name_suffixes tries each starting word.
+BATTING_RE = re.compile(r" batting for the (.+?)(?:[.,!]|$)")
+STEAL_RE = re.compile(r" (steals|gets caught stealing)")
+SCORES_RE = re.compile(r" (?:tags up and )?scores")
+INHABITING_RE = re.compile(r"is Inhabiting (.+?)!")
+
+STEAL_DECISIONS = {
+    'steals': StealDecision.STEAL,
+    # That's right. They decided to caught.
+    'gets caught stealing': StealDecision.CAUGHT,
+}
+
+
+@dataclass
+class ClassifiedEvent:
+    type: int
+    description: str
+    player_tags: list
+    pitch_type: Optional[PitchType] = None
+    base_reached: Optional[int] = None
+    fielder_name: Optional[str] = None
+    out_base_name: Optional[str] = None
+    charm: bool = False
+    heating_up: bool = False
+
+    # Names of who's batting (with their team's nickname), being inhabited,
+    # stealing and scoring, each parsed out once so the recorder can look up
+    # players by name. Only filled in for the events the recorder reads them
+    # from.
+    batting: AbstractSet[Tuple[str, str]] = frozenset()
+    inhabited: AbstractSet[str] = frozenset()
+    steals: Dict[str, StealDecision] = field(default_factory=dict)
+    scorers: AbstractSet[str] = frozenset()
+
+    @property
+    def is_pitch(self):
+        return self.pitch_type is not None
+
+
+def classify_event(feed_event: Dict[str, Any],
+                   game_update: Optional[Dict[str, Any]]) -> ClassifiedEvent:
+    event_type: int = feed_event['type']
+    event = ClassifiedEvent(type=event_type,
+                            description=feed_event['description'],
+                            player_tags=feed_event['playerTags'])
+
+    if event_type in SIMPLE_PITCH_TYPES:
+        event.pitch_type = SIMPLE_PITCH_TYPES[event_type]
+    elif event_type in CLASSIFIERS:
+        CLASSIFIERS[event_type](event, game_update)
+    elif event_type not in NON_PITCH_TYPES:
+        raise RuntimeError("Unknown event type")
+
+    description = event.description
+    is_pitch = event.pitch_type is not None
+    if event_type == 12:  # batter up
+        event.batting = {(name, match.group(1)) for prefix, match
+                         in _find_names(BATTING_RE, description)
+                         for name in _name_suffixes(prefix)}
+        event.inhabited = set(INHABITING_RE.findall(description))
+    # Most events have neither, and it's quicker to check than to search
+    if (is_pitch or event_type == 4) and \
+            "steal" in description:  # base steal, or during a pitch
+        event.steals = {name: STEAL_DECISIONS[match.group(1)]
+                        for prefix, match in _find_names(STEAL_RE, description)
+                        for name in _name_suffixes(prefix)}
+    if is_pitch and " scores" in description:
+        event.scorers = {name for prefix, _
+                         in _find_names(SCORES_RE, description)
+                         for name in _name_suffixes(prefix)}
+
+    if event_type in {5, 10}:  # walk, hit
+        event.charm = " charms " in event.description
+        event.heating_up = (" is Heating Up!" in event.description or
+                            " is Red Hot!" in event.description)
+
+    return event
+
+
+def _classify_strikeout(event: ClassifiedEvent, _):
+    if " strikes out looking." in event.description:
+        event.pitch_type = PitchType.STRIKE_LOOKING
+    elif " strikes out swinging." in event.description:
+        event.pitch_type = PitchType.STRIKE_SWINGING
+    else:
+        # Not a pitch
+        assert ("charmed" in event.description and
+                "strike out willingly" in event.description)
+
+
+def _classify_flyout(event: ClassifiedEvent, _):
+    # Seems like flyouts are never FCs (makes sense) or DPs (sure, I guess)
+    assert " hit a flyout to " in event.description
+    event.pitch_type = PitchType.FLYOUT
+    event.fielder_name = _first_group(FIELDER_RE, event.description)
+
+
+def _classify_ground_out(event: ClassifiedEvent,
+                         game_update: Optional[Dict[str, Any]]):
+    if " hit a ground out to " in event.description:
+        event.pitch_type = PitchType.GROUND_OUT
+        event.fielder_name = _first_group(FIELDER_RE, event.description)
+    elif " hit into a double play!" in event.description:
+        event.pitch_type = PitchType.DOUBLE_PLAY
+    else:
+        assert " reaches on fielder's choice." in event.description
+        event.pitch_type = PitchType.FIELDERS_CHOICE
+        if game_update is None:
+            # Things break if I don't pick one, so assume first
+            event.base_reached = 0
+        else:
+            # The batter must be the last one in the array
+            event.base_reached = game_update['basesOccupied'][-1]
+
+        event.out_base_name = _first_group(OUT_AT_RE, event.description)
+
+
+def _classify_hit(event: ClassifiedEvent, _):
+    match = HIT_RE.search(event.description)
+    if match is not None:
+        event.pitch_type = PitchType.HIT
+        event.base_reached = HIT_BASES[match.group(1)]
+    else:
+        assert (" home run!" in event.description or
+                " grand slam!" in event.description)
+        event.pitch_type = PitchType.HOME_RUN
+
+
+def _classify_strike(event: ClassifiedEvent, _):
+    if "Strike, swinging" in event.description:
+        event.pitch_type = PitchType.STRIKE_SWINGING
+    else:
+        assert ("Strike, looking" in event.description or
+                "Strike, flinching" in event.description)
+        event.pitch_type = PitchType.STRIKE_LOOKING
+
+
+def _find_names(pattern, description):
+    # Each match of pattern, with what came before it on its line since the
+    # last match
+    found = []
+    for line in description.split('\n'):
+        position = 0
+        for match in pattern.finditer(line):
+            found.append((line[position:match.start()], match))
+            position = match.end()
+    return found
+
+
+def _name_suffixes(text: str):
+    # Every run of words that ends text. One of them is the name, whatever
+    # came before it on the line.
+    words = text.split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+def _first_group(pattern, description):
+    match = pattern.search(description)
+    return match.group(1) if match is not None else None
+
+
+CLASSIFIERS = {
+    6: _classify_strikeout,
+    7: _classify_flyout,
+    8: _classify_ground_out,
+    10: _classify_hit,
+    13: _classify_strike,
+}
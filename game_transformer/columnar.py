@@ -0,0 +1,183 @@
+import json
+import os
+from typing import Iterable, Tuple, Dict, List
+
+import numpy as np
+
+from game_transformer.GameRecorder import GameRecorder
+from game_transformer.classifier import PitchType, StealDecision
+
+# Columns are stored as integer codes. The code for an enum member is its
+# position in these lists, so only ever add to the end of them.
+PITCH_TYPES: List[PitchType] = list(PitchType)
+STEAL_DECISIONS: List[StealDecision] = list(StealDecision)
+PITCH_TYPE_CODES = {t: i for i, t in enumerate(PITCH_TYPES)}
+STEAL_DECISION_CODES = {d: i for i, d in enumerate(STEAL_DECISIONS)}
+
+COLUMNS = {
+    # One row per recorded pitch
+    'pitch_game': np.int32,
+    'pitch_team': np.int8,
+    'pitch_batter': np.int32,
+    'pitch_appearance': np.int16,
+    'pitch_type': np.int8,
+    'pitch_base_reached': np.int8,  # -1 if the batter didn't reach base
+    # One row per runner advancement, pointing back at its pitch
+    'advancement_pitch': np.int32,
+    'advancement_runner': np.int32,
+    'advancement_bases': np.int8,
+    # One row per steal decision
+    'steal_game': np.int32,
+    'steal_team': np.int8,
+    'steal_runner': np.int32,
+    'steal_appearance': np.int16,
+    'steal_sequence': np.int16,
+    'steal_decision': np.int8,
+}
+
+METADATA_FILE = 'metadata.json'
+
+
+class StringTable:
+    def __init__(self):
+        self.strings: List[str] = []
+        self.indices: Dict[str, int] = {}
+
+    def __getitem__(self, string):
+        try:
+            return self.indices[string]
+        except KeyError:
+            self.indices[string] = len(self.strings)
+            self.strings.append(string)
+            return self.indices[string]
+
+
+def export_recordings(
+        path: str,
+        recordings: Iterable[Tuple[str, GameRecorder, GameRecorder]]):
+    # Writes the pitches, advancements and steal decisions of many recorded
+    # games into a directory of one .npy file per column, plus the tables of
+    # game and player ids the columns refer to
+    games = StringTable()
+    players = StringTable()
+    columns = {name: [] for name in COLUMNS}
+
+    for game_id, home_recorder, away_recorder in recordings:
+        game = games[game_id]
+        # Team 0 is home, 1 is away
+        for team, recorder in enumerate([home_recorder, away_recorder]):
+            for pitch in recorder.pitches:
+                pitch_row = len(columns['pitch_game'])
+                columns['pitch_game'].append(game)
+                columns['pitch_team'].append(team)
+                columns['pitch_batter'].append(players[pitch.batter_id])
+                columns['pitch_appearance'].append(pitch.appearance_count)
+                columns['pitch_type'].append(
+                    PITCH_TYPE_CODES[pitch.pitch_type])
+                columns['pitch_base_reached'].append(
+                    -1 if pitch.base_reached is None else pitch.base_reached)
+
+                for runner_id, bases in pitch.advancements.items():
+                    columns['advancement_pitch'].append(pitch_row)
+                    columns['advancement_runner'].append(players[runner_id])
+                    columns['advancement_bases'].append(bases)
+
+            for (runner_id, appearance), decisions in \
+                    recorder.steal_decisions.items():
+                for sequence, decision in enumerate(decisions):
+                    columns['steal_game'].append(game)
+                    columns['steal_team'].append(team)
+                    columns['steal_runner'].append(players[runner_id])
+                    columns['steal_appearance'].append(appearance)
+                    columns['steal_sequence'].append(sequence)
+                    columns['steal_decision'].append(
+                        STEAL_DECISION_CODES[decision])
+
+    os.makedirs(path, exist_ok=True)
+    for name, dtype in COLUMNS.items():
+        np.save(os.path.join(path, name + '.npy'),
+                np.array(columns[name], dtype=dtype))
+
+    with open(os.path.join(path, METADATA_FILE), 'w') as f:
+        json.dump({
+            'games': games.strings,
+            'players': players.strings,
+            'pitchTypes': [t.name for t in PITCH_TYPES],
+            'stealDecisions': [d.name for d in STEAL_DECISIONS],
+        }, f)
+
+
+def export_games(path: str, game_ids: List[str], batch_size: int = 12):
+    # Imported here to avoid a circular import with the package __init__
+    from game_transformer import prefetch_games, record_game
+
+    def recordings():
+        for i in range(0, len(game_ids), batch_size):
+            batch = game_ids[i:i + batch_size]
+            prefetched = prefetch_games(batch)
+            for game_id in batch:
+                _, home_recorder, away_recorder = record_game(
+                    game_id, prefetched.pop(game_id))
+                yield game_id, home_recorder, away_recorder
+
+    export_recordings(path, recordings())
+
+
+class ColumnarRecordings:
+    # Read side of export_recordings. Columns are memory-mapped, so opening a
+    # season's worth of recordings is cheap and only the parts a query touches
+    # are read from disk.
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, METADATA_FILE)) as f:
+            metadata = json.load(f)
+
+        self.games: List[str] = metadata['games']
+        self.players: List[str] = metadata['players']
+        self.player_indices = {player_id: i
+                               for i, player_id in enumerate(self.players)}
+        self.pitch_types = [PitchType[name]
+                            for name in metadata['pitchTypes']]
+        self.steal_decisions = [StealDecision[name]
+                                for name in metadata['stealDecisions']]
+
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+            for name in COLUMNS
+        }
+
+    def __getitem__(self, name) -> np.ndarray:
+        return self.columns[name]
+
+    def pitch_type_counts(self) -> np.ndarray:
+        # Array of shape (players, pitch types) with the number of each type of
+        # pitch thrown to each batter
+        num_types = len(self.pitch_types)
+        combined = (self['pitch_batter'].astype(np.int64) * num_types +
+                    self['pitch_type'])
+        counts = np.bincount(combined,
+                             minlength=len(self.players) * num_types)
+        return counts.reshape(len(self.players), num_types)
+
+    def pitch_outcome_rates(self) -> Dict[str, Dict[PitchType, float]]:
+        counts = self.pitch_type_counts()
+        totals = counts.sum(axis=1)
+        batters = np.flatnonzero(totals)
+        rates = counts[batters] / totals[batters, np.newaxis]
+        return {
+            self.players[batter]: dict(zip(self.pitch_types, batter_rates))
+            for batter, batter_rates in zip(batters, rates.tolist())
+        }
+
+    def steal_decision_counts(self) -> np.ndarray:
+        # Array of shape (players, steal decisions)
+        num_decisions = len(self.steal_decisions)
+        combined = (self['steal_runner'].astype(np.int64) * num_decisions +
+                    self['steal_decision'])
+        counts = np.bincount(combined,
+                             minlength=len(self.players) * num_decisions)
+        return counts.reshape(len(self.players), num_decisions)
+
+    def advancements_for(self, player_id: str) -> np.ndarray:
+        runner = self.player_indices[player_id]
+        return self['advancement_bases'][self['advancement_runner'] == runner]
@@ -0,0 +1,61 @@
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Optional, Callable
+
+# Called with (game id, phase, peak bytes, seconds) after each phase of
+# generate_game, where the peak is the most memory allocated during the phase
+# over what was allocated when it started. Set with use_memory_sink, which
+# also turns tracemalloc on. It slows everything down, so it's off by default.
+#
+# tracemalloc counts the whole process and has one peak, so phases running at
+# the same time (in other threads) share it. Each phase's peak then includes
+# what the others allocated, and a phase starting resets the peak for any
+# that are already running. Measure with one generation thread for exact
+# numbers.
+memory_sink: Optional[Callable[[str, str, int, float], None]] = None
+# Whether use_memory_sink turned tracemalloc on, so it knows to turn it off
+_started_tracing = False
+
+# Keeps reading and resetting the peak together. Only held for that, not for
+# the phase, so phases don't wait on each other's network requests.
+_trace_lock = threading.Lock()
+
+
+def use_memory_sink(sink: Optional[Callable[[str, str, int, float], None]]):
+    global memory_sink, _started_tracing
+    memory_sink = sink
+    if sink is not None and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracing = True
+    elif sink is None and _started_tracing:
+        tracemalloc.stop()
+        _started_tracing = False
+
+
+def _reset_peak():
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        # Python 3.8. This resets the peak too, and current starts from 0.
+        tracemalloc.clear_traces()
+
+
+@contextmanager
+def measure_phase(game_id: str, phase: str):
+    if memory_sink is None:
+        yield
+        return
+
+    with _trace_lock:
+        _reset_peak()
+        start_bytes, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    with _trace_lock:
+        _, peak_bytes = tracemalloc.get_traced_memory()
+
+    # Another phase can reset the peak to below where this one started
+    memory_sink(game_id, phase, max(0, peak_bytes - start_bytes), seconds)
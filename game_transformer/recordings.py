@@ -0,0 +1,134 @@
+import gzip
+import json
+import os
+from typing import List, Optional, Tuple
+
+from game_transformer.GameProducer import GameProducer
+from game_transformer.GameRecorder import GameRecorder
+from game_transformer.state import RecordingUniverse, RecordedUniverse, \
+    TeamSnapshot, PlayerState, current_universe
+
+# Recording a game (fetching it and running every feed event through the
+# recorders) is most of the cost of generating it, and none of it changes when
+# only the producer does. This saves the recorders' output so the producer can
+# be rerun without fetching or recording anything.
+#
+# Bump this whenever GameRecorder starts recording something different, so
+# that old recordings aren't used.
+RECORDING_VERSION = 2
+
+
+def condense_updates(updates: List[dict]) -> List[dict]:
+    # GameProducer only reads the first update, the first truthy value of each
+    # key, and the timestamp of the first update with plays. The first update
+    # plus one more holding the rest of those is enough.
+    first = updates[0]
+    time_update = next(u for u in updates if u['data']['playCount'] > 0)
+
+    data = {key: next((u['data'][key] for u in updates
+                       if u['data'].get(key)), value)
+            for key, value in first['data'].items()}
+    data['playCount'] = time_update['data']['playCount']
+    return [first, {'timestamp': time_update['timestamp'], 'data': data}]
+
+
+def dump_recording(game_id: str, updates: List[dict], universe, home_recorder,
+                   away_recorder) -> dict:
+    return {
+        'version': RECORDING_VERSION,
+        'gameId': game_id,
+        'updates': condense_updates(updates),
+        'teams': [[team_id, timestamp, {
+            'id': team.id,
+            'nickname': team.nickname,
+            'lineup': [[p.id, p.name] for p in team.lineup],
+        }] for (team_id, timestamp), team in universe.teams.items()],
+        'home': home_recorder.to_state(),
+        'away': away_recorder.to_state(),
+    }
+
+
+def load_recording(recording: dict) \
+        -> Tuple[List[dict], RecordedUniverse, GameRecorder, GameRecorder]:
+    teams = {
+        (team_id, timestamp): TeamSnapshot(
+            id=team['id'], nickname=team['nickname'],
+            lineup=[PlayerState(*p) for p in team['lineup']])
+        for team_id, timestamp, team in recording['teams']
+    }
+    return (recording['updates'], RecordedUniverse(teams, {}),
+            GameRecorder.from_state(recording['home']),
+            GameRecorder.from_state(recording['away']))
+
+
+class RecordingCache:
+    # One gzipped JSON file per game
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _game_path(self, game_id: str):
+        return os.path.join(self.path, game_id + '.json.gz')
+
+    def get(self, game_id: str) -> Optional[dict]:
+        try:
+            with gzip.open(self._game_path(game_id), 'rt') as f:
+                recording = json.load(f)
+        except (FileNotFoundError, ValueError, EOFError):
+            return None
+
+        if recording.get('version') != RECORDING_VERSION:
+            return None
+        return recording
+
+    def put(self, game_id: str, recording: dict):
+        # Write to a temporary file first so that a reader never sees half a
+        # recording
+        path = self._game_path(game_id)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(temp_path, 'wt') as f:
+            json.dump(recording, f)
+        os.replace(temp_path, path)
+
+    def invalidate(self, game_id: str):
+        try:
+            os.remove(self._game_path(game_id))
+        except FileNotFoundError:
+            pass
+
+
+# Set with use_recording_cache. None means every game is recorded from scratch.
+recording_cache: Optional[RecordingCache] = None
+
+
+def use_recording_cache(path: Optional[str]):
+    global recording_cache
+    recording_cache = None if path is None else RecordingCache(path)
+
+
+def producer_from_recording(game_id: str, record) -> GameProducer:
+    # record(universe) returns the same as record_game. It's only called if
+    # there's no usable recording of the game. The universe is passed down
+    # rather than swapped in with use_universe so that games being generated
+    # on other threads at the same time don't record into it.
+    recording = None if recording_cache is None \
+        else recording_cache.get(game_id)
+    if recording is not None:
+        updates, universe, home_recorder, away_recorder = \
+            load_recording(recording)
+        return GameProducer(updates, home_recorder, away_recorder,
+                            universe=universe)
+
+    if recording_cache is None:
+        universe = current_universe()
+        return GameProducer(*record(universe), universe=universe)
+
+    universe = RecordingUniverse(current_universe())
+    updates, home_recorder, away_recorder = record(universe)
+    # The producer loads the same teams as the recorders, so they're recorded
+    # here too. Nothing else is loaded once it's constructed.
+    producer = GameProducer(updates, home_recorder, away_recorder,
+                            universe=universe)
+    recording_cache.put(game_id, dump_recording(
+        game_id, updates, universe, home_recorder, away_recorder))
+    return producer
@@ -1,5 +1,7 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional, Dict, Tuple
 
 from blaseball_mike.models import Player, Team
 
@@ -14,6 +16,99 @@ class PlayerState:
         return PlayerState(id=player.id, name=player.name)
 
 
+@dataclass
+class TeamSnapshot:
+    id: str
+    nickname: str
+    lineup: List[PlayerState]
+
+
+class Universe:
+    # Where team and player data comes from. By default that's Chronicler, but
+    # it can be swapped out (see use_universe) to run without network access.
+    def load_team(self, team_id: str, timestamp) -> TeamSnapshot:
+        team = Team.load_at_time(team_id, timestamp)
+        return TeamSnapshot(
+            id=team.id, nickname=team.get_nickname(),
+            lineup=[PlayerState.from_player(p) for p in team.lineup])
+
+    def load_player(self, player_id: str, timestamp) -> PlayerState:
+        return PlayerState.from_player(
+            Player.load_one_at_time(player_id, timestamp))
+
+
+class RecordingUniverse(Universe):
+    # Remembers everything that was loaded so it can be replayed later with
+    # RecordedUniverse. Loads from Chronicler unless given another universe to
+    # load from.
+    def __init__(self, source: Optional[Universe] = None):
+        self.source = Universe() if source is None else source
+        self.teams: Dict[Tuple[str, str], TeamSnapshot] = {}
+        self.players: Dict[Tuple[str, str], PlayerState] = {}
+
+    def load_team(self, team_id: str, timestamp) -> TeamSnapshot:
+        team = self.source.load_team(team_id, timestamp)
+        self.teams[(team_id, timestamp_key(timestamp))] = team
+        return team
+
+    def load_player(self, player_id: str, timestamp) -> PlayerState:
+        player = self.source.load_player(player_id, timestamp)
+        self.players[(player_id, timestamp_key(timestamp))] = player
+        return player
+
+
+class RecordedUniverse(Universe):
+    def __init__(self, teams: Dict[Tuple[str, str], TeamSnapshot],
+                 players: Dict[Tuple[str, str], PlayerState]):
+        self.teams = teams
+        self.players = players
+
+    def load_team(self, team_id: str, timestamp) -> TeamSnapshot:
+        try:
+            return self.teams[(team_id, timestamp_key(timestamp))]
+        except KeyError:
+            raise RuntimeError("Team wasn't recorded")
+
+    def load_player(self, player_id: str, timestamp) -> PlayerState:
+        try:
+            return self.players[(player_id, timestamp_key(timestamp))]
+        except KeyError:
+            raise RuntimeError("Player wasn't recorded")
+
+
+# Per thread (and per context), so that generating games on several threads at
+# once doesn't mix up their universes. Code that builds recorders and producers
+# should pass the universe in explicitly; this is only the default for code
+# that doesn't.
+_universe = ContextVar('universe', default=Universe())
+
+
+def current_universe() -> Universe:
+    return _universe.get()
+
+
+@contextmanager
+def use_universe(new_universe: Universe):
+    token = _universe.set(new_universe)
+    try:
+        yield new_universe
+    finally:
+        _universe.reset(token)
+
+
+def load_team(team_id: str, timestamp) -> TeamSnapshot:
+    return current_universe().load_team(team_id, timestamp)
+
+
+def load_player(player_id: str, timestamp) -> PlayerState:
+    return current_universe().load_player(player_id, timestamp)
+
+
+def timestamp_key(timestamp) -> str:
+    # Timestamps show up as both strings and datetimes
+    return timestamp if isinstance(timestamp, str) else timestamp.isoformat()
+
+
 @dataclass
 class TeamState:
     id: str
@@ -23,11 +118,14 @@ class TeamState:
     batter_index: int
     appearance_count: int
 
-    def __init__(self, updates: List[dict], timestamp: str, prefix: str):
-        team = Team.load_at_time(first_truthy(updates, prefix + 'Team'),
-                                 timestamp)
+    def __init__(self, updates: List[dict], timestamp: str, prefix: str,
+                 universe: Optional[Universe] = None):
+        if universe is None:
+            universe = current_universe()
+        team = universe.load_team(first_truthy(updates, prefix + 'Team'),
+                                  timestamp)
         self.id = team.id
-        self.nickname = team.get_nickname()
+        self.nickname = team.nickname
 
         self.pitcher = PlayerState(
             id=first_truthy(updates, prefix + 'Pitcher'),
@@ -35,11 +133,60 @@ class TeamState:
         assert self.pitcher.id
         assert self.pitcher.name
 
-        self.lineup = [PlayerState.from_player(p) for p in team.lineup]
+        self.set_lineup(list(team.lineup))
 
         self.batter_index = -1
         self.appearance_count = 0
 
+    def to_state(self) -> dict:
+        return {
+            'id': self.id,
+            'nickname': self.nickname,
+            'pitcher': [self.pitcher.id, self.pitcher.name],
+            'lineup': [[p.id, p.name] for p in self.lineup],
+            'batterIndex': self.batter_index,
+            'appearanceCount': self.appearance_count,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'TeamState':
+        # Skips __init__, which would load the team all over again
+        team = cls.__new__(cls)
+        team.id = state['id']
+        team.nickname = state['nickname']
+        team.pitcher = PlayerState(*state['pitcher'])
+        team.set_lineup([PlayerState(*p) for p in state['lineup']])
+        team.batter_index = state['batterIndex']
+        team.appearance_count = state['appearanceCount']
+        return team
+
+    def set_lineup(self, lineup: List[PlayerState]):
+        self.lineup = lineup
+        self._index_lineup()
+
+    def replace_lineup_player(self, index: int, player: PlayerState):
+        self.lineup[index] = player
+        self._index_lineup()
+
+    def lineup_index_by_id(self, player_id: str) -> Optional[int]:
+        return self._index_by_id.get(player_id)
+
+    def lineup_index_by_name(self, name: str) -> Optional[int]:
+        return self._index_by_name.get(name)
+
+    def lineup_player_by_id(self, player_id: str) -> Optional[PlayerState]:
+        index = self._index_by_id.get(player_id)
+        return None if index is None else self.lineup[index]
+
+    def _index_lineup(self):
+        # Players are looked up by id and name on every pitch, so keep maps of
+        # both. If two players share a name, the first one wins.
+        self._index_by_id = {}
+        self._index_by_name = {}
+        for index, player in enumerate(self.lineup):
+            self._index_by_id.setdefault(player.id, index)
+            self._index_by_name.setdefault(player.name, index)
+
     def advance_batter(self):
         self.batter_index += 1
         if self.batter_index >= len(self.lineup):
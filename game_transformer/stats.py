@@ -0,0 +1,115 @@
+from dataclasses import dataclass, field, fields, astuple
+from typing import Dict, Optional, Callable, Tuple
+
+
+@dataclass
+class BattingLine:
+    plate_appearances: int = 0
+    at_bats: int = 0
+    hits: int = 0
+    doubles: int = 0
+    triples: int = 0
+    home_runs: int = 0
+    runs: int = 0
+    walks: int = 0
+    strikeouts: int = 0
+    stolen_bases: int = 0
+    caught_stealing: int = 0
+
+
+@dataclass
+class PitchingLine:
+    outs: int = 0
+    hits: int = 0
+    home_runs: int = 0
+    runs: int = 0
+    walks: int = 0
+    strikeouts: int = 0
+
+
+def add_line(total, line, sign: int = 1):
+    for f in fields(line):
+        setattr(total, f.name,
+                getattr(total, f.name) + sign * getattr(line, f.name))
+
+
+@dataclass
+class GameStats:
+    # Player id -> line, for one generated game
+    batting: Dict[str, BattingLine] = field(default_factory=dict)
+    pitching: Dict[str, PitchingLine] = field(default_factory=dict)
+
+    def batter(self, player_id: str) -> BattingLine:
+        try:
+            return self.batting[player_id]
+        except KeyError:
+            line = self.batting[player_id] = BattingLine()
+            return line
+
+    def pitcher(self, player_id: str) -> PitchingLine:
+        try:
+            return self.pitching[player_id]
+        except KeyError:
+            line = self.pitching[player_id] = PitchingLine()
+            return line
+
+    def add(self, other: 'GameStats', sign: int = 1):
+        for player_id, line in other.batting.items():
+            add_line(self.batter(player_id), line, sign)
+        for player_id, line in other.pitching.items():
+            add_line(self.pitcher(player_id), line, sign)
+
+    def to_state(self) -> dict:
+        # Lines as lists, in field order, so they're compact to store
+        return {
+            'batting': {player_id: list(astuple(line))
+                        for player_id, line in self.batting.items()},
+            'pitching': {player_id: list(astuple(line))
+                         for player_id, line in self.pitching.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'GameStats':
+        return cls(
+            batting={player_id: BattingLine(*line)
+                     for player_id, line in state['batting'].items()},
+            pitching={player_id: PitchingLine(*line)
+                      for player_id, line in state['pitching'].items()})
+
+
+def winner_and_loser(game: dict) -> Tuple[str, str]:
+    if game['homeScore'] > game['awayScore']:
+        return game['homeTeam'], game['awayTeam']
+    return game['awayTeam'], game['homeTeam']
+
+
+def summarize_game(real_game: dict, noel_game: dict, stats: GameStats) \
+        -> dict:
+    # Everything the standings and player totals need from a finished game,
+    # as plain types, for storing alongside it
+    noel_winner, noel_loser = winner_and_loser(noel_game)
+    real_winner, real_loser = winner_and_loser(real_game)
+    return {
+        'season': noel_game['season'],
+        'day': noel_game['day'],
+        'noelWinner': noel_winner,
+        'noelLoser': noel_loser,
+        'realWinner': real_winner,
+        'realLoser': real_loser,
+        'stats': stats.to_state(),
+    }
+
+
+# Called with (final game update, stats) whenever generate_game finishes a
+# game. Set with use_stats_sink.
+stats_sink: Optional[Callable[[dict, GameStats], None]] = None
+
+
+def use_stats_sink(sink: Optional[Callable[[dict, GameStats], None]]):
+    global stats_sink
+    stats_sink = sink
+
+
+def publish_game_stats(final_update: dict, stats: GameStats):
+    if stats_sink is not None:
+        stats_sink(final_update, stats)
@@ -0,0 +1,183 @@
+import argparse
+import marshal
+import mmap
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from typing import Iterable, Tuple, List, Dict, Optional, Iterator
+
+from blaseball_mike import chronicler
+
+from game_transformer import StampedUpdate, generate_game, prefetch_games
+from game_transformer.stats import GameStats, use_stats_sink, summarize_game
+from game_transformer.archive import dumps_game, GameArchive, \
+    to_microseconds, MARSHAL_VERSION, ArchiveVersionError, check_python_version
+
+# Store layout:
+#   MAGIC
+#   u8, u8 major and minor version of the Python that wrote it, because the
+#          index and the archives are marshal (see archive.py)
+#   game archives (see archive.py), one after another
+#   index: marshal of a dict of game id -> (offset, length, day, season, first
+#          timestamp, last timestamp, summary). The summary is what the
+#          standings and player totals need from the game (see
+#          stats.summarize_game), or None.
+#   FOOTER: offset of the index, length of the index, MAGIC
+#
+# The store is written once and then only ever read, so every worker process
+# can map the same file and share its pages instead of each holding its own
+# copy of every game.
+MAGIC = b'NOELSTR3'
+OLD_MAGICS = [b'NOELSTR1', b'NOELSTR2']
+HEADER = struct.Struct('<8sBB')
+FOOTER = struct.Struct('<QI8s')
+
+# A few days' worth of games
+MAX_CACHED_ARCHIVES = 64
+
+
+def write_game_store(path: str,
+                     games: Iterable[Tuple[str, List[StampedUpdate],
+                                           Optional[dict]]]):
+    index = {}
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, *sys.version_info[:2]))
+        for game_id, updates, summary in games:
+            archive = dumps_game(updates)
+            data = updates[0].data
+            index[game_id] = (f.tell(), len(archive), data['day'],
+                              data['season'],
+                              to_microseconds(updates[0].timestamp),
+                              to_microseconds(updates[-1].timestamp),
+                              summary)
+            f.write(archive)
+
+        index_offset = f.tell()
+        index_bytes = marshal.dumps(index, MARSHAL_VERSION)
+        f.write(index_bytes)
+        f.write(FOOTER.pack(index_offset, len(index_bytes), MAGIC))
+
+
+def real_final_update(game_updates_by_play) -> dict:
+    last_play = game_updates_by_play[max(game_updates_by_play)]
+    return next((u['data'] for u in reversed(last_play)
+                 if u['data']['finalized']), last_play[-1]['data'])
+
+
+def build_game_store(path: str, game_ids: List[str], batch_size: int = 12):
+    # generate_game hands each game's player stats to the stats sink
+    game_stats: Dict[str, GameStats] = {}
+    use_stats_sink(
+        lambda final, stats: game_stats.update({final['id']: stats}))
+
+    def games():
+        for i in range(0, len(game_ids), batch_size):
+            batch = game_ids[i:i + batch_size]
+            prefetched = prefetch_games(batch)
+            for game_id in batch:
+                try:
+                    updates = generate_game(game_id, prefetched[game_id])
+                except (RuntimeError, AssertionError) as e:
+                    # Leave it out of the store. The app will try to generate
+                    # it on demand.
+                    print("Skipping game", game_id, "because", repr(e))
+                    continue
+
+                game_updates_by_play, _ = prefetched[game_id]
+                summary = summarize_game(
+                    real_final_update(game_updates_by_play),
+                    updates[-1].data, game_stats.pop(game_id))
+                yield game_id, updates, summary
+
+    try:
+        write_game_store(path, games())
+    finally:
+        use_stats_sink(None)
+
+
+class GameStore:
+    # Read-only, memory-mapped collection of generated games. Only the index of
+    # the store and of the games that have been looked up live in this process;
+    # the updates themselves are decoded straight out of the shared mapping.
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, major, minor = HEADER.unpack_from(self._mmap, 0)
+        if magic in OLD_MAGICS:
+            raise ArchiveVersionError("Game store was written by an older "
+                                      "version of Noel. Rebuild it.")
+        if magic != MAGIC:
+            raise ValueError("Not a Noel game store")
+        check_python_version(major, minor, "Game store")
+        index_offset, index_length, magic = FOOTER.unpack_from(
+            self._mmap, len(self._mmap) - FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError("Noel game store is truncated")
+
+        self.index: Dict[str, tuple] = marshal.loads(
+            self._mmap[index_offset:index_offset + index_length])
+        # The stream asks for a whole day's games on every request
+        self._games_by_day: Dict[Tuple[int, int], List[str]] = {}
+        for game_id, (_, _, day, season, *_) in self.index.items():
+            self._games_by_day.setdefault((season, day), []).append(game_id)
+        # Most recently used archives, so a game that's being polled keeps its
+        # decoded index and last block. Each one holds tens of KB, so they
+        # can't all be kept for a store with a few seasons in it.
+        self._archives: 'OrderedDict[str, GameArchive]' = OrderedDict()
+        self._archives_lock = threading.Lock()
+
+    def __contains__(self, game_id):
+        return game_id in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def game_ids(self):
+        return self.index.keys()
+
+    def games_for_day(self, season: int, day: int) -> List[str]:
+        return self._games_by_day.get((season, day), [])
+
+    def summaries(self) -> Iterator[Tuple[str, dict]]:
+        for game_id, entry in self.index.items():
+            summary = entry[6] if len(entry) > 6 else None
+            if summary is not None:
+                yield game_id, summary
+
+    def archive(self, game_id: str) -> GameArchive:
+        with self._archives_lock:
+            archive = self._archives.get(game_id)
+            if archive is not None:
+                self._archives.move_to_end(game_id)
+                return archive
+
+        offset, length, *_ = self.index[game_id]
+        archive = GameArchive(
+            memoryview(self._mmap)[offset:offset + length])
+        with self._archives_lock:
+            self._archives[game_id] = archive
+            while len(self._archives) > MAX_CACHED_ARCHIVES:
+                self._archives.popitem(last=False)
+        return archive
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate games and write them to a Noel game store")
+    parser.add_argument('path')
+    parser.add_argument('--season', type=int, required=True,
+                        help="1-indexed season to generate")
+    parser.add_argument('--day', type=int,
+                        help="1-indexed day to generate. Defaults to all days.")
+    args = parser.parse_args()
+
+    games = chronicler.get_games(season=args.season, day=args.day,
+                                 finished=True)
+    build_game_store(args.path, [game['gameId'] for game in games])
+
+
+if __name__ == '__main__':
+    main()
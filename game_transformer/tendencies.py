@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import random
+from typing import Optional, Dict, List, Tuple
+
+import numpy as np
+
+from game_transformer.GameRecorder import use_tendencies
+from game_transformer.classifier import PitchType, StealDecision
+
+# What each player did across many games (typically a season), for when a
+# game runs out of things the player did in that game. Built from a columnar
+# export (see columnar.py) and stored the same way, as memory-mapped .npy
+# files, so every worker shares one copy of it.
+#
+# Each kind of record is sorted by player, with an offsets array saying where
+# each player's records start and end. Drawing a random record for a player is
+# two lookups and a random number.
+COLUMNS = {
+    'pitch_offsets': np.int64,
+    'pitch_type': np.int8,
+    'pitch_base_reached': np.int8,  # -1 if the batter didn't reach base
+    'advancement_offsets': np.int64,
+    'advancement_bases': np.int8,
+    'steal_offsets': np.int64,
+    'steal_decision': np.int8,
+}
+
+METADATA_FILE = 'metadata.json'
+
+
+def group_by_player(players: np.ndarray, num_players: int):
+    # Returns the order that sorts the rows by player and the offsets of each
+    # player's rows in that order
+    order = np.argsort(players, kind='stable')
+    offsets = np.zeros(num_players + 1, dtype=np.int64)
+    np.cumsum(np.bincount(players, minlength=num_players), out=offsets[1:])
+    return order, offsets
+
+
+def build_tendency_index(columnar_path: str, path: str):
+    # Imported here to avoid a circular import with GameRecorder
+    from game_transformer.columnar import ColumnarRecordings
+
+    recordings = ColumnarRecordings(columnar_path)
+    num_players = len(recordings.players)
+    columns = {}
+
+    order, columns['pitch_offsets'] = group_by_player(
+        recordings['pitch_batter'], num_players)
+    columns['pitch_type'] = recordings['pitch_type'][order]
+    columns['pitch_base_reached'] = recordings['pitch_base_reached'][order]
+
+    order, columns['advancement_offsets'] = group_by_player(
+        recordings['advancement_runner'], num_players)
+    columns['advancement_bases'] = recordings['advancement_bases'][order]
+
+    order, columns['steal_offsets'] = group_by_player(
+        recordings['steal_runner'], num_players)
+    columns['steal_decision'] = recordings['steal_decision'][order]
+
+    os.makedirs(path, exist_ok=True)
+    for name, dtype in COLUMNS.items():
+        np.save(os.path.join(path, name + '.npy'),
+                np.asarray(columns[name], dtype=dtype))
+
+    with open(os.path.join(path, METADATA_FILE), 'w') as f:
+        json.dump({
+            'players': recordings.players,
+            'pitchTypes': [t.name for t in recordings.pitch_types],
+            'stealDecisions': [d.name for d in recordings.steal_decisions],
+        }, f)
+
+
+class TendencyIndex:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, METADATA_FILE)) as f:
+            metadata = json.load(f)
+
+        self.player_indices: Dict[str, int] = {
+            player_id: i for i, player_id in enumerate(metadata['players'])}
+        self.pitch_types: List[PitchType] = [
+            PitchType[name] for name in metadata['pitchTypes']]
+        self.steal_decisions: List[StealDecision] = [
+            StealDecision[name] for name in metadata['stealDecisions']]
+
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+            for name in COLUMNS
+        }
+
+    def _draw_row(self, kind: str, player_id: str, rng: random.Random):
+        # Index of a random row of this kind for this player, or None
+        player = self.player_indices.get(player_id)
+        if player is None:
+            return None
+        offsets = self.columns[kind + '_offsets']
+        start, end = int(offsets[player]), int(offsets[player + 1])
+        if start == end:
+            return None
+        return start + rng.randrange(end - start)
+
+    def has_pitches_for(self, player_id: str) -> bool:
+        player = self.player_indices.get(player_id)
+        offsets = self.columns['pitch_offsets']
+        return player is not None and offsets[player + 1] > offsets[player]
+
+    def draw_pitch(self, player_id: str, rng: random.Random) \
+            -> Optional[Tuple[PitchType, Optional[int]]]:
+        # Pitch type and base reached
+        row = self._draw_row('pitch', player_id, rng)
+        if row is None:
+            return None
+        base_reached = int(self.columns['pitch_base_reached'][row])
+        return (self.pitch_types[self.columns['pitch_type'][row]],
+                None if base_reached == -1 else base_reached)
+
+    def draw_advancement(self, player_id: str,
+                         rng: random.Random) -> Optional[int]:
+        row = self._draw_row('advancement', player_id, rng)
+        if row is None:
+            return None
+        return int(self.columns['advancement_bases'][row])
+
+    def draw_steal_decision(self, player_id: str,
+                            rng: random.Random) -> Optional[StealDecision]:
+        row = self._draw_row('steal', player_id, rng)
+        if row is None:
+            return None
+        return self.steal_decisions[self.columns['steal_decision'][row]]
+
+
+def use_tendency_index(path: Optional[str]):
+    # None means games only draw from themselves
+    use_tendencies(None if path is None else TendencyIndex(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build a player tendency index from a columnar export")
+    parser.add_argument('columnar_path')
+    parser.add_argument('path')
+    args = parser.parse_args()
+
+    build_tendency_index(args.columnar_path, args.path)
+
+
+if __name__ == '__main__':
+    main()
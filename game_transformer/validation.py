@@ -0,0 +1,217 @@
+import argparse
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from typing import List, Tuple, Any, Optional
+
+from blaseball_mike import chronicler
+
+from game_transformer import prefetch_games, generate_game, \
+    game_update_for_event
+
+# Feed event types that happen in plain old baseball
+PLAIN_EVENT_TYPES = {
+    0,  # let's go
+    1,  # play ball
+    2,  # half inning start
+    3,  # pitcher switch
+    4,  # base steal
+    5,  # walk
+    6,  # strikeout
+    7,  # flyout
+    8,  # ground out
+    9,  # home run
+    10,  # hit
+    11,  # end of game
+    12,  # batter up
+    13,  # strike
+    14,  # ball
+    15,  # foul ball
+    28,  # inning becomes outing
+}
+
+# Things that happen inside otherwise-plain events
+SPECIAL_DESCRIPTIONS = [
+    " charms ",
+    "is Inhabiting",
+    " is Heating Up!",
+    " is Red Hot!",
+    "Quadruple",
+    "fifth base",
+]
+
+# The fields that make up what a viewer sees of the game
+COMPARED_FIELDS = [
+    'lastUpdate',
+    'inning',
+    'topOfInning',
+    'halfInningOuts',
+    'atBatBalls',
+    'atBatStrikes',
+    'awayScore',
+    'homeScore',
+    'awayBatter',
+    'homeBatter',
+    'baseRunners',
+    'basesOccupied',
+    'finalized',
+]
+
+# Only keep this many mismatches per game, to keep results small
+MAX_MISMATCHES = 10
+GAMES_PER_TASK = 12
+
+
+@dataclass
+class GameResult:
+    game_id: str
+    special: bool = False
+    skipped: bool = False
+    num_updates: int = 0
+    num_compared: int = 0
+    # (play count, field, original value, generated value)
+    mismatches: List[Tuple[int, str, Any, Any]] = field(default_factory=list)
+    num_mismatches: int = 0
+    error: Optional[str] = None
+    seconds: float = 0
+
+
+def is_special_game(feed_events):
+    return any(e['type'] not in PLAIN_EVENT_TYPES or
+               any(s in e['description'] for s in SPECIAL_DESCRIPTIONS)
+               for e in feed_events)
+
+
+def validate_games(game_ids: List[str],
+                   include_special: bool = False) -> List[GameResult]:
+    prefetched = prefetch_games(game_ids)
+    return [validate_game(game_id, prefetched[game_id], include_special)
+            for game_id in game_ids]
+
+
+def validate_game(game_id: str, prefetched, include_special: bool = False):
+    game_updates_by_play, feed_events = prefetched
+    # May be a generator, and this needs to look at them before the recorder
+    feed_events = list(feed_events)
+    # Has to happen before game_update_for_event adds empty plays to the dict
+    last_play = max(game_updates_by_play.keys())
+
+    result = GameResult(game_id, special=is_special_game(feed_events))
+    if result.special and not include_special:
+        result.skipped = True
+        return result
+
+    start = time.perf_counter()
+    try:
+        generated = generate_game(game_id,
+                                  (game_updates_by_play, feed_events))
+    except Exception as e:
+        result.error = repr(e)
+        result.seconds = time.perf_counter() - start
+        return result
+    result.seconds = time.perf_counter() - start
+    result.num_updates = len(generated)
+
+    for update in generated:
+        play_count = update.data['playCount']
+        try:
+            original = game_update_for_event(game_updates_by_play,
+                                             play_count - 1)
+        except RuntimeError:
+            continue  # Can't tell which one it should be
+        if original is None:
+            continue
+
+        result.num_compared += 1
+        for key in COMPARED_FIELDS:
+            if original.get(key) != update.data.get(key):
+                result.num_mismatches += 1
+                if len(result.mismatches) < MAX_MISMATCHES:
+                    result.mismatches.append(
+                        (play_count, key, original.get(key),
+                         update.data.get(key)))
+
+    # Generated game must end where the original ends
+    if generated[-1].data['playCount'] != last_play:
+        result.num_mismatches += 1
+        if len(result.mismatches) < MAX_MISMATCHES:
+            result.mismatches.append((last_play, 'playCount', last_play,
+                                      generated[-1].data['playCount']))
+
+    return result
+
+
+def _validate_task(task):
+    game_ids, include_special = task
+    return validate_games(game_ids, include_special)
+
+
+def validate_season(season: int, processes: Optional[int] = None,
+                    include_special: bool = False):
+    games = chronicler.get_games(season=season, finished=True)
+    # Games come back in day order, so each task is about one day, which
+    # lets each worker fetch a whole day in a few requests
+    game_ids = [game['gameId'] for game in games]
+    tasks = [(game_ids[i:i + GAMES_PER_TASK], include_special)
+             for i in range(0, len(game_ids), GAMES_PER_TASK)]
+
+    results: List[GameResult] = []
+    start = time.perf_counter()
+    with Pool(processes) as pool:
+        for task_results in pool.imap_unordered(_validate_task, tasks):
+            results.extend(task_results)
+    elapsed = time.perf_counter() - start
+
+    return results, elapsed
+
+
+def summarize(results: List[GameResult], elapsed: float):
+    checked = [r for r in results if not r.skipped]
+    errors = [r for r in checked if r.error is not None]
+    mismatched = [r for r in checked
+                  if r.error is None and r.num_mismatches > 0]
+    field_counts = Counter(key for r in mismatched
+                           for _, key, _, _ in r.mismatches)
+
+    lines = [
+        f"{len(results)} games in {elapsed:.1f}s "
+        f"({len(results) / elapsed:.1f} games/s)",
+        f"{len(results) - len(checked)} skipped for Blaseball-specific events",
+        f"{len(checked) - len(errors) - len(mismatched)} faithful, "
+        f"{len(mismatched)} mismatched, {len(errors)} failed to generate",
+    ]
+    if field_counts:
+        lines.append("Mismatched fields: " + ", ".join(
+            f"{key} ({count})" for key, count in field_counts.most_common()))
+    for r in mismatched:
+        play_count, key, original, generated = r.mismatches[0]
+        lines.append(f"  {r.game_id}: {r.num_mismatches} mismatches, first at "
+                     f"play {play_count}: {key} {original!r} != {generated!r}")
+    for r in errors:
+        lines.append(f"  {r.game_id}: {r.error}")
+
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that games without Blaseball-specific events are "
+                    "generated exactly as they originally happened")
+    parser.add_argument('--season', type=int, required=True,
+                        help="1-indexed season to validate")
+    parser.add_argument('--processes', type=int,
+                        help="Number of worker processes. Defaults to the "
+                             "number of CPUs.")
+    parser.add_argument('--include-special', action='store_true',
+                        help="Also generate games with Blaseball-specific "
+                             "events. They're expected to differ.")
+    args = parser.parse_args()
+
+    results, elapsed = validate_season(args.season, args.processes,
+                                       args.include_special)
+    print(summarize(results, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+# Run with: gunicorn app:app
+#
+# The app is imported and warmed up in the master process, then the workers are
+# forked from it. That way blaseball_mike, Flask and dateutil are only imported
+# once, the configured games (NOEL_PRELOAD_SEASON, NOEL_PRELOAD_GAMES) are only
+# loaded once, and every worker shares them copy-on-write and serves its first
+# request at full speed.
+import gc
+import os
+
+bind = os.environ.get("NOEL_BIND", "127.0.0.1:5000")
+workers = int(os.environ.get("NOEL_WORKERS", 4))
+preload_app = True
+
+
+def when_ready(server):
+    from app import warm_start
+    from UpstreamClient import close_blaseball_mike_sessions
+
+    warm_start()
+    # Connections opened while warming up mustn't be shared by the workers
+    close_blaseball_mike_sessions()
+
+    # Move everything loaded so far out of the garbage collector's reach. The
+    # collector writes to every object it looks at, which would make each
+    # worker copy the pages holding the preloaded games.
+    gc.freeze()
@@ -0,0 +1,114 @@
+import argparse
+import sys
+import threading
+import time
+
+import requests
+
+# Drives many concurrent stream clients against a running app and reports
+# throughput, latency and how much memory each worker ends up using. Best run
+# against upstream_stub.py so that the numbers are about the app, not SIBR.
+#
+#   python load_test.py --clients 50 --seconds 60 \
+#       --path '/chronicler/v2/versions?type=Stream&...'
+DEFAULT_PATH = '/chronicler/v2/versions?type=Stream&order=asc&count=1'
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_client(base_url, paths, until, latencies, errors, lock):
+    session = requests.Session()
+    i = 0
+    while time.monotonic() < until:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            resp = session.get(base_url + path)
+            ok = resp.status_code < 500
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors.append(elapsed)
+
+
+def worker_memory(base_url, samples):
+    # Requests land on whichever worker is free, so ask enough times to hear
+    # from all of them
+    workers = {}
+    session = requests.Session()
+    for _ in range(samples):
+        try:
+            stats = session.get(base_url + '/noel/process').json()
+        except (requests.RequestException, ValueError):
+            continue
+        workers[stats['pid']] = stats
+    return workers
+
+
+def run_load_test(base_url, paths, clients, seconds):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    until = time.monotonic() + seconds
+    threads = [threading.Thread(target=run_client,
+                                args=(base_url, paths, until, latencies,
+                                      errors, lock))
+               for _ in range(clients)]
+
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    return sorted(latencies), errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test the stream endpoint")
+    parser.add_argument('--url', default='http://127.0.0.1:5000',
+                        help="Where the app is running")
+    parser.add_argument('--path', action='append',
+                        help="Path to request, including the query string. "
+                             "Give more than once to cycle through several.")
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--memory-samples', type=int, default=50,
+                        help="How many times to ask the workers for their "
+                             "memory use afterwards")
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    latencies, errors, elapsed = run_load_test(
+        base_url, args.path or [DEFAULT_PATH], args.clients, args.seconds)
+
+    total = len(latencies) + len(errors)
+    print(f"{total} requests in {elapsed:.1f}s "
+          f"({total / elapsed:.1f} requests/s), {len(errors)} failed")
+    print(f"Latency p50 {percentile(latencies, 0.5) * 1000:.1f}ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms, "
+          f"max {percentile(latencies, 1) * 1000:.1f}ms")
+
+    workers = worker_memory(base_url, args.memory_samples)
+    for pid, stats in sorted(workers.items()):
+        print(f"  worker {pid}: {stats['rss'] / 1024 / 1024:.1f}MiB resident, "
+              f"{stats['cachedGames']} games cached "
+              f"({stats['cacheSize'] / 1024 / 1024:.1f}MiB)")
+
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
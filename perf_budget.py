@@ -0,0 +1,228 @@
+import argparse
+import gc
+import gzip
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+from game_transformer import prefetch_games, record_game
+from game_transformer.GameProducer import GameProducer
+from game_transformer.state import RecordingUniverse, RecordedUniverse, \
+    TeamSnapshot, PlayerState
+
+# Replays a fixed corpus of recorded games through the recorder and producer
+# and compares wall time, peak memory and retained allocations against stored
+# baselines. Recording the corpus needs network access; everything else runs
+# offline. The committed corpus is two small made-up games in the same format,
+# so the check runs anywhere. Timings vary between machines far more than
+# memory does, so the committed baselines give them more room, and the unit
+# tests only check memory unless NOEL_PERF_CHECK is set.
+#
+#   python perf_budget.py record <game id>...   add games to the corpus
+#   python perf_budget.py baseline              store the current numbers
+#   python perf_budget.py check                 fail if over budget
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), 'perf_corpus')
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'perf_baselines.json')
+
+# How far over its baseline each metric may go before the check fails
+DEFAULT_BUDGET = {
+    'seconds': 1.5,
+    'peakBytes': 1.25,
+    'retainedBlocks': 1.25,
+}
+# Timings are the best of this many runs, to reduce noise
+TIMING_RUNS = 3
+
+STAGES = ['record', 'produce']
+
+
+def record_corpus(game_ids, corpus_dir=CORPUS_DIR):
+    os.makedirs(corpus_dir, exist_ok=True)
+    prefetched = prefetch_games(game_ids)
+    for game_id in game_ids:
+        game_updates_by_play, feed_events = prefetched[game_id]
+        feed_events = list(feed_events)
+
+        # Run the game once to find out which teams and players it loads
+        universe = RecordingUniverse()
+        list(GameProducer(*record_game(
+            game_id, (game_updates_by_play, feed_events), universe),
+            universe=universe))
+
+        corpus_game = {
+            'gameId': game_id,
+            'updates': [u for play in sorted(game_updates_by_play.keys())
+                        for u in game_updates_by_play[play]],
+            'feedEvents': feed_events,
+            'teams': [[team_id, timestamp, {
+                'id': team.id,
+                'nickname': team.nickname,
+                'lineup': [[p.id, p.name] for p in team.lineup],
+            }] for (team_id, timestamp), team in universe.teams.items()],
+            'players': [[player_id, timestamp, [player.id, player.name]]
+                        for (player_id, timestamp), player
+                        in universe.players.items()],
+        }
+        path = os.path.join(corpus_dir, game_id + '.json.gz')
+        with gzip.open(path, 'wt') as f:
+            json.dump(corpus_game, f)
+        print("Recorded", game_id)
+
+
+def load_corpus(corpus_dir=CORPUS_DIR):
+    games = []
+    for filename in sorted(os.listdir(corpus_dir)):
+        if not filename.endswith('.json.gz'):
+            continue
+        with gzip.open(os.path.join(corpus_dir, filename), 'rt') as f:
+            games.append(json.load(f))
+    return games
+
+
+def corpus_universe(corpus_game):
+    teams = {
+        (team_id, timestamp): TeamSnapshot(
+            id=team['id'], nickname=team['nickname'],
+            lineup=[PlayerState(id=p_id, name=name)
+                    for p_id, name in team['lineup']])
+        for team_id, timestamp, team in corpus_game['teams']
+    }
+    players = {
+        (player_id, timestamp): PlayerState(id=p_id, name=name)
+        for player_id, timestamp, (p_id, name) in corpus_game['players']
+    }
+    return RecordedUniverse(teams, players)
+
+
+def corpus_prefetched(corpus_game):
+    game_updates_by_play = defaultdict(lambda: [])
+    for game_update in corpus_game['updates']:
+        game_updates_by_play[game_update['data']['playCount']].append(
+            game_update)
+    return game_updates_by_play, corpus_game['feedEvents']
+
+
+def run_stages(corpus_game, measure):
+    # Runs each stage of generating the game inside measure(stage, fn), which
+    # returns fn's result
+    universe = corpus_universe(corpus_game)
+    producer = measure('record', lambda: GameProducer(*record_game(
+        corpus_game['gameId'], corpus_prefetched(corpus_game), universe),
+        universe=universe))
+    measure('produce', lambda: list(producer))
+
+
+def measure_game(corpus_game, timing=True):
+    # Without timing, only the memory metrics are measured. They come out the
+    # same on every run, where timings depend on what else the machine is
+    # doing.
+    results = {stage: {} for stage in STAGES}
+
+    def time_stage(stage, fn):
+        gc.collect()
+        start = time.perf_counter()
+        value = fn()
+        elapsed = time.perf_counter() - start
+        results[stage]['seconds'] = min(
+            results[stage].get('seconds', float('inf')), elapsed)
+        return value
+
+    if timing:
+        for _ in range(TIMING_RUNS):
+            run_stages(corpus_game, time_stage)
+
+    # Memory is measured separately because tracing slows everything down
+    def trace_stage(stage, fn):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            value = fn()
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        results[stage]['peakBytes'] = peak
+        results[stage]['retainedBlocks'] = sum(
+            stat.count for stat in snapshot.statistics('filename'))
+        return value
+
+    run_stages(corpus_game, trace_stage)
+    return results
+
+
+def measure_corpus(corpus_dir=CORPUS_DIR, timing=True):
+    return {game['gameId']: measure_game(game, timing)
+            for game in load_corpus(corpus_dir)}
+
+
+def check_budget(measurements, baselines, budget):
+    # Returns a list of lines describing everything that's over budget
+    failures = []
+    for game_id, stages in measurements.items():
+        if game_id not in baselines:
+            failures.append(f"{game_id}: no baseline")
+            continue
+        for stage, metrics in stages.items():
+            for metric, value in metrics.items():
+                baseline = baselines[game_id][stage][metric]
+                limit = baseline * budget[metric]
+                if value > limit:
+                    failures.append(
+                        f"{game_id} {stage} {metric}: {value:.6g} is over "
+                        f"budget {limit:.6g} (baseline {baseline:.6g})")
+    return failures
+
+
+def format_measurements(measurements):
+    lines = []
+    for game_id, stages in measurements.items():
+        lines.append(game_id)
+        for stage, metrics in stages.items():
+            seconds = (f"{metrics['seconds'] * 1000:9.1f}ms"
+                       if 'seconds' in metrics else " " * 11)
+            lines.append(f"  {stage:8} {seconds} "
+                         f"{metrics['peakBytes'] / 1024:9.0f}KiB peak "
+                         f"{metrics['retainedBlocks']:9} blocks")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check game generation against its performance budget")
+    parser.add_argument('command', choices=['record', 'baseline', 'check'])
+    parser.add_argument('game_ids', nargs='*',
+                        help="Games to add to the corpus (record only)")
+    parser.add_argument('--corpus', default=CORPUS_DIR)
+    parser.add_argument('--baselines', default=BASELINES_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record_corpus(args.game_ids, args.corpus)
+        return 0
+
+    measurements = measure_corpus(args.corpus)
+    print(format_measurements(measurements))
+
+    if args.command == 'baseline':
+        with open(args.baselines, 'w') as f:
+            json.dump({'budget': DEFAULT_BUDGET, 'games': measurements}, f,
+                      indent=2)
+        return 0
+
+    with open(args.baselines) as f:
+        baselines = json.load(f)
+    failures = check_budget(measurements, baselines['games'],
+                            {**DEFAULT_BUDGET, **baselines.get('budget', {})})
+    if failures:
+        print("Over budget:")
+        print("\n".join("  " + failure for failure in failures))
+        return 1
+    print("Within budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
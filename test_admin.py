@@ -0,0 +1,165 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import app
+from AdminLog import AdminLog
+from GameCache import GameCache
+
+TOKEN = 'let-me-in'
+AUTHORIZED = {'Authorization': f"Bearer {TOKEN}"}
+
+
+class TestAdminRoutes(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def test_hidden_without_a_token(self):
+        with mock.patch.dict(app.app.config, {'ADMIN_TOKEN': None}):
+            self.assertEqual(self.client.get('/noel/admin/cache').status_code,
+                             404)
+            self.assertEqual(self.client.post(
+                '/noel/admin/cache/invalidate',
+                json={'gameIds': ['a']}).status_code, 404)
+
+    def test_needs_the_token(self):
+        with mock.patch.dict(app.app.config, {'ADMIN_TOKEN': TOKEN}):
+            self.assertEqual(self.client.get('/noel/admin/cache').status_code,
+                             401)
+            self.assertEqual(self.client.get(
+                '/noel/admin/cache',
+                headers={'Authorization': "Bearer wrong"}).status_code, 401)
+            self.assertEqual(self.client.get(
+                '/noel/admin/cache', headers=AUTHORIZED).status_code, 200)
+
+    def test_rejects_bad_game_ids(self):
+        with mock.patch.dict(app.app.config, {'ADMIN_TOKEN': TOKEN}):
+            for body in [{'gameIds': 'abc'}, {'gameIds': [1, 2]},
+                         {'season': 'eleven', 'day': 3}, ['a'], {}]:
+                resp = self.client.post('/noel/admin/cache/invalidate',
+                                        json=body, headers=AUTHORIZED)
+                self.assertEqual(resp.status_code, 400, body)
+
+            resp = self.client.post('/noel/admin/cache/invalidate',
+                                    json={'gameIds': ['a', 'b']},
+                                    headers=AUTHORIZED)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.get_json()['invalidated'], [])
+
+
+class TestOtherWorkers(unittest.TestCase):
+    # Another worker is another AdminLog on the same file
+    def setUp(self):
+        path = os.path.join(tempfile.mkdtemp(), 'admin.log')
+        self.other_worker = AdminLog(path)
+        self.game_cache = GameCache(10 ** 8)
+        patches = [
+            mock.patch.object(app, 'admin_log', AdminLog(path)),
+            mock.patch.object(app, 'game_cache', self.game_cache),
+            mock.patch.dict(app.app.config, {'ADMIN_TOKEN': TOKEN}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = app.app.test_client()
+
+    def test_invalidation_reaches_every_worker(self):
+        self.game_cache.put('a', ['update'])
+        self.game_cache.put('b', ['update'])
+        resp = self.client.post('/noel/admin/cache/invalidate',
+                                json={'gameIds': ['a']}, headers=AUTHORIZED)
+        self.assertEqual(resp.get_json()['invalidated'], ['a'])
+        self.assertEqual(resp.get_json()['pid'], os.getpid())
+        self.assertNotIn('a', self.game_cache)
+
+        # From a request to some other worker
+        self.game_cache.put('a', ['update'])
+        self.other_worker.append('invalidate', ['a', 'b'])
+        self.assertIn('a', self.game_cache)
+        self.client.get('/noel/admin/cache', headers=AUTHORIZED)
+        self.assertNotIn('a', self.game_cache)
+        self.assertNotIn('b', self.game_cache)
+
+    def test_warming_reaches_every_worker(self):
+        with mock.patch.object(app, 'generate_game_async') as generate, \
+                mock.patch.object(app, 'prefetch_uncached_games'):
+            self.other_worker.append('warm', ['a'])
+            self.client.get('/noel/admin/cache', headers=AUTHORIZED)
+        self.assertEqual([call.args[0] for call in generate.call_args_list],
+                         ['a'])
+
+
+class TestSeasonIndexing(unittest.TestCase):
+    # Seasons and days are 0-indexed everywhere in the app, and 1-indexed in
+    # blaseball_mike
+    def test_admin_and_warm_start_agree(self):
+        client = app.app.test_client()
+        config = {'ADMIN_TOKEN': TOKEN, 'PRELOAD_SEASON': '10',
+                  'PRELOAD_GAMES': None}
+        with mock.patch.dict(app.app.config, config), \
+                mock.patch.object(app.chronicler, 'get_games',
+                                  return_value=[]) as get_games:
+            client.post('/noel/admin/cache/invalidate',
+                        json={'season': 10, 'day': 0}, headers=AUTHORIZED)
+            app.warm_start()
+
+        self.assertEqual(get_games.call_args_list, [
+            mock.call(season=11, day=1),
+            mock.call(season=11, finished=True),
+        ])
+
+
+class TestWarmStart(unittest.TestCase):
+    def setUp(self):
+        self.generated = []
+        patches = [
+            mock.patch.object(app, 'prefetch_uncached_games'),
+            mock.patch.object(app, 'generate_game_safely',
+                              self.generated.append),
+            mock.patch.object(app.chronicler, 'get_games', return_value=[
+                {'gameId': f"season-{i}"} for i in range(13)]),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_generates_the_configured_games(self):
+        config = {'PRELOAD_SEASON': '10', 'PRELOAD_GAMES': 'a,b'}
+        with mock.patch.dict(app.app.config, config):
+            app.warm_start()
+
+        expected = [f"season-{i}" for i in range(13)] + ['a', 'b']
+        self.assertEqual(self.generated, expected)
+        # A day's worth at a time
+        self.assertEqual(
+            [call.args[0] for call
+             in app.prefetch_uncached_games.call_args_list],
+            [expected[:12], expected[12:]])
+
+    def test_nothing_configured(self):
+        config = {'PRELOAD_SEASON': None, 'PRELOAD_GAMES': None}
+        with mock.patch.dict(app.app.config, config):
+            app.warm_start()
+        self.assertEqual(self.generated, [])
+
+    def test_gunicorn_closes_sessions_after_warming_up(self):
+        spec = importlib.util.spec_from_file_location(
+            'gunicorn_conf',
+            os.path.join(os.path.dirname(__file__), 'gunicorn.conf.py'))
+        gunicorn_conf = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(gunicorn_conf)
+
+        calls = []
+        with mock.patch.object(app, 'warm_start',
+                               lambda: calls.append('warm')), \
+                mock.patch('UpstreamClient.close_blaseball_mike_sessions',
+                           lambda: calls.append('close')), \
+                mock.patch.object(gunicorn_conf.gc, 'freeze'):
+            gunicorn_conf.when_ready(None)
+        self.assertEqual(calls, ['warm', 'close'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from AdminLog import AdminLog
+
+
+class TestAdminLog(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'admin.log')
+
+    def test_every_worker_reads_every_action(self):
+        first, second = AdminLog(self.path), AdminLog(self.path)
+        first.append('invalidate', ['a', 'b'])
+        second.append('warm', ['c'])
+
+        expected = [('invalidate', ['a', 'b']), ('warm', ['c'])]
+        self.assertEqual(first.read_new(), expected)
+        self.assertEqual(second.read_new(), expected)
+        self.assertEqual(first.read_new(), [])
+
+    def test_skips_actions_from_before_it_started(self):
+        AdminLog(self.path).append('invalidate', ['a'])
+        log = AdminLog(self.path)
+        self.assertEqual(log.read_new(), [])
+        log.append('warm', ['b'])
+        self.assertEqual(log.read_new(), [('warm', ['b'])])
+
+    def test_waits_for_the_rest_of_a_line(self):
+        log = AdminLog(self.path)
+        with open(self.path, 'a') as f:
+            f.write('{"action": "warm", ')
+        self.assertEqual(log.read_new(), [])
+        with open(self.path, 'a') as f:
+            f.write('"gameIds": ["a"]}\n')
+        self.assertEqual(log.read_new(), [('warm', ['a'])])
+
+    def test_defaults_to_a_temporary_file(self):
+        log = AdminLog()
+        self.addCleanup(os.remove, log.path)
+        log.append('invalidate', ['a'])
+        self.assertEqual(AdminLog(log.path).read_new(), [])
+        self.assertEqual(log.read_new(), [('invalidate', ['a'])])
+
+
+if __name__ == '__main__':
+    unittest.main()
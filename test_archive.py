@@ -0,0 +1,107 @@
+import sys
+import threading
+import unittest
+from copy import deepcopy
+from datetime import datetime, timedelta, timezone
+
+from game_transformer import StampedUpdate
+from game_transformer.archive import dumps_game, loads_game, GameArchive, \
+    ArchiveVersionError, HEADER, BLOCK_SIZE
+
+
+def make_game(num_updates=50):
+    start = datetime(2021, 3, 1, 16, tzinfo=timezone.utc)
+    update = {
+        'id': 'game-id',
+        'playCount': 0,
+        'lastUpdate': "",
+        'awayBatter': None,
+        'awayBatterName': "",
+        'awayTeamName': "Hades Tigers",
+        'baseRunners': [],
+        'basesOccupied': [],
+        'finalized': False,
+    }
+    updates = []
+    for i in range(num_updates):
+        update['playCount'] = i if i < 2 else i + 1  # play ball skips one
+        update['awayBatter'] = f"player-{i % 9}"
+        update['awayBatterName'] = f"Player {i % 9}"
+        update['lastUpdate'] = f"Player {i % 9} hits a Single!"
+        update['baseRunners'] = [f"player-{(i + 1) % 9}"]
+        update['basesOccupied'] = [i % 3]
+        update['finalized'] = i == num_updates - 1
+        updates.append(StampedUpdate(start + timedelta(seconds=5 * i),
+                                     deepcopy(update)))
+    return updates
+
+
+class TestGameArchive(unittest.TestCase):
+    def test_round_trip(self):
+        updates = make_game()
+        self.assertEqual(loads_game(dumps_game(updates)), updates)
+
+    def test_round_trip_keeps_types_and_keys(self):
+        updates = make_game(6)
+        updates[1].data['finalized'] = 0  # == False, but not the same
+        updates[2].data['basesOccupied'] = [True]
+        updates[3].data['basesOccupied'] = [1]
+        updates[4].data['newKey'] = 1
+        del updates[5].data['awayBatter']
+        loaded = loads_game(dumps_game(updates))
+        self.assertEqual(loaded, updates)
+        for update, expected in zip(loaded, updates):
+            self.assertEqual(list(update.data), list(expected.data))
+            for key, value in expected.data.items():
+                self.assertIs(type(update.data[key]), type(value))
+        self.assertIs(type(loaded[2].data['basesOccupied'][0]), bool)
+        self.assertIs(type(loaded[3].data['basesOccupied'][0]), int)
+
+    def test_random_access(self):
+        updates = make_game()
+        for block_size in [BLOCK_SIZE, 8]:
+            archive = GameArchive(dumps_game(updates, block_size))
+
+            self.assertEqual(len(archive), len(updates))
+            self.assertEqual(archive[-1], updates[-1])
+            self.assertEqual(archive.update_for_play(20), updates[19])
+            self.assertEqual(list(archive), updates)
+            self.assertIsNone(archive.update_for_play(2))
+            self.assertIsNone(archive.update_for_play(1000))
+            with self.assertRaises(IndexError):
+                archive.update_at(len(updates))
+
+    def test_rejects_other_data(self):
+        with self.assertRaises(ValueError):
+            GameArchive(b"not an archive at all")
+
+    def test_rejects_other_python_versions(self):
+        data = bytearray(dumps_game(make_game()))
+        magic, _, _, index_length = HEADER.unpack_from(data, 0)
+        HEADER.pack_into(data, 0, magic, sys.version_info[0],
+                         sys.version_info[1] + 1, index_length)
+        with self.assertRaises(ArchiveVersionError):
+            GameArchive(bytes(data))
+
+    def test_threads_sharing_an_archive(self):
+        updates = make_game(200)
+        archive = GameArchive(dumps_game(updates, block_size=4))
+        mismatches = []
+
+        def read(offset):
+            for i in range(2000):
+                index = (i * 7 + offset) % len(updates)
+                if archive[index] != updates[index]:
+                    mismatches.append(index)
+
+        threads = [threading.Thread(target=read, args=(offset,))
+                   for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(mismatches, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
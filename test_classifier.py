@@ -0,0 +1,122 @@
+import unittest
+
+from game_transformer.classifier import classify_event, PitchType, \
+    StealDecision
+
+
+def feed_event(event_type, description, player_tags=()):
+    return {'type': event_type, 'description': description,
+            'playerTags': list(player_tags)}
+
+
+class TestClassifier(unittest.TestCase):
+    def test_batter_up(self):
+        event = classify_event(feed_event(
+            12, "Ghost is Inhabiting Jessica Telephone!\n"
+                "Jessica Telephone batting for the Mints."), None)
+        self.assertFalse(event.is_pitch)
+        self.assertIn(("Jessica Telephone", "Mints"), event.batting)
+        self.assertNotIn(("Jessica Telephone", "Pies"), event.batting)
+        self.assertEqual(event.inhabited, {"Jessica Telephone"})
+
+    def test_batter_up_with_more_after_it(self):
+        event = classify_event(feed_event(
+            12, "Jessica Telephone batting for the Mints, wielding a Bat."),
+            None)
+        self.assertIn(("Jessica Telephone", "Mints"), event.batting)
+
+    def test_batter_up_mid_line(self):
+        event = classify_event(feed_event(
+            12, "The Ghost is Inhabiting Jessica Telephone! "
+                "Jessica Telephone batting for the Shoe Thieves."), None)
+        self.assertIn(("Jessica Telephone", "Shoe Thieves"), event.batting)
+        self.assertEqual(event.inhabited, {"Jessica Telephone"})
+
+    def test_steals(self):
+        event = classify_event(feed_event(
+            4, "Nagomi Mcdaniel gets caught stealing third base."), None)
+        self.assertEqual(event.steals["Nagomi Mcdaniel"],
+                         StealDecision.CAUGHT)
+        self.assertNotIn("Someone Else", event.steals)
+
+    def test_steal_after_a_pitch(self):
+        event = classify_event(feed_event(
+            14, "Ball. 2-1 Nagomi Mcdaniel steals second base!"), None)
+        self.assertEqual(event.pitch_type, PitchType.BALL)
+        self.assertEqual(event.steals["Nagomi Mcdaniel"],
+                         StealDecision.STEAL)
+
+    def test_two_steals_on_one_line(self):
+        event = classify_event(feed_event(
+            4, "C. Runner steals second base! "
+               "Nagomi Mcdaniel gets caught stealing third base."), None)
+        self.assertEqual(event.steals["C. Runner"], StealDecision.STEAL)
+        self.assertEqual(event.steals["Nagomi Mcdaniel"],
+                         StealDecision.CAUGHT)
+
+    def test_flyout(self):
+        event = classify_event(feed_event(
+            7, "Batter hit a flyout to C. Fielder.\n"
+               "Runner tags up and scores!"), None)
+        self.assertEqual(event.pitch_type, PitchType.FLYOUT)
+        self.assertEqual(event.fielder_name, "C. Fielder")
+        self.assertEqual(event.scorers & {"Runner", "Batter"}, {"Runner"})
+
+    def test_ground_out_to_shell(self):
+        event = classify_event(feed_event(
+            8, "Batter hit a ground out to Fielder's Shell."), None)
+        self.assertEqual(event.pitch_type, PitchType.GROUND_OUT)
+        self.assertEqual(event.fielder_name, "Fielder")
+
+    def test_fielders_choice(self):
+        event = classify_event(feed_event(
+            8, "Runner out at second base.\n"
+               "Batter reaches on fielder's choice."),
+            {'basesOccupied': [2, 0]})
+        self.assertEqual(event.pitch_type, PitchType.FIELDERS_CHOICE)
+        self.assertEqual(event.base_reached, 0)
+        self.assertEqual(event.out_base_name, "second")
+
+    def test_fielders_choice_after_a_score(self):
+        event = classify_event(feed_event(
+            8, "Other Runner scores! Runner out at third base.\n"
+               "Batter reaches on fielder's choice."),
+            {'basesOccupied': [0]})
+        self.assertEqual(event.out_base_name, "third")
+        self.assertIn("Other Runner", event.scorers)
+        self.assertNotIn("Batter", event.scorers)
+
+    def test_hit(self):
+        event = classify_event(feed_event(
+            10, "Batter hits a Quadruple!\nRunner scores!"), None)
+        self.assertEqual(event.pitch_type, PitchType.HIT)
+        self.assertEqual(event.base_reached, 2)
+        self.assertIn("Runner", event.scorers)
+
+    def test_hit_scoring_on_one_line(self):
+        event = classify_event(feed_event(
+            10, "Batter hits a Double! Runner One scores! Runner Two scores!"),
+            None)
+        self.assertEqual(event.base_reached, 1)
+        self.assertTrue({"Runner One", "Runner Two"} <= event.scorers)
+        self.assertNotIn("Batter", event.scorers)
+
+    def test_tags_up_mid_line(self):
+        event = classify_event(feed_event(
+            7, "Batter hit a flyout to Fielder. Runner tags up and scores!"),
+            None)
+        self.assertIn("Runner", event.scorers)
+        self.assertNotIn("Batter", event.scorers)
+
+    def test_charmed_strikeout_is_not_a_pitch(self):
+        event = classify_event(feed_event(
+            6, "Pitcher charmed Batter!\nBatter strike out willingly."), None)
+        self.assertFalse(event.is_pitch)
+
+    def test_unknown_event_type(self):
+        with self.assertRaises(RuntimeError):
+            classify_event(feed_event(1000, ""), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
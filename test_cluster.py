@@ -0,0 +1,112 @@
+import unittest
+from unittest import mock
+
+import app
+from HashRing import HashRing
+
+SELF = 'http://127.0.0.1:9/'
+# Nothing listens on port 1, so connecting fails straight away
+UNREACHABLE = 'http://127.0.0.1:1/'
+TOKEN = 'between-nodes'
+
+
+def local_version(games, _):
+    return [{**game, 'generatedBy': 'self'} for game in games]
+
+
+class ClusterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+        patches = [
+            mock.patch.object(app, 'cluster_ring',
+                              HashRing([SELF, UNREACHABLE])),
+            mock.patch.object(app, 'cluster_self', SELF),
+            mock.patch.object(app, 'down_nodes', {}),
+            mock.patch.dict(app.app.config, {'CLUSTER_TOKEN': TOKEN,
+                                             'CLUSTER_TIMEOUT_SECONDS': 1}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def remote_game_ids(self, count):
+        game_ids = (f"game-{i}" for i in range(1000))
+        return [game_id for game_id in game_ids
+                if app.remote_owner(game_id) == UNREACHABLE][:count]
+
+
+class TestUnreachableOwner(ClusterTestCase):
+    def test_generates_here_and_stops_asking(self):
+        games = [{'id': game_id} for game_id in self.remote_game_ids(3)]
+        with mock.patch.object(app, 'transform_local_games',
+                               side_effect=local_version):
+            self.assertEqual(app.transform_games(games, None),
+                             local_version(games, None))
+        self.assertTrue(app.is_node_down(UNREACHABLE))
+
+        # The next time round it doesn't even try
+        with mock.patch.object(app, 'transform_local_games',
+                               side_effect=local_version) as local, \
+                mock.patch.object(app, 'forward_games') as forward:
+            self.assertEqual(app.transform_games(games, None),
+                             local_version(games, None))
+        forward.assert_not_called()
+        local.assert_called_once_with(games, None)
+
+
+class TestInternalTransform(ClusterTestCase):
+    def post(self, headers):
+        return self.client.post('/noel/internal/transform',
+                                json={'games': []}, headers=headers)
+
+    def test_needs_the_token(self):
+        self.assertEqual(self.post({}).status_code, 401)
+        self.assertEqual(self.post({'Authorization': "Bearer wrong"})
+                         .status_code, 401)
+        self.assertEqual(self.post(app.cluster_headers()).status_code, 200)
+
+    def test_hidden_without_a_cluster(self):
+        with mock.patch.object(app, 'cluster_ring', None), \
+                mock.patch.dict(app.app.config, {'CLUSTER_TOKEN': None}):
+            self.assertEqual(self.post({}).status_code, 404)
+            self.assertEqual(self.post({'Authorization': "Bearer None"})
+                             .status_code, 404)
+
+
+class TestAdminActions(ClusterTestCase):
+    def test_forwarded_to_the_owner(self):
+        game_ids = ['here'] + self.remote_game_ids(2)
+        resp = mock.Mock(**{'json.return_value': {'invalidated': [],
+                                                  'pid': 1}})
+        with mock.patch.object(app.cluster_session, 'post',
+                               return_value=resp) as post, \
+                mock.patch.object(app, 'remote_owner',
+                                  lambda game_id: None if game_id == 'here'
+                                  else UNREACHABLE):
+            nodes = app.forward_admin_action('invalidate', game_ids)
+
+        self.assertEqual(nodes, {UNREACHABLE: {'invalidated': [], 'pid': 1}})
+        post.assert_called_once_with(
+            UNREACHABLE + 'noel/internal/admin/invalidate',
+            json={'gameIds': game_ids[1:]}, headers=app.cluster_headers(),
+            timeout=1)
+
+    def test_unreachable_owner(self):
+        nodes = app.forward_admin_action('warm', self.remote_game_ids(1))
+        self.assertIn('error', nodes[UNREACHABLE])
+
+    def test_internal_route_needs_the_token(self):
+        def post(action, headers):
+            return self.client.post('/noel/internal/admin/' + action,
+                                    json={'gameIds': ['a']}, headers=headers)
+
+        self.assertEqual(post('invalidate', {}).status_code, 401)
+        self.assertEqual(post('explode', app.cluster_headers()).status_code,
+                         404)
+        resp = post('invalidate', app.cluster_headers())
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()['invalidated'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import tempfile
+import unittest
+from collections import Counter
+from unittest import mock
+
+from game_transformer import record_game
+from game_transformer.columnar import export_recordings, export_games, \
+    ColumnarRecordings
+from game_transformer.state import RecordedUniverse, use_universe
+from perf_budget import load_corpus, corpus_universe, corpus_prefetched
+
+
+def record_corpus():
+    recordings = []
+    for corpus_game in load_corpus():
+        with use_universe(corpus_universe(corpus_game)):
+            _, home_recorder, away_recorder = record_game(
+                corpus_game['gameId'], corpus_prefetched(corpus_game))
+        recordings.append((corpus_game['gameId'], home_recorder,
+                           away_recorder))
+    return recordings
+
+
+class TestColumnarRoundTrip(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.recordings = record_corpus()
+        path = tempfile.mkdtemp()
+        export_recordings(path, cls.recordings)
+        cls.columnar = ColumnarRecordings(path)
+
+    def recorded_pitches(self):
+        for game_id, *recorders in self.recordings:
+            for team, recorder in enumerate(recorders):
+                for pitch in recorder.pitches:
+                    yield game_id, team, pitch
+
+    def test_pitches(self):
+        c = self.columnar
+        read = [(c.games[game], team, c.players[batter], appearance,
+                 c.pitch_types[pitch_type],
+                 None if base_reached == -1 else base_reached)
+                for game, team, batter, appearance, pitch_type, base_reached
+                in zip(c['pitch_game'].tolist(), c['pitch_team'].tolist(),
+                       c['pitch_batter'].tolist(),
+                       c['pitch_appearance'].tolist(),
+                       c['pitch_type'].tolist(),
+                       c['pitch_base_reached'].tolist())]
+        self.assertEqual(read, [
+            (game_id, team, pitch.batter_id, pitch.appearance_count,
+             pitch.pitch_type, pitch.base_reached)
+            for game_id, team, pitch in self.recorded_pitches()])
+
+    def test_advancements(self):
+        c = self.columnar
+        read = [(pitch, c.players[runner], bases)
+                for pitch, runner, bases
+                in zip(c['advancement_pitch'].tolist(),
+                       c['advancement_runner'].tolist(),
+                       c['advancement_bases'].tolist())]
+        recorded = [(pitch_row, runner_id, bases)
+                    for pitch_row, (_, _, pitch)
+                    in enumerate(self.recorded_pitches())
+                    for runner_id, bases in pitch.advancements.items()]
+        self.assertTrue(recorded)
+        self.assertEqual(read, recorded)
+
+    def test_steal_decisions(self):
+        c = self.columnar
+        read = Counter(
+            (c.games[game], team, c.players[runner], appearance, sequence,
+             c.steal_decisions[decision])
+            for game, team, runner, appearance, sequence, decision
+            in zip(c['steal_game'].tolist(), c['steal_team'].tolist(),
+                   c['steal_runner'].tolist(),
+                   c['steal_appearance'].tolist(),
+                   c['steal_sequence'].tolist(),
+                   c['steal_decision'].tolist()))
+        recorded = Counter(
+            (game_id, team, runner_id, appearance, sequence, decision)
+            for game_id, *recorders in self.recordings
+            for team, recorder in enumerate(recorders)
+            for (runner_id, appearance), decisions
+            in recorder.steal_decisions.items()
+            for sequence, decision in enumerate(decisions))
+        self.assertTrue(recorded)
+        self.assertEqual(read, recorded)
+
+    def test_pitch_type_counts(self):
+        c = self.columnar
+        counts = c.pitch_type_counts()
+        recorded = Counter((pitch.batter_id, pitch.pitch_type)
+                           for _, _, pitch in self.recorded_pitches())
+        for (batter_id, pitch_type), count in recorded.items():
+            self.assertEqual(counts[c.player_indices[batter_id],
+                                    c.pitch_types.index(pitch_type)], count)
+        self.assertEqual(counts.sum(), sum(recorded.values()))
+
+
+class TestExportGames(unittest.TestCase):
+    def test_prefetches_in_batches(self):
+        corpus = {corpus_game['gameId']: corpus_game
+                  for corpus_game in load_corpus()}
+        game_ids = list(corpus)
+        teams = {}
+        for corpus_game in corpus.values():
+            teams.update(corpus_universe(corpus_game).teams)
+
+        batches = []
+
+        def prefetch_games(batch):
+            batches.append(list(batch))
+            return {game_id: corpus_prefetched(corpus[game_id])
+                    for game_id in batch}
+
+        path = tempfile.mkdtemp()
+        with use_universe(RecordedUniverse(teams, {})), \
+                mock.patch('game_transformer.prefetch_games',
+                           prefetch_games):
+            export_games(path, game_ids, batch_size=1)
+
+        self.assertEqual(batches, [[game_id] for game_id in game_ids])
+        self.assertEqual(ColumnarRecordings(path).games, game_ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+from GameCache import GameCache, NegativeCache, approximate_size
+
+
+class TestGameCache(unittest.TestCase):
+    def test_shared_objects_counted_once(self):
+        shared = "x" * 1000
+        self.assertLess(approximate_size([shared, shared]),
+                        approximate_size([shared, "y" * 1000]))
+
+    def test_evicts_least_recently_used(self):
+        game = ["x" * 1000]
+        cache = GameCache(max_bytes=approximate_size(game) * 2 + 100)
+        cache.put('a', ["a" * 1000])
+        cache.put('b', ["b" * 1000])
+        cache.get('a')  # b is now least recently used
+        cache.put('c', ["c" * 1000])
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(cache.evictions, 1)
+        self.assertLessEqual(cache.size, cache.max_bytes)
+
+    def test_keeps_oversized_entry(self):
+        cache = GameCache(max_bytes=10)
+        cache.put('a', ["a" * 1000])
+        cache.put('b', ["b" * 1000])
+
+        self.assertNotIn('a', cache)
+        self.assertIn('b', cache)
+        self.assertEqual(cache.size, approximate_size(["b" * 1000]))
+
+    def test_get_or_generate(self):
+        cache = GameCache(max_bytes=1_000_000)
+        calls = []
+
+        def generate(game_id):
+            calls.append(game_id)
+            return [game_id]
+
+        self.assertEqual(cache.get_or_generate('a', generate), ['a'])
+        self.assertEqual(cache.get_or_generate('a', generate), ['a'])
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_entries(self):
+        cache = GameCache(max_bytes=1_000_000)
+        cache.get_or_generate('a', lambda game_id: [game_id])
+        cache.put('b', ['b'])
+
+        entries = cache.entries()
+        self.assertEqual([e['gameId'] for e in entries], ['a', 'b'])
+        self.assertIsNotNone(entries[0]['buildSeconds'])
+        self.assertIsNone(entries[1]['buildSeconds'])
+
+        self.assertTrue(cache.invalidate('a'))
+        self.assertFalse(cache.invalidate('a'))
+        self.assertEqual(cache.size, entries[1]['size'])
+
+
+class TestNegativeCache(unittest.TestCase):
+    def test_backoff(self):
+        failures = NegativeCache(base_seconds=60, max_seconds=100)
+        self.assertFalse(failures.should_skip('a'))
+
+        failures.record_failure('a', RuntimeError("Who is batting?"))
+        self.assertTrue(failures.should_skip('a'))
+        first_retry = failures.failures()['a'].retry_at
+
+        failures.record_failure('a', RuntimeError("Who is batting?"))
+        failure = failures.failures()['a']
+        self.assertEqual(failure.count, 2)
+        # Doubled, but capped at the max
+        self.assertAlmostEqual(failure.retry_at - first_retry, 40, delta=1)
+
+        failures.clear('a')
+        self.assertFalse(failures.should_skip('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
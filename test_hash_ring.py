@@ -0,0 +1,36 @@
+import unittest
+from collections import Counter
+
+from HashRing import HashRing
+
+GAME_IDS = [f"game-{i}" for i in range(2000)]
+
+
+class TestHashRing(unittest.TestCase):
+    def test_same_owner_in_every_ring(self):
+        nodes = ['http://a/', 'http://b/', 'http://c/']
+        ring = HashRing(nodes)
+        other_ring = HashRing(list(reversed(nodes)))
+        for game_id in GAME_IDS:
+            self.assertEqual(ring.owner(game_id), other_ring.owner(game_id))
+
+    def test_spreads_games(self):
+        ring = HashRing(['http://a/', 'http://b/', 'http://c/'])
+        counts = Counter(ring.owner(game_id) for game_id in GAME_IDS)
+        self.assertEqual(len(counts), 3)
+        for count in counts.values():
+            self.assertGreater(count, len(GAME_IDS) / 3 * 0.7)
+
+    def test_adding_a_node_only_moves_games_to_it(self):
+        ring = HashRing(['http://a/', 'http://b/', 'http://c/'])
+        bigger_ring = HashRing(['http://a/', 'http://b/', 'http://c/',
+                                'http://d/'])
+        moved = [game_id for game_id in GAME_IDS
+                 if ring.owner(game_id) != bigger_ring.owner(game_id)]
+        for game_id in moved:
+            self.assertEqual(bigger_ring.owner(game_id), 'http://d/')
+        self.assertLess(len(moved), len(GAME_IDS) / 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+
+from game_transformer.GameRecorder import GameRecorder
+from game_transformer.classifier import ClassifiedEvent, StealDecision
+from game_transformer.state import PlayerState, RecordedUniverse, \
+    TeamSnapshot
+
+START = '2021-03-01T00:00:00Z'
+CHANGE = '2021-03-01T00:10:00Z'
+# Lineup changes are loaded from 3 minutes after the event that caused them
+LOADED_AT = '2021-03-01T00:13:00+00:00'
+
+
+def player(n):
+    return PlayerState(id=f'player-{n}', name=f'Player {n}')
+
+
+def make_recorder(lineup, players=None, teams=None):
+    universe = RecordedUniverse(
+        {('team', START): TeamSnapshot('team', 'Teams', lineup),
+         **(teams or {})},
+        players or {})
+    updates = [{'timestamp': START,
+                'data': {'playCount': 1, 'homeTeam': 'team',
+                         'homePitcher': 'pitcher',
+                         'homePitcherName': 'Pitcher'}}]
+    return GameRecorder(updates, 'home', universe)
+
+
+def feed_event(player_tags=()):
+    return {'created': CHANGE, 'playerTags': list(player_tags)}
+
+
+def steal_event(steals):
+    return ClassifiedEvent(type=4, description='', player_tags=[],
+                           steals=steals)
+
+
+class TestLineupIndex(unittest.TestCase):
+    def assertIndexed(self, team, missing=()):
+        # Every lookup agrees with the lineup, and nobody who left is found
+        for index, p in enumerate(team.lineup):
+            self.assertEqual(team.lineup_index_by_id(p.id), index)
+            self.assertEqual(team.lineup_index_by_name(p.name), index)
+            self.assertIs(team.lineup_player_by_id(p.id), p)
+        for p in missing:
+            self.assertIsNone(team.lineup_index_by_id(p.id))
+            self.assertIsNone(team.lineup_index_by_name(p.name))
+            self.assertIsNone(team.lineup_player_by_id(p.id))
+
+    def test_initial_lineup(self):
+        recorder = make_recorder([player(1), player(2), player(3)])
+        self.assertIndexed(recorder.team, missing=[player(4)])
+
+    def test_reload_lineup(self):
+        lineup = [player(3), player(4), player(1)]
+        recorder = make_recorder(
+            [player(1), player(2), player(3)],
+            teams={('team', LOADED_AT): TeamSnapshot('team', 'Teams',
+                                                     lineup)})
+        recorder.reload_lineup(feed_event())
+        self.assertEqual(recorder.team.lineup, lineup)
+        self.assertIndexed(recorder.team, missing=[player(2)])
+
+    def test_replace_player_both_orders(self):
+        # Feedback tags the two players in either order
+        for tags in [('player-2', 'player-4'), ('player-4', 'player-2')]:
+            with self.subTest(tags=tags):
+                recorder = make_recorder(
+                    [player(1), player(2), player(3)],
+                    players={('player-4', LOADED_AT): player(4)})
+                recorder.replace_player(feed_event(tags))
+                self.assertEqual(recorder.team.lineup,
+                                 [player(1), player(4), player(3)])
+                self.assertIndexed(recorder.team, missing=[player(2)])
+                self.assertEqual(recorder.replacement_map, {'Player 4': 1})
+
+    def test_replace_pitcher_leaves_lineup(self):
+        recorder = make_recorder(
+            [player(1), player(2)],
+            players={('player-5', LOADED_AT): player(5)})
+        recorder.replace_player(feed_event(['pitcher', 'player-5']))
+        self.assertEqual(recorder.team.pitcher, player(5))
+        self.assertIndexed(recorder.team, missing=[player(5)])
+
+    def test_duplicate_names_find_first(self):
+        twin = PlayerState(id='player-twin', name='Player 1')
+        recorder = make_recorder([player(1), twin])
+        self.assertEqual(recorder.team.lineup_index_by_name('Player 1'), 0)
+        self.assertEqual(recorder.team.lineup_index_by_id('player-twin'), 1)
+
+    def test_steal_decisions_follow_replacement(self):
+        recorder = make_recorder(
+            [player(1), player(2)],
+            players={('player-4', LOADED_AT): player(4)})
+        for runner_id in ['player-2', 'ghost']:
+            recorder.active_steal_decisions[runner_id] = []
+
+        event = steal_event({'Player 2': StealDecision.STEAL})
+        recorder._record_steal_decision(event, 'player-2')
+        recorder._record_steal_decision(event, 'ghost')
+
+        recorder.replace_player(feed_event(['player-4', 'player-2']))
+        recorder.active_steal_decisions['player-4'] = []
+        # The old player's name means nothing now
+        recorder._record_steal_decision(event, 'player-4')
+        recorder._record_steal_decision(
+            steal_event({'Player 4': StealDecision.CAUGHT}), 'player-4')
+
+        self.assertEqual(recorder.active_steal_decisions, {
+            'player-2': [StealDecision.STEAL],
+            'ghost': [],
+            'player-4': [StealDecision.STAY, StealDecision.CAUGHT],
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import threading
+import tracemalloc
+import unittest
+from datetime import datetime, timezone
+
+from GameCache import approximate_size
+from MemoryAccounting import MemoryAccounting, measure_updates
+from game_transformer import StampedUpdate, memory
+
+START = datetime(2021, 3, 1, tzinfo=timezone.utc)
+
+
+def make_updates():
+    shared = "Shared Team Name" * 10
+    return [StampedUpdate(START, {'awayTeamName': shared,
+                                  'lastUpdate': f"Update {i}" * 20,
+                                  'playCount': i})
+            for i in range(10)]
+
+
+class TestMeasureUpdates(unittest.TestCase):
+    def test_fields_add_up_to_retained(self):
+        updates = make_updates()
+        measured = measure_updates(updates)
+        self.assertEqual(measured.updates, 10)
+        self.assertEqual(measured.retained_bytes,
+                         measured.overhead_bytes +
+                         sum(measured.field_bytes.values()))
+        # Same as the cache thinks it is
+        self.assertEqual(measured.retained_bytes, approximate_size(updates))
+
+    def test_shared_values_counted_once(self):
+        measured = measure_updates(make_updates())
+        self.assertGreater(measured.field_bytes['lastUpdate'],
+                           measured.field_bytes['awayTeamName'])
+
+
+class TestMeasurePhase(unittest.TestCase):
+    def tearDown(self):
+        memory.use_memory_sink(None)
+
+    def test_records_peaks_per_phase(self):
+        accounting = MemoryAccounting()
+        memory.use_memory_sink(accounting.record_phase)
+        with memory.measure_phase('game', 'iteration'):
+            garbage = [bytes(1000) for _ in range(1000)]
+            del garbage
+        accounting.record_retained('game', make_updates())
+
+        game = accounting.get('game')
+        self.assertGreater(game.peak_bytes['iteration'], 1000 * 1000)
+        self.assertIn('iteration', game.seconds)
+        self.assertEqual(game.updates, 10)
+
+    def test_does_nothing_when_off(self):
+        with memory.measure_phase('game', 'iteration'):
+            pass
+
+    def test_phases_dont_wait_for_each_other(self):
+        accounting = MemoryAccounting()
+        memory.use_memory_sink(accounting.record_phase)
+        started = threading.Event()
+        finished = threading.Event()
+
+        def slow_phase():
+            with memory.measure_phase('slow', 'producer'):
+                started.set()
+                finished.wait(5)
+
+        thread = threading.Thread(target=slow_phase)
+        thread.start()
+        try:
+            started.wait(5)
+            with memory.measure_phase('fast', 'producer'):
+                pass
+            self.assertIn('producer', accounting.get('fast').seconds)
+        finally:
+            finished.set()
+            thread.join()
+        self.assertIn('producer', accounting.get('slow').seconds)
+
+    def test_stops_tracing_when_turned_off(self):
+        if tracemalloc.is_tracing():
+            self.skipTest("Something else is tracing")
+        memory.use_memory_sink(MemoryAccounting().record_phase)
+        self.assertTrue(tracemalloc.is_tracing())
+        memory.use_memory_sink(None)
+        self.assertFalse(tracemalloc.is_tracing())
+
+
+if __name__ == '__main__':
+    unittest.main()
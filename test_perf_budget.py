@@ -0,0 +1,35 @@
+import json
+import os
+import unittest
+
+from perf_budget import CORPUS_DIR, BASELINES_PATH, DEFAULT_BUDGET, \
+    measure_corpus, check_budget, format_measurements
+
+
+@unittest.skipUnless(os.path.isdir(CORPUS_DIR) and
+                     os.path.exists(BASELINES_PATH),
+                     "Record a corpus and baselines with perf_budget.py")
+class TestPerfBudget(unittest.TestCase):
+    # Only memory, unless NOEL_PERF_CHECK is set. Timings depend too much on
+    # what else the machine is doing to fail a test run over. Run
+    # "python perf_budget.py check" to check them.
+    def test_within_budget(self):
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)
+
+        measurements = measure_corpus(
+            timing=bool(os.environ.get('NOEL_PERF_CHECK')))
+        failures = check_budget(
+            measurements, baselines['games'],
+            {**DEFAULT_BUDGET, **baselines.get('budget', {})})
+        self.assertEqual(failures, [], format_measurements(measurements))
+
+    def test_memory_only_without_timing(self):
+        for stages in measure_corpus(timing=False).values():
+            for metrics in stages.values():
+                self.assertEqual(set(metrics),
+                                 {'peakBytes', 'retainedBlocks'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from unittest import mock
+
+from game_transformer import fetch_game_updates, fetch_feed_events, \
+    fetch_game_updates_batch, fetch_feed_events_batch
+
+GAMES = ['game-a', 'game-b', 'game-c']
+
+
+def make_updates():
+    # Interleaved the way Chronicler returns several games at once, with two
+    # updates for one of the plays
+    updates = []
+    for play_count in range(4):
+        for game_id in GAMES:
+            updates.append({'gameId': game_id,
+                            'data': {'playCount': play_count,
+                                     'lastUpdate': f"{game_id} {play_count}"}})
+    updates.append({'gameId': 'game-b',
+                    'data': {'playCount': 2, 'lastUpdate': ''}})
+    return updates
+
+
+def make_events():
+    # Sorted by play across all the games, but not by subplay, like Eventually
+    # returns them. One event is tagged with two games.
+    events = []
+    for play in range(3):
+        for game_id in GAMES:
+            for sub_play in [2, 0, 1]:
+                events.append({'gameTags': [game_id],
+                               'description': f"{game_id} {play}.{sub_play}",
+                               'metadata': {'play': play,
+                                            'subPlay': sub_play}})
+    events.append({'gameTags': ['game-a', 'game-c'],
+                   'description': "Both games",
+                   'metadata': {'play': 3, 'subPlay': 0}})
+    return events
+
+
+def fake_get_game_updates(game_ids, cache_time):
+    if isinstance(game_ids, str):
+        game_ids = [game_ids]
+    return [update for update in make_updates()
+            if update['gameId'] in game_ids]
+
+
+def fake_search(cache_time, limit, query, **kwargs):
+    game_ids = query['gameTags'].split('_or_')
+    return [event for event in make_events()
+            if any(game_id in game_ids for game_id in event['gameTags'])]
+
+
+@mock.patch('game_transformer.get_game_updates', fake_get_game_updates)
+@mock.patch('game_transformer.eventually.search', fake_search)
+class TestPrefetch(unittest.TestCase):
+    def test_game_updates_split_by_game(self):
+        batch = fetch_game_updates_batch(GAMES)
+        self.assertEqual(set(batch), set(GAMES))
+        for game_id in GAMES:
+            self.assertEqual(dict(batch[game_id]),
+                             dict(fetch_game_updates(game_id)))
+            for play_count, updates in batch[game_id].items():
+                for update in updates:
+                    self.assertEqual(update['gameId'], game_id)
+                    self.assertEqual(update['data']['playCount'], play_count)
+        self.assertEqual(len(batch['game-b'][2]), 2)
+
+    def test_feed_events_split_by_game(self):
+        batch = fetch_feed_events_batch(GAMES)
+        self.assertEqual(set(batch), set(GAMES))
+        for game_id in GAMES:
+            self.assertEqual(batch[game_id],
+                             list(fetch_feed_events(game_id)))
+
+    def test_subplays_sorted(self):
+        batch = fetch_feed_events_batch(GAMES)
+        self.assertEqual(
+            [e['description'] for e in batch['game-b']],
+            [f"game-b {play}.{sub_play}"
+             for play in range(3) for sub_play in range(3)])
+        self.assertEqual(batch['game-a'][-1]['description'], "Both games")
+        self.assertEqual(batch['game-c'][-1]['description'], "Both games")
+
+    def test_unrequested_games_left_out(self):
+        batch = fetch_feed_events_batch(['game-a'])
+        self.assertEqual(list(batch), ['game-a'])
+        self.assertTrue(all('game-a' in e['gameTags']
+                            for e in batch['game-a']))
+
+
+if __name__ == '__main__':
+    unittest.main()
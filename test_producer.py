@@ -0,0 +1,81 @@
+import unittest
+
+from game_transformer import record_game
+from game_transformer.GameProducer import GameProducer, CHECKPOINT_INTERVAL
+from game_transformer.state import use_universe
+from perf_budget import load_corpus, corpus_universe, corpus_prefetched
+
+
+class TestSeek(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus_game = load_corpus()[0]
+        cls.updates = list(cls.producer())
+
+    @classmethod
+    def producer(cls, checkpoint_interval=CHECKPOINT_INTERVAL):
+        with use_universe(corpus_universe(cls.corpus_game)):
+            return GameProducer(*record_game(
+                cls.corpus_game['gameId'],
+                corpus_prefetched(cls.corpus_game)),
+                checkpoint_interval=checkpoint_interval)
+
+    def finished_producer(self):
+        producer = self.producer()
+        list(producer)
+        return producer
+
+    def replayed(self, play_count):
+        # What seeking should find, by producing everything from the start
+        return next((update for update in self.updates
+                     if update['playCount'] >= play_count), None)
+
+    def play_counts(self, producer):
+        last = self.updates[-1]['playCount']
+        boundaries = [c.play_count for c in producer.checkpoints]
+        return sorted({0, 1, 2, 3, 40, last - 1, last, last + 5,
+                       *boundaries, *(b + 1 for b in boundaries)})
+
+    def test_seek_matches_replaying(self):
+        # From a producer that's been through the whole game, so it has every
+        # checkpoint
+        play_counts = self.play_counts(self.finished_producer())
+        for play_count in play_counts:
+            producer = self.finished_producer()
+            self.assertEqual(producer.seek(play_count),
+                             self.replayed(play_count), play_count)
+
+    def test_seek_back_and_forth(self):
+        producer = self.finished_producer()
+        play_counts = self.play_counts(producer)
+        for play_count in play_counts + play_counts[::-1]:
+            self.assertEqual(producer.seek(play_count),
+                             self.replayed(play_count), play_count)
+
+    def test_carries_on_after_seeking(self):
+        producer = self.finished_producer()
+        play_count = producer.checkpoints[2].play_count
+        first = producer.seek(play_count)
+        rest = [first] + list(producer)
+        self.assertEqual(rest, [update for update in self.updates
+                                if update['playCount'] >= play_count])
+
+    def test_no_checkpoints_by_default(self):
+        with use_universe(corpus_universe(self.corpus_game)):
+            producer = GameProducer(*record_game(
+                self.corpus_game['gameId'],
+                corpus_prefetched(self.corpus_game)))
+        self.assertEqual(list(producer), self.updates)
+        self.assertEqual([c.play_count for c in producer.checkpoints], [0])
+
+    def test_fresh_producer(self):
+        for play_count in [0, 1, 30]:
+            self.assertEqual(self.producer().seek(play_count),
+                             self.replayed(play_count))
+        self.assertEqual(
+            self.producer(checkpoint_interval=None).seek(30),
+            self.replayed(30))
+
+
+if __name__ == '__main__':
+    unittest.main()
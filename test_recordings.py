@@ -0,0 +1,112 @@
+import tempfile
+import threading
+import unittest
+
+from game_transformer import generate_game, recordings
+from game_transformer.recordings import condense_updates, RecordingCache, \
+    RECORDING_VERSION, use_recording_cache
+from game_transformer.state import RecordedUniverse, first_truthy, \
+    use_universe
+from perf_budget import load_corpus, corpus_universe, corpus_prefetched
+
+
+def update(timestamp, **data):
+    return {'timestamp': timestamp, 'data': data}
+
+
+class TestCondenseUpdates(unittest.TestCase):
+    def test_keeps_what_the_producer_reads(self):
+        updates = [
+            update('t0', playCount=0, homeOdds=0, isPostseason=False, x=''),
+            update('t1', playCount=1, homeOdds=0.5, isPostseason=True, x=''),
+            update('t2', playCount=2, homeOdds=0.7, isPostseason=True, x='x'),
+        ]
+        condensed = condense_updates(updates)
+
+        self.assertEqual(condensed[0], updates[0])
+        self.assertEqual(condensed[1]['timestamp'], 't1')
+        for key in ['homeOdds', 'isPostseason', 'x']:
+            self.assertEqual(first_truthy(condensed, key),
+                             first_truthy(updates, key))
+
+
+class TestRecordingCache(unittest.TestCase):
+    def test_ignores_other_versions(self):
+        cache = RecordingCache(tempfile.mkdtemp())
+        self.assertIsNone(cache.get('game'))
+
+        cache.put('game', {'version': RECORDING_VERSION, 'gameId': 'game'})
+        self.assertEqual(cache.get('game')['gameId'], 'game')
+
+        cache.put('game', {'version': RECORDING_VERSION - 1})
+        self.assertIsNone(cache.get('game'))
+
+        cache.invalidate('game')
+        self.assertIsNone(cache.get('game'))
+
+
+class BarrierUniverse(RecordedUniverse):
+    # Holds up the first team load until every game has got that far, so the
+    # games are definitely being recorded at the same time
+    def __init__(self, universe: RecordedUniverse, barrier):
+        super().__init__(universe.teams, universe.players)
+        self.barrier = barrier
+
+    def load_team(self, team_id, timestamp):
+        if self.barrier is not None:
+            self.barrier.wait(5)
+            self.barrier = None
+        return super().load_team(team_id, timestamp)
+
+
+class TestConcurrentRecording(unittest.TestCase):
+    def setUp(self):
+        self.corpus = load_corpus()
+        cache = recordings.recording_cache
+        self.addCleanup(setattr, recordings, 'recording_cache', cache)
+
+    def generate(self, corpus_game, barrier=None):
+        universe = BarrierUniverse(corpus_universe(corpus_game), barrier)
+        with use_universe(universe):
+            return generate_game(corpus_game['gameId'],
+                                 corpus_prefetched(corpus_game))
+
+    def test_games_on_other_threads_use_their_own_universe(self):
+        use_recording_cache(None)
+        expected = {corpus_game['gameId']: self.generate(corpus_game)
+                    for corpus_game in self.corpus}
+
+        use_recording_cache(tempfile.mkdtemp())
+        barrier = threading.Barrier(len(self.corpus))
+        results, errors = {}, []
+
+        def run(corpus_game):
+            try:
+                results[corpus_game['gameId']] = \
+                    self.generate(corpus_game, barrier)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(corpus_game,))
+                   for corpus_game in self.corpus]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(results, expected)
+        for corpus_game in self.corpus:
+            # Each recording only has the teams its own game loaded
+            recording = recordings.recording_cache.get(corpus_game['gameId'])
+            self.assertEqual(
+                {(team_id, timestamp)
+                 for team_id, timestamp, _ in recording['teams']},
+                set(corpus_universe(corpus_game).teams))
+            # And replays without needing the universe it was recorded in
+            self.assertEqual(generate_game(corpus_game['gameId']),
+                             expected[corpus_game['gameId']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import app
+from GameCache import GameCache
+from game_transformer import StampedUpdate
+from game_transformer.archive import dumps_game, GameArchive
+from game_transformer.store import write_game_store, GameStore
+
+START = datetime(2021, 3, 1, 16, tzinfo=timezone.utc)
+
+
+def make_updates(game_id, num_updates=40, start=START):
+    # An update every 5 seconds, with a gap where play ball skips a play
+    return [StampedUpdate(start + timedelta(seconds=5 * i), {
+        'id': game_id, 'season': 11, 'day': 3,
+        'playCount': i if i < 2 else i + 1,
+        'lastUpdate': f"Update {i}",
+        'finalized': i == num_updates - 1,
+    }) for i in range(num_updates)]
+
+
+class TestUpdateAtTime(unittest.TestCase):
+    def setUp(self):
+        self.updates = make_updates('game')
+        self.archive = GameArchive(dumps_game(self.updates))
+
+    def assert_update_at(self, at, index):
+        for game_updates in [self.updates, self.archive]:
+            self.assertEqual(app.update_at_time(game_updates, at),
+                             self.updates[index], (at, type(game_updates)))
+
+    def test_exactly_at_an_update(self):
+        for index in [0, 1, 2, 17, 39]:
+            self.assert_update_at(self.updates[index].timestamp, index)
+
+    def test_between_updates(self):
+        for index in [0, 1, 2, 17, 38]:
+            self.assert_update_at(
+                self.updates[index].timestamp + timedelta(seconds=2.5), index)
+            self.assert_update_at(
+                self.updates[index + 1].timestamp -
+                timedelta(microseconds=1), index)
+
+    def test_before_and_after_the_game(self):
+        self.assert_update_at(START - timedelta(hours=1), 0)
+        self.assert_update_at(START + timedelta(hours=1), 39)
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.cached = make_updates('cached')
+        self.stored = make_updates('stored', start=START +
+                                   timedelta(seconds=1))
+        store_path = os.path.join(tempfile.mkdtemp(), 'games.store')
+        write_game_store(store_path, [('stored', self.stored, None)])
+
+        game_cache = GameCache(10 ** 8)
+        game_cache.put('cached', self.cached)
+        patches = [
+            mock.patch.object(app, 'game_cache', game_cache),
+            mock.patch.object(app, 'game_store', GameStore(store_path)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = app.app.test_client()
+
+    def replay(self, **args):
+        return self.client.get('/noel/replay', query_string=args)
+
+    def test_serves_every_local_game_at_the_time(self):
+        at = START + timedelta(seconds=5 * 10 + 3)
+        resp = self.replay(season=11, day=3, at=at.isoformat())
+        self.assertEqual(resp.status_code, 200)
+        schedule = resp.get_json()['games']['schedule']
+        self.assertEqual(
+            sorted((game['id'], game['playCount']) for game in schedule),
+            [('cached', 11), ('stored', 11)])
+
+    def test_naive_times_are_utc(self):
+        at = START.replace(tzinfo=None) + timedelta(seconds=5 * 3)
+        schedule = self.replay(season=11, day=3, at=at.isoformat()) \
+            .get_json()['games']['schedule']
+        self.assertEqual(
+            sorted((game['id'], game['playCount']) for game in schedule),
+            [('cached', 4), ('stored', 3)])
+
+    def test_other_days_are_empty(self):
+        schedule = self.replay(season=11, day=4, at=START.isoformat()) \
+            .get_json()['games']['schedule']
+        self.assertEqual(schedule, [])
+
+    def test_needs_season_day_and_at(self):
+        self.assertEqual(self.replay(season=11, day=3).status_code, 400)
+        self.assertEqual(self.replay(season=11, day=3, at="noon")
+                         .status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import threading
+import unittest
+from unittest import mock
+
+from GameScheduler import GameScheduler
+
+SEASON, DAY = 11, 3
+
+
+def scheduled_game(game_id, finalized=True):
+    return {'id': game_id, 'season': SEASON, 'day': DAY,
+            'finalized': finalized}
+
+
+class FakeChronicler:
+    # Finished games by (1-indexed season, 1-indexed day)
+    def __init__(self, finished):
+        self.finished = finished
+        self.calls = []
+        self.polled = threading.Event()
+
+    def get_games(self, season, day, finished):
+        assert finished
+        self.calls.append((season, day))
+        if len(self.calls) >= 2:
+            self.polled.set()
+        return [{'gameId': game_id}
+                for game_id in self.finished.get((season, day), [])]
+
+
+class TestGameScheduler(unittest.TestCase):
+    def setUp(self):
+        self.chronicler = FakeChronicler({
+            (SEASON + 1, DAY + 1): ['a', 'd', 'ready'],
+            (SEASON + 1, DAY + 2): ['e'],
+        })
+        patch = mock.patch('GameScheduler.chronicler', self.chronicler)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        self.generated = []
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.next_day_generated = threading.Event()
+
+    def generate(self, game_id):
+        # Holds up the first game so everything else queues behind it
+        self.release.wait(5)
+        self.generated.append(game_id)
+        if game_id == 'e':
+            self.next_day_generated.set()
+        return None if game_id == 'd' else [game_id]
+
+    def test_generates_current_day_first(self):
+        scheduler = GameScheduler(self.generate,
+                                  lambda game_id: game_id == 'ready',
+                                  num_workers=1, poll_interval=60)
+        scheduler.observe_schedule([
+            scheduled_game('a'),
+            scheduled_game('b', finalized=False),
+            scheduled_game('ready'),
+        ])
+        self.assertEqual(scheduler.current_day, (SEASON, DAY))
+
+        self.assertTrue(self.chronicler.polled.wait(5))
+        self.release.set()
+        self.assertTrue(self.next_day_generated.wait(5))
+        scheduler._queue.join()
+
+        self.assertEqual(self.chronicler.calls[:2],
+                         [(SEASON + 1, DAY + 1), (SEASON + 1, DAY + 2)])
+        self.assertEqual(self.generated, ['a', 'd', 'e'])
+        stats = scheduler.stats()
+        self.assertEqual((stats['generated'], stats['failed'],
+                          stats['queued']), (2, 1, 0))
+
+    def test_enqueues_each_game_once(self):
+        scheduler = GameScheduler(self.generate, lambda game_id: False,
+                                  num_workers=0, poll_interval=60)
+        for _ in range(3):
+            scheduler.enqueue('a', 0)
+        scheduler.enqueue('b', 1)
+        self.assertEqual(scheduler.stats()['queued'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+from SeasonStats import SeasonStats
+from game_transformer import StampedUpdate
+from game_transformer.stats import GameStats, summarize_game
+from game_transformer.store import write_game_store, GameStore
+
+
+def final_game(game_id, day, home_score, away_score, season=11):
+    return {'id': game_id, 'season': season, 'day': day,
+            'homeTeam': 'crabs', 'awayTeam': 'tigers',
+            'homeScore': home_score, 'awayScore': away_score}
+
+
+class TestSeasonStats(unittest.TestCase):
+    def test_standings_deltas(self):
+        stats = SeasonStats()
+        standings = {'id': 's', 'wins': {'crabs': 3, 'tigers': 1},
+                     'losses': {'crabs': 1, 'tigers': 3}}
+
+        # Tigers won in Blaseball, Crabs won in Noel
+        stats.record_result(final_game('a', 2, 1, 5), final_game('a', 2, 6, 5))
+        # Same winner in both
+        stats.record_result(final_game('b', 3, 4, 2), final_game('b', 3, 3, 2))
+
+        # Day 2 hasn't been played yet
+        self.assertEqual(stats.apply_to_standings(standings, 11, 2, []),
+                         standings)
+        # Day 2 has been played
+        self.assertEqual(stats.apply_to_standings(standings, 11, 2, ['a']), {
+            'id': 's', 'wins': {'crabs': 4, 'tigers': 0},
+            'losses': {'crabs': 0, 'tigers': 4}})
+        self.assertEqual(stats.apply_to_standings(standings, 11, 4, [])['wins'],
+                         {'crabs': 4, 'tigers': 0})
+
+        # Regenerating the game replaces its result
+        stats.record_result(final_game('a', 2, 1, 5), final_game('a', 2, 1, 5))
+        self.assertEqual(stats.apply_to_standings(standings, 11, 4, []),
+                         standings)
+
+    def test_player_totals(self):
+        stats = SeasonStats()
+        game = GameStats()
+        game.batter('chorby').hits = 2
+        game.pitcher('ed').outs = 27
+
+        stats.record_game_stats(final_game('a', 2, 1, 0), game)
+        stats.record_game_stats(final_game('b', 3, 1, 0), game)
+        # Regenerated
+        stats.record_game_stats(final_game('b', 3, 1, 0), game)
+
+        summary = stats.season_summary(11)
+        self.assertEqual(summary['batting']['chorby']['hits'], 4)
+        self.assertEqual(summary['pitching']['ed']['outs'], 54)
+
+
+class TestStoredResults(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'games.store')
+
+        start = datetime(2021, 3, 1, tzinfo=timezone.utc)
+        self.stats = GameStats()
+        self.stats.batter('chorby').hits = 2
+        games = []
+        self.real_games = []
+        for day, game_id in enumerate(['a', 'b', 'c']):
+            real = {**final_game(game_id, day, 1, 5), 'playCount': 100,
+                    'finalized': True}
+            noel = {**final_game(game_id, day, 6, 5), 'playCount': 80,
+                    'finalized': True}
+            games.append((game_id, [StampedUpdate(start, noel)],
+                          summarize_game(real, noel, self.stats)))
+            self.real_games.append(real)
+        write_game_store(self.path, games)
+
+    def worker(self):
+        # What each worker does when it starts
+        season_stats = SeasonStats()
+        for game_id, summary in GameStore(self.path).summaries():
+            season_stats.record_summary(game_id, summary)
+        return season_stats
+
+    def test_workers_agree(self):
+        first, second = self.worker(), self.worker()
+        # Only the second one has served game b to a client
+        real_b = self.real_games[1]
+        noel_b = GameStore(self.path).archive('b')[-1].data
+        second.record_result(real_b, noel_b)
+        second.record_game_stats(noel_b, self.stats)
+
+        standings = {'wins': {'crabs': 0, 'tigers': 3},
+                     'losses': {'crabs': 3, 'tigers': 0}}
+        for day in range(4):
+            self.assertEqual(
+                first.apply_to_standings(standings, 11, day, []),
+                second.apply_to_standings(standings, 11, day, []))
+        self.assertEqual(first.apply_to_standings(standings, 11, 3, []),
+                         {'wins': {'crabs': 3, 'tigers': 0},
+                          'losses': {'crabs': 0, 'tigers': 3}})
+        self.assertEqual(first.season_summary(11), second.season_summary(11))
+        self.assertEqual(first.season_summary(11)['batting']['chorby']['hits'],
+                         6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from game_transformer import generate_game, stats
+from game_transformer.state import RecordedUniverse, use_universe
+from game_transformer.store import build_game_store, GameStore
+from perf_budget import load_corpus, corpus_universe, corpus_prefetched
+
+
+def corpus_universe_for(corpus):
+    teams = {}
+    for corpus_game in corpus:
+        teams.update(corpus_universe(corpus_game).teams)
+    return RecordedUniverse(teams, {})
+
+
+class TestGameStoreRoundTrip(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = load_corpus()
+        cls.game_ids = [corpus_game['gameId'] for corpus_game in cls.corpus]
+        cls.universe = corpus_universe_for(cls.corpus)
+        cls.path = os.path.join(tempfile.mkdtemp(), 'games.store')
+
+        def prefetch_games(game_ids):
+            return {corpus_game['gameId']: corpus_prefetched(corpus_game)
+                    for corpus_game in cls.corpus
+                    if corpus_game['gameId'] in game_ids}
+
+        sink = stats.stats_sink
+        try:
+            with use_universe(cls.universe), \
+                    mock.patch('game_transformer.store.prefetch_games',
+                               prefetch_games):
+                build_game_store(cls.path, cls.game_ids)
+        finally:
+            stats.use_stats_sink(sink)
+
+    def generated(self, corpus_game):
+        with use_universe(self.universe):
+            return generate_game(corpus_game['gameId'],
+                                 corpus_prefetched(corpus_game))
+
+    def test_reads_back_every_update(self):
+        store = GameStore(self.path)
+        self.assertEqual(len(store), len(self.corpus))
+        for corpus_game in self.corpus:
+            expected = self.generated(corpus_game)
+            archive = store.archive(corpus_game['gameId'])
+            self.assertEqual(archive.load_all(), expected)
+            self.assertEqual(list(archive), expected)
+            for update in expected[::25]:
+                self.assertEqual(
+                    archive.update_for_play(update.data['playCount']),
+                    update)
+
+    def test_index_and_summaries(self):
+        store = GameStore(self.path)
+        summaries = dict(store.summaries())
+        self.assertEqual(set(summaries), set(self.game_ids))
+        for corpus_game in self.corpus:
+            final = self.generated(corpus_game)[-1].data
+            _, _, day, season, *_ = store.index[corpus_game['gameId']]
+            self.assertEqual((day, season), (final['day'], final['season']))
+
+            summary = summaries[corpus_game['gameId']]
+            winner = (final['homeTeam']
+                      if final['homeScore'] > final['awayScore']
+                      else final['awayTeam'])
+            self.assertEqual(summary['noelWinner'], winner)
+            self.assertTrue(summary['stats']['batting'])
+
+    def test_games_for_day(self):
+        store = GameStore(self.path)
+        by_day = {}
+        for corpus_game in self.corpus:
+            final = self.generated(corpus_game)[-1].data
+            by_day.setdefault((final['season'], final['day']), []).append(
+                corpus_game['gameId'])
+        for (season, day), game_ids in by_day.items():
+            self.assertEqual(sorted(store.games_for_day(season, day)),
+                             sorted(game_ids))
+        self.assertEqual(store.games_for_day(-1, -1), [])
+
+    def test_keeps_only_recent_archives(self):
+        store = GameStore(self.path)
+        first, second = self.game_ids[:2]
+        with mock.patch('game_transformer.store.MAX_CACHED_ARCHIVES', 1):
+            archive = store.archive(first)
+            self.assertIs(store.archive(first), archive)
+            store.archive(second)
+            self.assertEqual(list(store._archives), [second])
+            self.assertIsNot(store.archive(first), archive)
+            self.assertEqual(store.archive(first).load_all(),
+                             archive.load_all())
+
+    def test_reopened_stores_agree(self):
+        first, second = GameStore(self.path), GameStore(self.path)
+        for game_id in self.game_ids:
+            self.assertEqual(first.archive(game_id).load_all(),
+                             second.archive(game_id).load_all())
+
+
+if __name__ == '__main__':
+    unittest.main()
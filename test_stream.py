@@ -0,0 +1,241 @@
+import json
+import time
+import unittest
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+import app
+from GameCache import GameCache, NegativeCache
+from game_transformer import StampedUpdate
+
+
+def make_game(game_id, play_count=10, finalized=False, home_score=0,
+              away_score=0):
+    return {'id': game_id, 'season': 11, 'day': 3, 'playCount': play_count,
+            'finalized': finalized, 'homeTeam': 'home', 'awayTeam': 'away',
+            'homeScore': home_score, 'awayScore': away_score}
+
+
+def stream_response(*games_values):
+    items = [{'data': {'value': {'games': games}}} for games in games_values]
+    return SimpleNamespace(content=json.dumps({'items': items}).encode(),
+                           status_code=200)
+
+
+def noel_version(game):
+    return {**game, 'noel': True}
+
+
+class StreamTestCase(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(app.scheduler, 'observe_schedule'),
+            mock.patch.object(app, 'transformed_json', app.OrderedDict()),
+            mock.patch.object(app, 'last_transformed', app.OrderedDict()),
+            mock.patch.object(app, 'season_stats', app.SeasonStats()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def get_stream(self, *games_values):
+        return json.loads(app.get_stream(stream_response(*games_values))
+                          .get_data(as_text=True))
+
+
+class TestGetStream(StreamTestCase):
+    def test_only_rewrites_game_schedules(self):
+        with mock.patch.object(app, 'transform_games',
+                               lambda games, _: [noel_version(g)
+                                                 for g in games]):
+            stream = self.get_stream({
+                'season': {'schedule': 'abc-uuid'},
+                'schedule': [make_game('a')],
+            })
+
+        games = stream['items'][0]['data']['value']['games']
+        self.assertEqual(games['season'], {'schedule': 'abc-uuid'})
+        self.assertEqual(games['schedule'], [noel_version(make_game('a'))])
+
+    def test_standings_pair_with_their_own_item(self):
+        # The first item's schedule is empty, which mustn't shift the
+        # second item's standings onto the first's
+        real = make_game('a', finalized=True, home_score=1)
+        noel = {**real, 'homeScore': 0, 'awayScore': 1}
+        standings = {'wins': {'home': 5, 'away': 5},
+                     'losses': {'home': 5, 'away': 5}}
+        with mock.patch.object(app, 'transform_games',
+                               lambda games, _: [noel for _ in games]):
+            stream = self.get_stream(
+                {'schedule': [], 'standings': standings},
+                {'schedule': [real], 'standings': standings})
+
+        first, second = [item['data']['value']['games']
+                         for item in stream['items']]
+        self.assertEqual(first['standings'], standings)
+        self.assertEqual(second['standings']['wins'],
+                         {'home': 4, 'away': 6})
+        self.assertEqual(second['standings']['losses'],
+                         {'home': 6, 'away': 4})
+
+    def test_standings_before_the_schedule(self):
+        # Upstream sends standings first. They still count the schedule's
+        # results, and the stream is only walked once.
+        real = make_game('a', finalized=True, home_score=1)
+        noel = {**real, 'homeScore': 0, 'awayScore': 1}
+        standings = {'wins': {'home': 5, 'away': 5},
+                     'losses': {'home': 5, 'away': 5}}
+        with mock.patch.object(app, 'transform_games',
+                               lambda games, _: [noel for _ in games]), \
+                mock.patch.object(app, 'rewrite_path_raw',
+                                  wraps=app.rewrite_path_raw) as rewrite:
+            stream = self.get_stream({'standings': standings,
+                                      'schedule': [real]})
+
+        games = stream['items'][0]['data']['value']['games']
+        self.assertEqual(games['standings']['wins'], {'home': 4, 'away': 6})
+        self.assertEqual(games['schedule'], [noel])
+        self.assertEqual(rewrite.call_count, 1)
+
+
+class TestMemoizedGames(StreamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.transformed = []
+        patch = mock.patch.object(app, 'transform_games',
+                                  self.fake_transform_games)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def fake_transform_games(self, games, _):
+        self.transformed.append([game['id'] for game in games])
+        return [noel_version(game) for game in games]
+
+    def schedule(self, *games):
+        stream = self.get_stream({'schedule': list(games)})
+        return stream['items'][0]['data']['value']['games']['schedule']
+
+    def test_only_changed_games_are_transformed(self):
+        self.schedule(make_game('a'), make_game('b'))
+        schedule = self.schedule(make_game('a'), make_game('b', 11))
+        self.assertEqual(schedule, [noel_version(make_game('a')),
+                                    noel_version(make_game('b', 11))])
+
+        # Finalizing changes the game even if the play count doesn't
+        self.schedule(make_game('a', finalized=True), make_game('b', 11))
+        self.assertEqual(self.transformed, [['a', 'b'], ['b'], ['a']])
+
+    def test_games_not_ready_are_not_memoized(self):
+        with mock.patch.object(app, 'transform_games',
+                               lambda games, _: [None for _ in games]):
+            self.assertEqual(self.schedule(make_game('a')), [make_game('a')])
+
+        self.assertEqual(self.schedule(make_game('a')),
+                         [noel_version(make_game('a'))])
+        self.assertEqual(self.transformed, [['a']])
+
+    def test_forgotten_games_are_transformed_again(self):
+        self.schedule(make_game('a'))
+        app.forget_transformed('a')
+        self.schedule(make_game('a'))
+        self.assertEqual(self.transformed, [['a'], ['a']])
+
+
+SLOW_SECONDS = 0.3
+
+
+def slow_prefetch_games(game_ids):
+    time.sleep(SLOW_SECONDS)
+    return fake_prefetch_games(game_ids)
+
+
+def slow_generate_game(game_id, prefetched=None):
+    time.sleep(SLOW_SECONDS)
+    start = datetime(2021, 3, 1, tzinfo=timezone.utc)
+    return [StampedUpdate(start, noel_version(make_game(game_id, play_count)))
+            for play_count in range(20)]
+
+
+class TestGenerationDeadline(StreamTestCase):
+    def setUp(self):
+        super().setUp()
+        patches = [
+            mock.patch.dict(app.app.config,
+                            {'GENERATION_DEADLINE_SECONDS': 0.1}),
+            mock.patch.object(app, 'game_cache', GameCache(10 ** 8)),
+            mock.patch.object(app, 'failed_games', NegativeCache(60, 60)),
+            mock.patch.object(app, 'prefetch_games', slow_prefetch_games),
+            mock.patch.object(app, 'generate_game', slow_generate_game),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(self.finish_generating)
+
+    def finish_generating(self):
+        for future in list(app.generating_games.values()):
+            future.result()
+
+    def test_sends_upstream_game_when_out_of_time(self):
+        # Fetching and generating each take longer than the deadline
+        start = time.monotonic()
+        stream = self.get_stream({'schedule': [make_game('a')]})
+        self.assertLess(time.monotonic() - start, SLOW_SECONDS)
+        self.assertEqual(stream['items'][0]['data']['value']['games']
+                         ['schedule'], [make_game('a')])
+
+        # Generation carried on in the background
+        self.finish_generating()
+        stream = self.get_stream({'schedule': [make_game('a')]})
+        self.assertEqual(stream['items'][0]['data']['value']['games']
+                         ['schedule'], [noel_version(make_game('a'))])
+
+    def test_sends_last_transformed_game_when_out_of_time(self):
+        stale = noel_version(make_game('b', play_count=5))
+        app.remember_transformed(stale)
+
+        stream = self.get_stream({'schedule': [make_game('b')]})
+        self.assertEqual(stream['items'][0]['data']['value']['games']
+                         ['schedule'], [stale])
+
+
+def fake_prefetch_games(game_ids):
+    return {game_id: ({}, []) for game_id in game_ids}
+
+
+class TestPrefetchedGames(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(app, 'prefetched_games', app.OrderedDict()),
+            mock.patch.object(app, 'game_cache', GameCache(10 ** 8)),
+            mock.patch.object(app, 'failed_games', NegativeCache(60, 60)),
+            mock.patch.object(app, 'prefetch_games', fake_prefetch_games),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_dropped_when_game_is_skipped(self):
+        app.prefetch_uncached_games(['a'])
+        app.failed_games.record_failure('a', RuntimeError("broken"))
+
+        self.assertIsNone(app.generate_game_safely('a'))
+        self.assertNotIn('a', app.prefetched_games)
+
+    def test_dropped_when_generation_fails(self):
+        app.prefetch_uncached_games(['a'])
+        with mock.patch.object(app, 'generate_game',
+                               mock.Mock(side_effect=RuntimeError("broken"))):
+            self.assertIsNone(app.generate_game_safely('a'))
+        self.assertNotIn('a', app.prefetched_games)
+
+    def test_bounded(self):
+        game_ids = [f"game-{i}" for i in range(app.MAX_PREFETCHED_GAMES + 5)]
+        app.prefetch_uncached_games(game_ids)
+        self.assertEqual(list(app.prefetched_games),
+                         game_ids[-app.MAX_PREFETCHED_GAMES:])
+
+
+if __name__ == '__main__':
+    unittest.main()
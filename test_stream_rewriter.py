@@ -0,0 +1,96 @@
+import json
+import unittest
+
+from StreamRewriter import rewrite_path, EVERY
+
+SCHEDULE_PATH = ('items', EVERY, 'games', 'schedule')
+
+
+class TestRewritePath(unittest.TestCase):
+    def test_replaces_only_values_at_path(self):
+        text = json.dumps({
+            'items': [
+                {'games': {'schedule': [1, 2], 'tomorrowSchedule': [3]}},
+                {'games': {'schedule': [4]}, 'leagues': {'a': 'b'}},
+            ]
+        })
+        rewritten = rewrite_path(text, SCHEDULE_PATH,
+                                 lambda s, _: [x * 10 for x in s])
+        self.assertEqual(json.loads(rewritten), {
+            'items': [
+                {'games': {'schedule': [10, 20], 'tomorrowSchedule': [3]}},
+                {'games': {'schedule': [40]}, 'leagues': {'a': 'b'}},
+            ]
+        })
+
+    def test_ignores_same_key_elsewhere(self):
+        item = {
+            'games': {
+                'season': {'schedule': 'abc-uuid'},
+                'schedule': [1],
+            },
+            'schedule': {'not': 'games'},
+        }
+        text = json.dumps({'items': [item]})
+        locations = []
+
+        def transform(value, location):
+            locations.append(location)
+            return value
+
+        rewritten = rewrite_path(text, SCHEDULE_PATH, transform)
+        self.assertEqual(json.loads(rewritten), {'items': [item]})
+        self.assertEqual(locations, [('items', 0, 'games', 'schedule')])
+
+    def test_ignores_key_inside_strings(self):
+        text = json.dumps({
+            'lastUpdate': 'the {"schedule": [1]} is, "schedule": [2]',
+            'schedule': [3],
+        })
+        rewritten = rewrite_path(text, ('schedule',), lambda s, _: 'changed')
+        self.assertEqual(json.loads(rewritten), {
+            'lastUpdate': 'the {"schedule": [1]} is, "schedule": [2]',
+            'schedule': 'changed',
+        })
+
+    def test_several_keys_in_one_walk(self):
+        # standings comes first in each item, but is transformed after every
+        # schedule
+        text = json.dumps({'items': [
+            {'games': {'standings': 's0', 'schedule': [1], 'x': [2]}},
+            {'games': {'standings': 's1', 'schedule': [3]}},
+        ]})
+        seen = []
+
+        def transform(value, location):
+            seen.append(location)
+            return value * 2
+
+        rewritten = rewrite_path(
+            text, ('items', EVERY, 'games', ('schedule', 'standings')),
+            transform)
+        self.assertEqual(json.loads(rewritten), {'items': [
+            {'games': {'standings': 's0s0', 'schedule': [1, 1], 'x': [2]}},
+            {'games': {'standings': 's1s1', 'schedule': [3, 3]}},
+        ]})
+        self.assertEqual(seen, [
+            ('items', 0, 'games', 'schedule'),
+            ('items', 1, 'games', 'schedule'),
+            ('items', 0, 'games', 'standings'),
+            ('items', 1, 'games', 'standings'),
+        ])
+
+    def test_copies_everything_else_verbatim(self):
+        text = '{"a" : 1.50, "schedule":[ 1 ],\n "b":"\\u00e9"}'
+        rewritten = rewrite_path(text, ('schedule',), lambda s, _: s)
+        self.assertEqual(rewritten,
+                         '{"a" : 1.50, "schedule":[1],\n "b":"\\u00e9"}')
+
+    def test_leaves_invalid_json_alone(self):
+        text = '{"schedule": [1, 2'
+        self.assertEqual(rewrite_path(text, ('schedule',), lambda s, _: []),
+                         text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from game_transformer.GameRecorder import GameRecorder, Pitch
+from game_transformer.classifier import PitchType, StealDecision
+from game_transformer.columnar import export_recordings
+from game_transformer.tendencies import build_tendency_index, \
+    TendencyIndex, use_tendency_index
+
+
+def pitch(batter_id, pitch_type, base_reached=None, advancements=None):
+    return Pitch(batter_id=batter_id, appearance_count=0,
+                 pitch_type=pitch_type, base_reached=base_reached,
+                 original_text="", advancements=advancements or {})
+
+
+def recorder(pitches, steal_decisions):
+    return SimpleNamespace(pitches=pitches, steal_decisions=steal_decisions)
+
+
+class TestTendencyIndex(unittest.TestCase):
+    def setUp(self):
+        columnar_path = tempfile.mkdtemp()
+        export_recordings(columnar_path, [
+            ('game-1',
+             recorder([pitch('a', PitchType.BALL),
+                       pitch('b', PitchType.HIT, 1, {'a': 2})],
+                      {('a', 0): [StealDecision.STAY]}),
+             recorder([pitch('c', PitchType.FOUL)], {})),
+            ('game-2',
+             recorder([pitch('a', PitchType.HIT, 0)],
+                      {('a', 1): [StealDecision.STEAL]}),
+             recorder([], {})),
+        ])
+        self.path = tempfile.mkdtemp()
+        build_tendency_index(columnar_path, self.path)
+        self.index = TendencyIndex(self.path)
+
+    def test_draws_only_the_players_own_records(self):
+        rng = random.Random(0)
+        pitches = {self.index.draw_pitch('a', rng) for _ in range(50)}
+        self.assertEqual(pitches, {(PitchType.BALL, None),
+                                   (PitchType.HIT, 0)})
+        self.assertEqual(self.index.draw_pitch('c', rng),
+                         (PitchType.FOUL, None))
+
+        decisions = {self.index.draw_steal_decision('a', rng)
+                     for _ in range(50)}
+        self.assertEqual(decisions, {StealDecision.STAY, StealDecision.STEAL})
+        self.assertEqual(self.index.draw_advancement('a', rng), 2)
+
+    def test_players_without_records(self):
+        rng = random.Random(0)
+        self.assertTrue(self.index.has_pitches_for('b'))
+        self.assertFalse(self.index.has_pitches_for('unknown'))
+        self.assertIsNone(self.index.draw_pitch('unknown', rng))
+        self.assertIsNone(self.index.draw_advancement('b', rng))
+        self.assertIsNone(self.index.draw_steal_decision('c', rng))
+
+    def test_recorders_draw_from_the_index_in_use(self):
+        game_recorder = GameRecorder.__new__(GameRecorder)
+        game_recorder.pitches = []
+        self.assertFalse(game_recorder.has_pitches_for('c'))
+
+        self.addCleanup(use_tendency_index, None)
+        use_tendency_index(self.path)
+        self.assertTrue(game_recorder.has_pitches_for('c'))
+        self.assertFalse(game_recorder.has_pitches_for('unknown'))
+
+        use_tendency_index(None)
+        self.assertFalse(game_recorder.has_pitches_for('c'))
+
+
+class TestWithoutAnIndex(unittest.TestCase):
+    def test_generating_doesnt_need_numpy(self):
+        code = ("import sys, game_transformer.GameProducer; "
+                "sys.exit('numpy' in sys.modules)")
+        result = subprocess.run([sys.executable, '-c', code],
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.returncode, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import threading
+import time
+import unittest
+
+import requests
+from blaseball_mike import session as blaseball_mike_session
+from blaseball_mike.chronicler import v1 as chronicler_v1
+from requests.adapters import BaseAdapter
+
+from UpstreamClient import TokenBucket, UpstreamClient, UpstreamBusy, \
+    RateLimitedAdapter, close_blaseball_mike_sessions, limit_blaseball_mike
+
+
+class FakeTransport(BaseAdapter):
+    # Answers every request with its own URL, after a delay
+    def __init__(self, delay=0.):
+        super().__init__()
+        self.delay = delay
+        self.urls = []
+        self._lock = threading.Lock()
+
+    def send(self, request, *args, **kwargs):
+        with self._lock:
+            self.urls.append(request.url)
+        time.sleep(self.delay)
+        resp = requests.Response()
+        resp.status_code = 200
+        resp._content = request.url.encode()
+        resp.url = request.url
+        resp.request = request
+        return resp
+
+    def close(self):
+        pass
+
+
+def limited_session(limiter, max_wait, transport):
+    session = requests.Session()
+    session.mount('http://', RateLimitedAdapter(limiter, max_wait, transport))
+    return session
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_waits(self):
+        bucket = TokenBucket(rate=10, burst=3)
+        for _ in range(3):
+            self.assertTrue(bucket.acquire(timeout=0))
+        self.assertFalse(bucket.acquire(timeout=0))
+
+        start = time.monotonic()
+        self.assertTrue(bucket.acquire(timeout=1))
+        self.assertGreater(time.monotonic() - start, 0.05)
+
+    def test_zero_rate_is_unlimited(self):
+        bucket = TokenBucket(rate=0, burst=0)
+        for _ in range(100):
+            self.assertTrue(bucket.acquire(timeout=0))
+
+
+class TestRateLimitedAdapter(unittest.TestCase):
+    def test_waits_for_a_token(self):
+        transport = FakeTransport()
+        session = limited_session(TokenBucket(rate=10, burst=1), 1,
+                                  transport)
+        start = time.monotonic()
+        session.get('http://upstream/a')
+        session.get('http://upstream/b')
+        self.assertGreater(time.monotonic() - start, 0.05)
+        self.assertEqual(transport.urls,
+                         ['http://upstream/a', 'http://upstream/b'])
+
+    def test_gives_up_after_max_wait(self):
+        transport = FakeTransport()
+        session = limited_session(TokenBucket(rate=1, burst=1), 0.1,
+                                  transport)
+        session.get('http://upstream/a')
+        with self.assertRaises(UpstreamBusy):
+            session.get('http://upstream/b')
+        self.assertEqual(transport.urls, ['http://upstream/a'])
+
+
+class TestUpstreamClient(unittest.TestCase):
+    def test_coalesces_identical_gets(self):
+        transport = FakeTransport(delay=0.2)
+        client = UpstreamClient(limited_session(TokenBucket(rate=0, burst=0),
+                                                0, transport))
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(
+                client.get('http://upstream/a').content))
+            for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [b'http://upstream/a'] * 5)
+        self.assertEqual(transport.urls, ['http://upstream/a'])
+        self.assertEqual(client.sent, 1)
+        self.assertEqual(client.coalesced, 4)
+
+    def test_counts_rejected_requests(self):
+        client = UpstreamClient(limited_session(TokenBucket(rate=1, burst=1),
+                                                0.1, FakeTransport()))
+        client.get('http://upstream/a')
+        with self.assertRaises(UpstreamBusy):
+            client.get('http://upstream/b')
+        self.assertEqual(client.rejected, 1)
+        self.assertEqual(client.stats()['inFlight'], 0)
+
+
+class ClosableTransport(FakeTransport):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestCloseBlaseballMikeSessions(unittest.TestCase):
+    def test_closes_and_forgets_every_session(self):
+        sessions = blaseball_mike_session._SESSIONS_BY_EXPIRY
+        saved = dict(sessions)
+        self.addCleanup(sessions.update, saved)
+        sessions.clear()
+
+        transport = ClosableTransport()
+        sessions[0] = requests.Session()
+        sessions[0].mount('http://', transport)
+        close_blaseball_mike_sessions()
+        self.assertTrue(transport.closed)
+        self.assertEqual(sessions, {})
+
+    def test_new_sessions_are_still_limited(self):
+        sessions = blaseball_mike_session._SESSIONS_BY_EXPIRY
+        saved = dict(sessions)
+        self.addCleanup(sessions.update, saved)
+        session_function = chronicler_v1.session
+        self.addCleanup(setattr, chronicler_v1, 'session', session_function)
+
+        limit_blaseball_mike(TokenBucket(0, 0), None)
+        chronicler_v1.session(123)
+        close_blaseball_mike_sessions()
+        self.assertIsInstance(
+            chronicler_v1.session(123).get_adapter('https://'),
+            RateLimitedAdapter)
+        sessions.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
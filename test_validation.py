@@ -0,0 +1,169 @@
+import unittest
+from copy import deepcopy
+from unittest import mock
+
+from dateutil.parser import isoparse
+
+from game_transformer import StampedUpdate, game_update_for_event
+from game_transformer.validation import GameResult, MAX_MISMATCHES, \
+    is_special_game, validate_game, summarize
+from perf_budget import load_corpus, corpus_prefetched
+
+
+def event(type_, description=''):
+    return {'type': type_, 'description': description}
+
+
+def faithful_game(game_id, prefetched):
+    # What generate_game would return if it got every play exactly right
+    game_updates_by_play, _ = prefetched
+    generated = []
+    for play_count in sorted(game_updates_by_play):
+        original = game_update_for_event(game_updates_by_play, play_count - 1)
+        if original is not None:
+            generated.append(StampedUpdate(
+                isoparse(game_updates_by_play[play_count][0]['timestamp']),
+                deepcopy(original)))
+    return generated
+
+
+class TestIsSpecialGame(unittest.TestCase):
+    def test_plain_game(self):
+        self.assertFalse(is_special_game([
+            event(0), event(12, "Player batting for the Teams."),
+            event(13, "Strike, looking. 0-1"), event(28)]))
+
+    def test_special_event_type(self):
+        self.assertTrue(is_special_game([event(12), event(54)]))
+
+    def test_special_description(self):
+        self.assertTrue(is_special_game([
+            event(12, "Player is Inhabiting Other Player!")]))
+        self.assertTrue(is_special_game([
+            event(9, "Player hits a solo home run! Player is Heating Up!")]))
+
+    def test_corpus_games_are_plain(self):
+        for corpus_game in load_corpus():
+            self.assertFalse(is_special_game(corpus_game['feedEvents']))
+
+
+@mock.patch('game_transformer.validation.generate_game', faithful_game)
+class TestValidateGame(unittest.TestCase):
+    def setUp(self):
+        self.corpus_game = load_corpus()[0]
+        self.game_id = self.corpus_game['gameId']
+
+    def prefetched(self):
+        return corpus_prefetched(deepcopy(self.corpus_game))
+
+    def test_faithful(self):
+        result = validate_game(self.game_id, self.prefetched())
+        self.assertFalse(result.special)
+        self.assertIsNone(result.error)
+        self.assertGreater(result.num_compared, 0)
+        self.assertEqual(result.num_updates, result.num_compared)
+        self.assertEqual(result.num_mismatches, 0)
+        self.assertEqual(result.mismatches, [])
+
+    def test_field_mismatch(self):
+        def generate(game_id, prefetched):
+            generated = faithful_game(game_id, prefetched)
+            generated[5].data['homeScore'] = 99
+            return generated
+
+        with mock.patch('game_transformer.validation.generate_game',
+                        generate):
+            result = validate_game(self.game_id, self.prefetched())
+        original = faithful_game(self.game_id, self.prefetched())[5].data
+        self.assertEqual(result.num_mismatches, 1)
+        self.assertEqual(result.mismatches, [
+            (original['playCount'], 'homeScore', original['homeScore'], 99)])
+
+    def test_keeps_first_mismatches(self):
+        def generate(game_id, prefetched):
+            generated = faithful_game(game_id, prefetched)
+            for update in generated:
+                update.data['lastUpdate'] = "Something else"
+            return generated
+
+        with mock.patch('game_transformer.validation.generate_game',
+                        generate):
+            result = validate_game(self.game_id, self.prefetched())
+        self.assertEqual(result.num_mismatches, result.num_compared)
+        self.assertEqual(len(result.mismatches), MAX_MISMATCHES)
+        self.assertEqual([key for _, key, _, _ in result.mismatches],
+                         ['lastUpdate'] * MAX_MISMATCHES)
+
+    def test_ends_early(self):
+        last_play = max(u['data']['playCount']
+                        for u in self.corpus_game['updates'])
+
+        def generate(game_id, prefetched):
+            return faithful_game(game_id, prefetched)[:-3]
+
+        with mock.patch('game_transformer.validation.generate_game',
+                        generate):
+            result = validate_game(self.game_id, self.prefetched())
+        self.assertEqual(result.num_mismatches, 1)
+        (play_count, key, original, generated), = result.mismatches
+        self.assertEqual((play_count, key, original),
+                         (last_play, 'playCount', last_play))
+        self.assertLess(generated, last_play)
+
+    def test_generation_error(self):
+        def generate(game_id, prefetched):
+            raise RuntimeError("Who is batting?")
+
+        with mock.patch('game_transformer.validation.generate_game',
+                        generate):
+            result = validate_game(self.game_id, self.prefetched())
+        self.assertEqual(result.error, repr(RuntimeError("Who is batting?")))
+        self.assertEqual(result.num_compared, 0)
+
+    def test_skips_special_games(self):
+        game_updates_by_play, feed_events = self.prefetched()
+        feed_events.append(event(54, "Incineration!"))
+
+        result = validate_game(self.game_id,
+                               (game_updates_by_play, iter(feed_events)))
+        self.assertTrue(result.special)
+        self.assertTrue(result.skipped)
+        self.assertEqual(result.num_updates, 0)
+
+        result = validate_game(self.game_id,
+                               (game_updates_by_play, iter(feed_events)),
+                               include_special=True)
+        self.assertTrue(result.special)
+        self.assertFalse(result.skipped)
+        self.assertEqual(result.num_mismatches, 0)
+
+
+class TestSummarize(unittest.TestCase):
+    def test_summary(self):
+        results = [
+            GameResult('faithful', num_updates=10, num_compared=10),
+            GameResult('special', special=True, skipped=True),
+            GameResult('mismatched', num_updates=10, num_compared=10,
+                       mismatches=[(3, 'homeScore', 1, 2),
+                                   (4, 'homeScore', 1, 2),
+                                   (4, 'lastUpdate', 'a', 'b')],
+                       num_mismatches=12),
+            GameResult('failed', error="RuntimeError('oops')"),
+        ]
+        self.assertEqual(summarize(results, 2.0).splitlines(), [
+            "4 games in 2.0s (2.0 games/s)",
+            "1 skipped for Blaseball-specific events",
+            "1 faithful, 1 mismatched, 1 failed to generate",
+            "Mismatched fields: homeScore (2), lastUpdate (1)",
+            "  mismatched: 12 mismatches, first at play 3: homeScore 1 != 2",
+            "  failed: RuntimeError('oops')",
+        ])
+
+    def test_all_faithful(self):
+        self.assertEqual(
+            summarize([GameResult('faithful')], 1.0).splitlines()[2:],
+            ["1 faithful, 0 mismatched, 0 failed to generate"])
+
+
+if __name__ == '__main__':
+    unittest.main()
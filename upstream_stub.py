@@ -0,0 +1,133 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+
+# A local stand-in for api.sibr.dev, for load testing without hammering the
+# real thing. Record responses by pointing the app at this in record mode, which
+# passes everything through to the real upstream and saves what comes back.
+# Then serve them back from disk with some made-up latency:
+#
+#   python upstream_stub.py record --port 8001
+#   python upstream_stub.py serve --port 8001 --latency 0.05 --jitter 0.02
+#   NOEL_UPSTREAM_URL=http://127.0.0.1:8001/ gunicorn app:app
+#
+# Responses are matched on method, path and query string (in any order).
+# Anything that wasn't recorded is a 404.
+RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), 'upstream_recordings')
+DEFAULT_UPSTREAM = 'https://api.sibr.dev'
+
+
+def request_key(method, url):
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return hashlib.sha1(
+        f"{method} {parts.path}?{query}".encode('utf-8')).hexdigest()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Set on the subclass made by make_handler
+    recordings_dir: str
+    upstream: str = None  # Recording if set, serving if not
+    latency: float = 0
+    jitter: float = 0
+
+    def do_GET(self):
+        key = request_key(self.command, self.path)
+        path = os.path.join(self.recordings_dir, key + '.json.gz')
+        if self.upstream is not None:
+            recording = self._record(path)
+        else:
+            recording = self._load(path)
+            delay = self.latency + random.uniform(-self.jitter, self.jitter)
+            time.sleep(max(delay, 0))
+
+        if recording is None:
+            self._send(404, 'application/json',
+                       json.dumps({'error': "Not recorded"}).encode('utf-8'))
+        else:
+            self._send(recording['status'], recording['contentType'],
+                       recording['body'].encode('utf-8'))
+
+    def _record(self, path):
+        resp = requests.get(self.upstream + self.path)
+        recording = {
+            'path': self.path,
+            'status': resp.status_code,
+            'contentType': resp.headers.get('Content-Type',
+                                            'application/json'),
+            'body': resp.content.decode('utf-8'),
+        }
+        with gzip.open(path, 'wt') as f:
+            json.dump(recording, f)
+        return recording
+
+    @staticmethod
+    def _load(path):
+        try:
+            with gzip.open(path, 'rt') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # One line per request drowns everything out under load
+
+
+def make_handler(recordings_dir, upstream=None, latency=0., jitter=0.):
+    return type('ConfiguredStubHandler', (StubHandler,), {
+        'recordings_dir': recordings_dir,
+        'upstream': upstream,
+        'latency': latency,
+        'jitter': jitter,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Record and replay upstream responses for load testing")
+    parser.add_argument('mode', choices=['record', 'serve'])
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--dir', default=RECORDINGS_DIR)
+    parser.add_argument('--upstream', default=DEFAULT_UPSTREAM,
+                        help="Where to record from (record only)")
+    parser.add_argument('--latency', type=float, default=0,
+                        help="Seconds to wait before each response (serve "
+                             "only)")
+    parser.add_argument('--jitter', type=float, default=0,
+                        help="Latency varies by up to this many seconds either "
+                             "way (serve only)")
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    handler = make_handler(
+        args.dir,
+        upstream=args.upstream.rstrip('/') if args.mode == 'record' else None,
+        latency=args.latency, jitter=args.jitter)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), handler)
+    print(f"{'Recording' if args.mode == 'record' else 'Serving'} on port "
+          f"{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())